@@ -0,0 +1,93 @@
+import functools
+import hashlib
+import json
+import time
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+# Idempotency-Key support for POST endpoints the gateway retries. The first
+# response for a key is stored in the cache for IDEMPOTENCY_TTL seconds and
+# replayed verbatim; a duplicate arriving while the first is still running
+# waits on the in-flight marker instead of running the view a second time.
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+IN_FLIGHT = 'in-flight'
+POLL_INTERVAL = 0.05
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def replay(entry):
+    response = Response(entry['data'], status=entry['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def claim(key, fingerprint):
+    """Take the in-flight marker for ``key`` (returns None) or the response to send instead.
+
+    While another request holds the marker this polls until it finishes, for
+    at most IDEMPOTENCY_WAIT_TIMEOUT seconds.
+    """
+    marker = {'state': IN_FLIGHT, 'fingerprint': fingerprint}
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    while True:
+        if cache.add(key, marker, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+            return None
+        entry = cache.get(key)
+        if entry is not None and entry['fingerprint'] != fingerprint:
+            return Response({"error": f"{HEADER} was already used with a different payload"},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if entry is not None and entry['state'] != IN_FLIGHT:
+            return replay(entry)
+        if time.monotonic() >= deadline:
+            return Response({"error": f"A request with this {HEADER} is still in progress"},
+                            status=status.HTTP_409_CONFLICT)
+        # Still running (or just released after a failure): look again shortly
+        time.sleep(POLL_INTERVAL)
+
+
+def idempotent(scope):
+    """Decorate an APIView ``post`` so requests carrying an Idempotency-Key run at most once."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            idempotency_key = request.headers.get(HEADER)
+            if not idempotency_key:
+                return method(self, request, *args, **kwargs)
+            if len(idempotency_key) > MAX_KEY_LENGTH:
+                return Response({"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            key = f'idempotency:{scope}:{idempotency_key}'
+            fingerprint = request_fingerprint(request)
+            blocked = claim(key, fingerprint)
+            if blocked is not None:
+                return blocked
+
+            try:
+                response = method(self, request, *args, **kwargs)
+            except Exception:
+                cache.delete(key)
+                raise
+            if response.status_code >= 500:
+                # Let the retry run the request again
+                cache.delete(key)
+                return response
+            cache.set(key, {
+                'state': 'done',
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                # Plain JSON types, not the serializer-bound ReturnDict
+                'data': json.loads(JSONRenderer().render(response.data)),
+            }, settings.IDEMPOTENCY_TTL)
+            return response
+        return wrapper
+    return decorator
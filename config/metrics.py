@@ -0,0 +1,337 @@
+import contextlib
+import contextvars
+import fcntl
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from loans import cache
+
+# Request and task metrics in Prometheus text format.
+#
+# Each process keeps counters and histograms in memory and, when METRICS_DIR
+# is set, writes them to METRICS_DIR/<host>-<pid>-<start token>.json at most
+# every METRICS_FLUSH_INTERVAL seconds. /metrics merges every file in the
+# directory, so the numbers cover all gunicorn workers (and celery workers
+# sharing the directory), at most one flush interval behind for workers other
+# than the one answering. The start token keeps a restarted process that
+# reuses a PID from overwriting its predecessor's file.
+#
+# Files of this host's exited processes are folded into METRICS_DIR/retired.json
+# (on each scrape and on a process's first flush), so the directory holds one
+# file per live process plus the retired totals and counters never go
+# backwards. Other hosts' files are left to those hosts, whose PIDs cannot be
+# checked from here; docker-compose.yml gives each service a fixed hostname so
+# a recreated container folds its predecessor's files.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+RETIRED_FILE = 'retired.json'
+
+HELP = {
+    'http_requests_total': ('counter', 'Requests by resolved URL name, method and status code'),
+    'http_request_duration_seconds': ('histogram', 'Wall time per request'),
+    'http_request_db_queries': ('histogram', 'Database queries per request'),
+    'http_request_db_duration_seconds': ('histogram', 'Time spent in database queries per request'),
+    'ingestion_runs_total': ('counter', 'Ingestion task runs by kind and status'),
+    'ingestion_rows_total': ('counter', 'Ingested rows by kind and outcome'),
+    'ingestion_seconds_total': ('counter', 'Time spent ingesting; rows/sec = rate(rows) / rate(seconds)'),
+    'loan_cache_requests_total': ('counter', 'Response and eligibility cache lookups, shared by all workers'),
+}
+
+
+class Registry:
+    """Counters and histograms keyed by ``(name, sorted label items)``."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counters = {}
+        self.histograms = {}
+        self.flushed_at = 0.0
+        self.start_token = uuid.uuid4().hex[:12]
+        self.retired_predecessors = False
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': list(buckets), 'counts': [0] * (len(buckets) + 1),
+                                                    'sum': 0.0, 'count': 0}
+            histogram['counts'][bisect_left(buckets, value)] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, dict(h, counts=list(h['counts']))]
+                               for (name, labels), h in self.histograms.items()],
+            }
+
+    def flush(self, force=False):
+        """Write this process's snapshot to METRICS_DIR (rate-limited unless ``force``)."""
+        directory = settings.METRICS_DIR
+        now = time.monotonic()
+        if not directory or (not force and now - self.flushed_at < settings.METRICS_FLUSH_INTERVAL):
+            return
+        self.flushed_at = now
+        os.makedirs(directory, exist_ok=True)
+        if not self.retired_predecessors:
+            # Workers that are never scraped (celery) still clean up after the process they replace
+            self.retired_predecessors = True
+            retire_exited(directory)
+        path = os.path.join(directory, f'{socket.gethostname()}-{os.getpid()}-{self.start_token}.json')
+        write_snapshot(path, self.snapshot())
+
+
+registry = Registry()
+# A forked worker starts from zero under its own file; the parent's counts stay in the parent's
+os.register_at_fork(after_in_child=registry.reset)
+
+
+def write_snapshot(path, snapshot):
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(f'{path}.tmp', path)
+
+
+def read_snapshot(path):
+    """The snapshot at ``path``, or None if it is missing or being replaced right now."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def process_exited(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass  # Alive, owned by another user
+    return False
+
+
+def exited_files(directory):
+    """Names of snapshot files written by processes of this host that are no longer running."""
+    host = socket.gethostname()
+    for name in os.listdir(directory):
+        parts = name[:-len('.json')].rsplit('-', 2) if name.endswith('.json') else ()
+        if len(parts) != 3 or parts[0] != host or not parts[1].isdigit():
+            continue
+        pid, token = int(parts[1]), parts[2]
+        # Our own PID under another token is a predecessor that exited and left it free
+        if (token != registry.start_token) if pid == os.getpid() else process_exited(pid):
+            yield name
+
+
+@contextlib.contextmanager
+def retired_lock(directory, operation):
+    with open(os.path.join(directory, f'{RETIRED_FILE}.lock'), 'a') as lock:
+        fcntl.flock(lock, operation)
+        yield
+
+
+def retire_exited(directory):
+    """Fold the files of exited processes into RETIRED_FILE and delete them."""
+    names = list(exited_files(directory))
+    if not names:
+        return
+    # One process folds at a time, so no file is counted twice
+    with retired_lock(directory, fcntl.LOCK_EX):
+        for name in os.listdir(directory):
+            if name.endswith('.retiring'):
+                os.remove(os.path.join(directory, name))  # Left by a fold that crashed; already given up
+        retired_path = os.path.join(directory, RETIRED_FILE)
+        snapshots, folding = [read_snapshot(retired_path) or {'counters': [], 'histograms': []}], []
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                # Out of the scrape first: a crash below loses these counts rather than doubling them
+                os.rename(path, f'{path}.retiring')
+            except FileNotFoundError:
+                continue  # Folded by another process already
+            folding.append(f'{path}.retiring')
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(f'{path}.tmp')  # The process died mid-flush
+            snapshot = read_snapshot(f'{path}.retiring')
+            if snapshot is not None:
+                snapshots.append(snapshot)
+        if folding:
+            write_snapshot(retired_path, as_snapshot(*merge(snapshots)))
+            for path in folding:
+                os.remove(path)
+
+
+def collect():
+    """Every process's snapshot merged: ``(counters, histograms)`` dicts keyed like Registry."""
+    snapshots = []
+    if settings.METRICS_DIR:
+        registry.flush(force=True)
+        retire_exited(settings.METRICS_DIR)
+        # Shared lock: a file being folded is read either on its own or in the retired totals, never both
+        with retired_lock(settings.METRICS_DIR, fcntl.LOCK_SH):
+            for name in os.listdir(settings.METRICS_DIR):
+                if name.endswith('.json'):
+                    snapshot = read_snapshot(os.path.join(settings.METRICS_DIR, name))
+                    if snapshot is not None:
+                        snapshots.append(snapshot)
+    else:
+        snapshots.append(registry.snapshot())
+    return merge(snapshots)
+
+
+def merge(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, histogram in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, {'buckets': histogram['buckets'],
+                                                 'counts': [0] * len(histogram['counts']), 'sum': 0.0, 'count': 0})
+            merged['counts'] = [a + b for a, b in zip(merged['counts'], histogram['counts'])]
+            merged['sum'] += histogram['sum']
+            merged['count'] += histogram['count']
+    return counters, histograms
+
+
+def as_snapshot(counters, histograms):
+    """Merged ``(counters, histograms)`` back in the file format."""
+    return {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, histogram] for (name, labels), histogram in histograms.items()],
+    }
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+def render(counters, histograms):
+    lines = []
+    families = {}
+    for (name, labels), value in sorted(counters.items()):
+        families.setdefault(name, []).append(f'{name}{format_labels(labels)} {value}')
+    for (name, labels), histogram in sorted(histograms.items(), key=lambda item: item[0]):
+        samples = families.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(histogram['buckets'] + ['+Inf'], histogram['counts']):
+            cumulative += count
+            samples.append(f'{name}_bucket{format_labels(labels + (("le", bound),))} {cumulative}')
+        samples.append(f'{name}_sum{format_labels(labels)} {histogram["sum"]}')
+        samples.append(f'{name}_count{format_labels(labels)} {histogram["count"]}')
+    for name in sorted(families):
+        kind, text = HELP.get(name, ('untyped', name))
+        lines += [f'# HELP {name} {text}', f'# TYPE {name} {kind}'] + families[name]
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    counters, histograms = collect()
+    for endpoint, counts in cache.stats().items():
+        for outcome in ('hits', 'misses'):
+            counters[('loan_cache_requests_total', (('endpoint', endpoint), ('outcome', outcome)))] = counts[outcome]
+    return HttpResponse(render(counters, histograms), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# Per-request database counters. Every new connection gets an execute wrapper
+# that adds to the stats of the request running in the current context, so
+# queries made from sync_to_async threads of async views are counted too.
+request_db_stats = contextvars.ContextVar('request_db_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    stats = request_db_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats['queries'] += 1
+        stats['seconds'] += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        # Outermost, so connection.execute_wrapper() blocks still pop their own wrapper
+        connection.execute_wrappers.insert(0, record_query)
+
+
+class MetricsMiddleware:
+    """Time every request and count its queries, labelled by resolved URL name."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, started = self.start()
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            self.finish(request, response, stats, token, started)
+
+    async def __acall__(self, request):
+        stats, token, started = self.start()
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            self.finish(request, response, stats, token, started)
+
+    def start(self):
+        # Connections opened before this module was imported missed the signal
+        for connection in connections.all(initialized_only=True):
+            instrument_connection(None, connection)
+        stats = {'queries': 0, 'seconds': 0.0}
+        return stats, request_db_stats.set(stats), time.perf_counter()
+
+    def finish(self, request, response, stats, token, started):
+        elapsed = time.perf_counter() - started
+        request_db_stats.reset(token)
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        status = response.status_code if response is not None else 500
+        registry.inc('http_requests_total', {'view': view, 'method': request.method, 'status': status})
+        registry.observe('http_request_duration_seconds', {'view': view}, elapsed, LATENCY_BUCKETS)
+        registry.observe('http_request_db_queries', {'view': view}, stats['queries'], QUERY_BUCKETS)
+        registry.observe('http_request_db_duration_seconds', {'view': view}, stats['seconds'], LATENCY_BUCKETS)
+        registry.flush()
@@ -0,0 +1,14 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor (keyset) pagination on the primary key.
+
+    Each page is ``WHERE id > <cursor> ORDER BY id LIMIT n``, so response time
+    does not depend on how deep the client has paged or on the table size.
+    """
+    ordering = 'id'
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
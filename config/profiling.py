@@ -0,0 +1,158 @@
+import contextvars
+import cProfile
+import datetime
+import json
+import os
+import random
+import time
+import uuid
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Opt-in request profiling. A request is captured when it carries a valid
+# X-Profile-Token header (see ``issue_token``; manage.py profile_hotspots
+# --issue-token) or is picked by PROFILE_SAMPLE_RATE. A capture is a cProfile
+# dump plus the SQL the request executed, written to PROFILE_DIR, which keeps
+# only the newest PROFILE_MAX_CAPTURES. Async views are profiled on the event
+# loop thread only; their SQL is captured in full.
+
+HEADER = 'X-Profile-Token'
+SALT = 'config.profiling'
+MAX_STATEMENTS = 500
+MAX_SQL_LENGTH = 2000
+
+captured_sql = contextvars.ContextVar('captured_sql', default=None)
+
+
+def issue_token():
+    return signing.TimestampSigner(salt=SALT).sign('profile')
+
+
+def valid_token(token):
+    try:
+        signing.TimestampSigner(salt=SALT).unsign(token, max_age=settings.PROFILE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def should_profile(request):
+    token = request.headers.get(HEADER)
+    if token:
+        return 'header' if valid_token(token) else None
+    if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+        return 'sample'
+    return None
+
+
+def capture_query(execute, sql, params, many, context):
+    statements = captured_sql.get()
+    if statements is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if len(statements) < MAX_STATEMENTS:
+            statements.append({'sql': sql[:MAX_SQL_LENGTH], 'ms': round((time.perf_counter() - started) * 1000, 3)})
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if capture_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, capture_query)
+
+
+def prune(directory, keep):
+    captures = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    for name in captures[:max(0, len(captures) - keep)]:
+        for path in (name, name[:-len('.json')] + '.prof'):
+            try:
+                os.remove(os.path.join(directory, path))
+            except FileNotFoundError:
+                pass
+
+
+def save_capture(request, response, profiler, statements, trigger, elapsed):
+    directory = settings.PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    match = getattr(request, 'resolver_match', None)
+    view = (match.url_name or match.view_name) if match else 'unmatched'
+    # Sortable by time, so pruning drops the oldest
+    capture_id = f'{datetime.datetime.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:6]}'
+    profiler.dump_stats(os.path.join(directory, f'{capture_id}.prof'))
+    with open(os.path.join(directory, f'{capture_id}.json'), 'w') as f:
+        json.dump({
+            'id': capture_id,
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code if response is not None else 500,
+            'trigger': trigger,
+            'elapsed_ms': round(elapsed * 1000, 3),
+            'queries': statements,
+        }, f)
+    prune(directory, settings.PROFILE_MAX_CAPTURES)
+    return capture_id
+
+
+class ProfilerMiddleware:
+    """Capture a cProfile and the SQL of requests selected by ``should_profile``."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        capture = self.start(request)
+        if capture is None:
+            return self.get_response(request)
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            self.finish(request, response, *capture)
+
+    async def __acall__(self, request):
+        capture = self.start(request)
+        if capture is None:
+            return await self.get_response(request)
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            self.finish(request, response, *capture)
+
+    def start(self, request):
+        trigger = should_profile(request)
+        if trigger is None:
+            return None
+        for connection in connections.all(initialized_only=True):
+            instrument_connection(None, connection)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return None  # Another profiler is already running in this thread
+        statements = []
+        return profiler, statements, captured_sql.set(statements), trigger, time.perf_counter()
+
+    def finish(self, request, response, profiler, statements, token, trigger, started):
+        profiler.disable()
+        elapsed = time.perf_counter() - started
+        captured_sql.reset(token)
+        capture_id = save_capture(request, response, profiler, statements, trigger, elapsed)
+        if response is not None:
+            response['X-Profile-Id'] = capture_id
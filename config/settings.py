@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 load_dotenv()  # Load env variables from .env
@@ -26,6 +27,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.metrics.MetricsMiddleware',  # First, so it times the whole stack
+    'config.profiling.ProfilerMiddleware',  # Opt-in, see PROFILE_* below
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,6 +72,13 @@ if os.getenv('DB_HOST') == 'db' or os.getenv('IN_DOCKER', 'False') == 'True':
             'PORT': os.getenv('DB_PORT', '5432'),
         }
     }
+    # Response cache shared by every web worker (Celery uses db 0)
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('CACHE_URL', 'redis://redis:6379/1'),
+        }
+    }
 else:
     # SQLite for local development
     DATABASES = {
@@ -77,6 +87,12 @@ else:
             'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
         }
     }
+    # Per-process memory cache for local development
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -120,3 +136,65 @@ CELERY_BROKER_URL = "redis://redis:6379/0"
 CELERY_RESULT_BACKEND = "redis://redis:6379/0"
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
+CELERY_TIMEZONE = TIME_ZONE
+
+# Periodic tasks, run by the celery-beat service
+CELERY_BEAT_SCHEDULE = {
+    'deactivate-expired-loans': {
+        'task': 'loans.tasks.deactivate_expired_loans',
+        'schedule': crontab(hour=0, minute=5),
+    },
+}
+
+# Excel ingestion: rows per bulk_create batch (one transaction per batch)
+INGESTION_BATCH_SIZE = int(os.getenv('INGESTION_BATCH_SIZE', '5000'))
+# Parallel ingestion: spreadsheet rows handled by each celery chunk task
+INGESTION_CHUNK_ROWS = int(os.getenv('INGESTION_CHUNK_ROWS', '50000'))
+
+# Maximum applications accepted by /api/loans/check-eligibility/batch/
+ELIGIBILITY_BATCH_MAX_SIZE = int(os.getenv('ELIGIBILITY_BATCH_MAX_SIZE', '1000'))
+
+# Expired-loan sweeper: loans deactivated per UPDATE statement
+LOAN_SWEEP_BATCH_SIZE = int(os.getenv('LOAN_SWEEP_BATCH_SIZE', '10000'))
+
+# Keyset pagination of the list endpoints
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', '100'))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', '1000'))
+
+# Streaming exports: rows fetched per server-side cursor round trip
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+
+# view-loan / view-loans response cache: safety-net expiry, writes invalidate explicitly
+LOAN_CACHE_TIMEOUT = int(os.getenv('LOAN_CACHE_TIMEOUT', '3600'))
+
+# Per-process memo of /check-eligibility/ decisions (entries, seconds)
+ELIGIBILITY_MEMO_SIZE = int(os.getenv('ELIGIBILITY_MEMO_SIZE', '10000'))
+ELIGIBILITY_MEMO_TTL = int(os.getenv('ELIGIBILITY_MEMO_TTL', '300'))
+
+# Idempotency-Key handling for create-loan and register (seconds)
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', '86400'))  # How long a response is replayed
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT', '30'))  # In-flight marker expiry
+IDEMPOTENCY_WAIT_TIMEOUT = int(os.getenv('IDEMPOTENCY_WAIT_TIMEOUT', '10'))  # Duplicate waits this long
+
+# Maximum customers accepted by /api/customers/register/bulk/
+CUSTOMER_BULK_MAX_SIZE = int(os.getenv('CUSTOMER_BULK_MAX_SIZE', '5000'))
+
+# EMI repayment posting: loans per locked chunk / larger requests go to celery
+REPAYMENT_BATCH_SIZE = int(os.getenv('REPAYMENT_BATCH_SIZE', '5000'))
+REPAYMENT_SYNC_MAX_SIZE = int(os.getenv('REPAYMENT_SYNC_MAX_SIZE', '5000'))
+
+# Serve check-eligibility, view-loan and view-loans from the async views (set by the ASGI service)
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
+# Prometheus metrics at /metrics. Each process writes its counters to METRICS_DIR
+# (shared by all workers) every METRICS_FLUSH_INTERVAL seconds; unset = this process only
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+
+# Opt-in request profiling (config/profiling.py): requests with a valid X-Profile-Token
+# header, plus a PROFILE_SAMPLE_RATE fraction of all requests, keep the newest
+# PROFILE_MAX_CAPTURES captures in PROFILE_DIR. Tokens expire after PROFILE_TOKEN_MAX_AGE seconds
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', str(BASE_DIR / 'profiles'))
+PROFILE_MAX_CAPTURES = int(os.getenv('PROFILE_MAX_CAPTURES', '200'))
+PROFILE_TOKEN_MAX_AGE = int(os.getenv('PROFILE_TOKEN_MAX_AGE', '3600'))
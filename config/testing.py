@@ -0,0 +1,69 @@
+import datetime
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from customers.models import Customer
+from loans.models import Loan
+from loans.profiles import rebuild_all_profiles
+
+# Fixtures and assertions shared by the customers and loans test suites.
+
+# Loan counts per customer the query budgets are checked at
+LOAN_TIERS = (1, 10, 500)
+
+
+def make_customer(**fields):
+    """A customer with the usual test values (Asha Rao, 80000 a month); ``fields`` override them."""
+    defaults = {'first_name': 'Asha', 'last_name': 'Rao', 'age': 35, 'phone_number': '42',
+                'monthly_income': 80000, 'approved_limit': 2900000}
+    return Customer.objects.create(**{**defaults, **fields})
+
+
+def make_loan(customer, **fields):
+    """A saved loan (signals run, so the credit profile follows); ``fields`` override the defaults."""
+    defaults = {'loan_amount': 100000, 'tenure': 12, 'interest_rate': 10, 'monthly_repayment': 8800}
+    return Loan.objects.create(customer=customer, **{**defaults, **fields})
+
+
+def tier_loan_id(count, i):
+    return f'B{count:03d}{i:05d}'
+
+
+def make_loan_tiers(tiers=LOAN_TIERS):
+    """One customer per tier holding that many loans, bulk inserted and profiled: ``{count: customer}``.
+
+    Income and limit are high enough that every tier is still approved for new loans.
+    """
+    customers = {}
+    for count in tiers:
+        customer = make_customer(phone_number=str(count), monthly_income=10000000, approved_limit=360000000)
+        Loan.objects.bulk_create([
+            Loan(customer=customer, loan_id=tier_loan_id(count, i), loan_amount=100000 + i * 10,
+                 tenure=12 + i % 48, interest_rate=10 + i % 5, monthly_repayment=5000, emis_paid_on_time=i % 12,
+                 start_date=datetime.date(2020, 1, 1) + datetime.timedelta(days=i),
+                 end_date=datetime.date(2030, 1, 1))
+            for i in range(count)
+        ])
+        customers[count] = customer
+    rebuild_all_profiles()
+    return customers
+
+
+class QueryBudgetMixin:
+    """``assertWithinBudget`` for TestCases: query count and response bytes of one request."""
+
+    def assertWithinBudget(self, method, name, args=(), data=None, queries=0, size=0, status=200):
+        cache.clear()  # Cached reads are budgeted on a miss
+        url = reverse(name, args=args)
+        with CaptureQueriesContext(connection) as captured:
+            if method == 'get':
+                response = self.client.get(url, data)
+            else:
+                response = getattr(self.client, method)(url, data, content_type='application/json')
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+        self.assertEqual(response.status_code, status, body[:500])
+        self.assertLessEqual(len(captured), queries,
+                             '\n'.join([f'{name} ran {len(captured)} queries:'] + [q['sql'] for q in captured]))
+        self.assertLessEqual(len(body), size, f'{name} returned {len(body)} bytes')
+        return response
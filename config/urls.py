@@ -3,11 +3,13 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 import os  
+from .metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/customers/', include('customers.urls')),
     path('api/loans/', include('loans.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Conditional static and media serving for development (DEBUG=True)
@@ -0,0 +1,39 @@
+import numpy as np
+from django.db.models import BigIntegerField, Case, F, Value, When
+from django.db.models.functions import Cast, Mod
+from django.db.models.lookups import Exact, GreaterThan
+
+# approved_limit = 36 * monthly_income, rounded to the nearest lakh.
+# Python's round() rounds halves to even, which the SQL version reproduces
+# with integer arithmetic and the NumPy version with np.rint, so all agree.
+
+LAKH = 100000
+
+
+def calculate_approved_limit(monthly_income):
+    return round(36 * monthly_income / LAKH) * LAKH
+
+
+def approved_limits(monthly_incomes):
+    """``calculate_approved_limit`` for a whole list in one NumPy pass.
+
+    np.rint rounds halves to even on the same float64 quotient, so the
+    results are identical to the scalar function.
+    """
+    incomes = np.asarray(monthly_incomes, dtype=float)
+    return (np.rint(36 * incomes / LAKH) * LAKH).astype(np.int64).tolist()
+
+
+def approved_limit_expression(field='monthly_income'):
+    """SQL equivalent of ``calculate_approved_limit`` for non-negative incomes."""
+    # 36 * income overflows a 32-bit integer column from an income of ~59.7M, so work in bigint
+    amount = Cast(F(field), BigIntegerField()) * 36
+    lakhs = amount / Value(LAKH)  # Integer division on integer columns
+    remainder = Mod(amount, Value(LAKH))
+    rounded = Case(
+        When(GreaterThan(remainder, LAKH // 2), then=lakhs + 1),
+        When(Exact(remainder, LAKH // 2) & Exact(Mod(lakhs, Value(2)), 1), then=lakhs + 1),
+        default=lakhs,
+        output_field=BigIntegerField(),
+    )
+    return rounded * LAKH
@@ -1,16 +1,53 @@
-from django.core.management.base import BaseCommand
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Max, Min
+from customers.limits import approved_limit_expression
 from customers.models import Customer
+from loans.cache import ALL_CUSTOMERS, bump_versions
 
 class Command(BaseCommand):
     help = 'Update approved_limit for existing customers based on monthly_income'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Primary-key range covered by each UPDATE statement')
+        parser.add_argument('--only-changed', action='store_true',
+                            help='Only write rows whose approved_limit actually changes')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report how many customers would be updated without writing')
+
     def handle(self, *args, **options):
-        customers = Customer.objects.all()
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive integer')
+        started = time.monotonic()
+        # Customers without an ingested income keep their limit
+        customers = Customer.objects.filter(monthly_income__gt=0)
+        if options['only_changed'] or options['dry_run']:
+            customers = customers.alias(new_limit=approved_limit_expression()).exclude(
+                approved_limit=F('new_limit')
+            )
+
+        bounds = Customer.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        batch_size = options['batch_size']
         updated_count = 0
-        for customer in customers:
-            # Assuming monthly_income was ingested from Excel; if it's 0, skip or set placeholder
-            if customer.monthly_income > 0:  # Only update if income is set
-                customer.approved_limit = round(36 * customer.monthly_income / 100000) * 100000
-                customer.save()
-                updated_count += 1
-        self.stdout.write(self.style.SUCCESS(f'Successfully updated {updated_count} customers'))
+        if bounds['low'] is not None:
+            # The limit is computed by the database, one UPDATE per primary-key range
+            for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+                chunk = customers.filter(pk__gte=start, pk__lt=start + batch_size)
+                if options['dry_run']:
+                    updated_count += chunk.count()
+                    continue
+                with transaction.atomic():
+                    updated_count += chunk.update(approved_limit=approved_limit_expression())
+            if not options['dry_run']:
+                # update() skips signals; memoised eligibility decisions depend on the limit
+                bump_versions([ALL_CUSTOMERS])
+
+        elapsed = time.monotonic() - started
+        rate = updated_count / elapsed if elapsed else 0.0
+        summary = f'{updated_count} customers in {elapsed:.2f}s ({rate:.0f} rows/sec)'
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Dry run: would update {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Successfully updated {summary}'))
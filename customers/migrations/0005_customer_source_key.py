@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_customer_current_debt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='source_hash',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='source_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
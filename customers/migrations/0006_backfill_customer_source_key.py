@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def rekey_ingested_customers(apps, schema_editor):
+    # Incremental ingestion used to key customers on their phone number, which
+    # merged people sharing one. It now keys them on the file's customer_id
+    # column, so re-key the customers it wrote (the only ones with a source_key)
+    # to their customer_id; their content hash is unchanged. Customers created
+    # through the API or plain ingestion keep a NULL key and are never updated
+    # by an ingestion run.
+    Customer = apps.get_model('customers', 'Customer')
+    Customer.objects.filter(source_key__isnull=False).update(source_key=F('customer_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0005_customer_source_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(rekey_ingested_customers, migrations.RunPython.noop),
+    ]
@@ -15,6 +15,16 @@ class Customer(models.Model):
     approved_limit = models.IntegerField()
     current_debt = models.IntegerField(default=0)  
     created_at = models.DateTimeField(default=timezone.now)
+    # Incremental ingestion: id column and content hash of the source row
+    source_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    source_hash = models.CharField(max_length=32, blank=True, default='')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # customer_id as stored, so a save that renames it can drop caches keyed by the old one
+        instance._loaded_customer_id = instance.__dict__.get('customer_id')
+        return instance
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.customer_id})"
@@ -1,10 +1,42 @@
 from rest_framework import serializers
 from .models import Customer  # Import the actual model from models.py
+from .limits import calculate_approved_limit
 
-class CustomerSerializer(serializers.ModelSerializer):
+def requested_fields(request):
+    """Field names from ``?fields=a,b,c``, or None when not given."""
+    fields = request.query_params.get('fields')
+    if not fields:
+        return None
+    return [name.strip() for name in fields.split(',') if name.strip()]
+
+
+def projected_columns(model, fields):
+    """The model columns behind requested field names, for ``QuerySet.only()``."""
+    columns = {field.name for field in model._meta.concrete_fields}
+    return [name for name in fields if name in columns]
+
+
+class FieldsProjectionMixin:
+    """Let callers pass ``fields=[...]`` to only serialise a subset of the fields.
+
+    Unknown names raise a ValidationError (a 400 response) rather than being dropped silently.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            unknown = [name for name in fields if name not in self.fields]
+            if unknown:
+                raise serializers.ValidationError({'fields': [f"Unknown field: {name}" for name in unknown]})
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class CustomerSerializer(FieldsProjectionMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer  # References the model from models.py
-        fields = '__all__'
+        exclude = ['source_key', 'source_hash']  # Ingestion bookkeeping only
 
 # New serializer for registration (fixed inheritance and imports)
 class CustomerRegistrationSerializer(serializers.ModelSerializer):
@@ -21,7 +53,7 @@ class CustomerRegistrationSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         # Calculate approved_limit: 36 * monthly_income, rounded to nearest lakh
         monthly_income = validated_data.get('monthly_income', 0)
-        approved_limit = round(36 * monthly_income / 100000) * 100000
+        approved_limit = calculate_approved_limit(monthly_income)
         customer = Customer.objects.create(
             approved_limit=approved_limit,
             current_debt=0,  
@@ -1,2 +1,181 @@
-from django.test import TestCase
+import random
+from io import StringIO
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .limits import approved_limit_expression, approved_limits, calculate_approved_limit
+from .models import Customer
+from config.testing import QueryBudgetMixin, make_loan_tiers
+
+
+class UpdateCustomerLimitsTests(TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        # Halves (e.g. 36 * 125000 = 45 lakh exactly + 0.5 lakh) exercise round-half-even
+        incomes = [0, 1, 1388, 1389, 4166, 4167, 125000, 137500, 59722] + [rng.randint(1, 10 ** 7) for _ in range(200)]
+        incomes += [50000 * k // 36 for k in range(1, 40)]
+        self.customers = [
+            Customer.objects.create(first_name='F', last_name='L', age=30, phone_number=str(i),
+                                    monthly_income=income, approved_limit=-1)
+            for i, income in enumerate(incomes)
+        ]
+
+    def assertLimitsMatchPython(self):
+        for customer in Customer.objects.filter(monthly_income__gt=0):
+            self.assertEqual(customer.approved_limit, calculate_approved_limit(customer.monthly_income),
+                             f'income {customer.monthly_income}')
+
+    def test_database_rounding_matches_python(self):
+        call_command('update_customer_limits', batch_size=37, stdout=StringIO())
+        self.assertLimitsMatchPython()
+        # Customers without income are left untouched
+        self.assertEqual(Customer.objects.get(monthly_income=0).approved_limit, -1)
+
+    def test_dry_run_writes_nothing(self):
+        call_command('update_customer_limits', dry_run=True, stdout=StringIO())
+        self.assertFalse(Customer.objects.exclude(approved_limit=-1).exists())
+
+    def test_batch_size_must_be_positive(self):
+        for batch_size in (0, -5):
+            with self.subTest(batch_size=batch_size):
+                with self.assertRaisesMessage(CommandError, '--batch-size must be a positive integer'):
+                    call_command('update_customer_limits', batch_size=batch_size, stdout=StringIO())
+        self.assertFalse(Customer.objects.exclude(approved_limit=-1).exists())
+
+    def test_only_changed_skips_up_to_date_rows(self):
+        call_command('update_customer_limits', stdout=StringIO())
+        customer = Customer.objects.filter(monthly_income__gt=10 ** 6).first()
+        Customer.objects.filter(pk=customer.pk).update(approved_limit=0)
+        out = StringIO()
+        call_command('update_customer_limits', only_changed=True, stdout=out)
+        self.assertIn('Successfully updated 1 customers', out.getvalue())
+        self.assertLimitsMatchPython()
+
+    def test_expression_does_not_overflow_32_bit_integers(self):
+        # 36 * 59652324 is just past 2 ** 31 - 1
+        incomes = [59652323, 59652324, 10 ** 8]
+        Customer.objects.bulk_create([
+            Customer(first_name='F', last_name='L', age=30, phone_number=f'x{income}', monthly_income=income,
+                     approved_limit=0)
+            for income in incomes
+        ])
+        limits = Customer.objects.filter(monthly_income__in=incomes).annotate(limit=approved_limit_expression())
+        self.assertEqual(dict(limits.values_list('monthly_income', 'limit')),
+                         {income: calculate_approved_limit(income) for income in incomes})
+
+
+class RegisterIdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.payload = {'first_name': 'Asha', 'last_name': 'Rao', 'age': 35,
+                        'monthly_income': 80000, 'phone_number': '9876543210'}
+
+    def register(self, key, **changes):
+        return self.client.post(reverse('register'), {**self.payload, **changes}, content_type='application/json',
+                                headers={'Idempotency-Key': key})
+
+    def test_retry_replays_the_first_response(self):
+        first = self.register('abc')
+        retry = self.register('abc')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Customer.objects.count(), 1)
+
+        self.register('other')
+        self.assertEqual(Customer.objects.count(), 2)
+
+    def test_reused_key_with_another_payload_is_rejected(self):
+        self.register('abc')
+        self.assertEqual(self.register('abc', age=40).status_code, 422)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0)
+    def test_duplicate_of_an_in_flight_request_does_not_run(self):
+        self.register('abc')
+        key = 'idempotency:register:busy'
+        first = cache.get('idempotency:register:abc')
+        cache.set(key, {**first, 'state': 'in-flight'})
+        self.assertEqual(self.register('busy').status_code, 409)
+        self.assertEqual(Customer.objects.count(), 1)
+
+
+class BulkRegisterTests(TestCase):
+    def test_vectorised_limits_match_scalar_rounding(self):
+        # 36 * income lands exactly on half a lakh for these, exercising round-half-even
+        incomes = [0, 1, 12500, 37500, 62500, 80000, 138889, 10 ** 7] + [random.randint(0, 10 ** 6) for _ in range(500)]
+        self.assertEqual(approved_limits(incomes), [calculate_approved_limit(income) for income in incomes])
+
+    def test_valid_items_are_created_in_one_request(self):
+        items = [
+            {'first_name': 'Asha', 'last_name': 'Rao', 'age': 35, 'monthly_income': 62500, 'phone_number': '1'},
+            {'first_name': 'Ravi', 'age': 'old', 'monthly_income': 50000, 'phone_number': '2'},
+            {'first_name': 'Mira', 'last_name': 'Das', 'age': 28, 'monthly_income': 37500, 'phone_number': '3'},
+        ]
+        response = self.client.post(reverse('register_bulk'), {'customers': items}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        results = response.json()
+        self.assertEqual([result.get('name') for result in results], ['Asha Rao', None, 'Mira Das'])
+        self.assertEqual(set(results[1]), {'last_name', 'age'})
+        self.assertEqual(results[0]['approved_limit'], 2200000)
+        self.assertEqual(results[2]['approved_limit'], 1400000)
+        self.assertEqual(Customer.objects.filter(customer_id__in=[results[0]['customer_id'],
+                                                                  results[2]['customer_id']]).count(), 2)
+
+    def test_all_invalid_is_a_bad_request(self):
+        response = self.client.post(reverse('register_bulk'), [{'first_name': 'X'}], content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Customer.objects.count(), 0)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Fixed query-count and response-size ceilings for every customers endpoint (see loans.tests.QueryBudgetTests)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Customer.objects.bulk_create([
+            Customer(first_name='Ravi', last_name='Kumar', age=30 + i % 30, phone_number=str(9000000000 + i),
+                     monthly_income=50000 + i, approved_limit=1800000)
+            for i in range(500)
+        ])
+        cls.customers = make_loan_tiers()
+
+    def test_customer_list(self):
+        self.assertWithinBudget('get', 'customer-list-create', queries=1, size=250 * settings.API_PAGE_SIZE)
+        response = self.assertWithinBudget('get', 'customer-list-create', data={'fields': 'customer_id,first_name'},
+                                           queries=1, size=60 * settings.API_PAGE_SIZE)
+        self.assertEqual({tuple(customer) for customer in response.json()['results']}, {('customer_id', 'first_name')})
+        response = self.client.get(reverse('customer-list-create'), {'fields': 'customer_id,name'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'fields': ['Unknown field: name']})
+        data = {'first_name': 'Mira', 'last_name': 'Das', 'age': 28, 'phone_number': '3', 'monthly_income': 37500,
+                'approved_limit': 1400000}
+        self.assertWithinBudget('post', 'customer-list-create', data=data, queries=1, size=250, status=201)
+
+    def test_customer_detail(self):
+        data = {'first_name': 'Asha', 'last_name': 'Rao', 'age': 36, 'phone_number': '1',
+                'monthly_income': 10000000, 'approved_limit': 360000000}
+        for count, customer in self.customers.items():
+            with self.subTest(loans=count):
+                self.assertWithinBudget('get', 'customer-detail', [customer.pk], queries=1, size=250)
+                # Select, update, then the cache invalidation reads the customer's loan ids
+                self.assertWithinBudget('put', 'customer-detail', [customer.pk], data=data, queries=4, size=250)
+                self.assertWithinBudget('patch', 'customer-detail', [customer.pk], data={'age': 37}, queries=4,
+                                        size=250)
+                # Django deletes cascaded rows 100 ids per statement; the loan signals add nothing per loan
+                self.assertWithinBudget('delete', 'customer-detail', [customer.pk], queries=6 + count // 100,
+                                        status=204)
+
+    def test_register(self):
+        data = {'first_name': 'Mira', 'last_name': 'Das', 'age': 28, 'monthly_income': 37500, 'phone_number': '3'}
+        self.assertWithinBudget('post', 'register', data=data, queries=1, size=200, status=201)
+        self.assertWithinBudget('post', 'register_bulk', data=[data] * 200, queries=5, size=200 * 200, status=201)
+
+    def test_customer_export(self):
+        rows = Customer.objects.count()
+        self.assertWithinBudget('get', 'customer_export', queries=1, size=260 * rows)
+        self.assertWithinBudget('get', 'customer_export', data={'format': 'csv'}, queries=1, size=110 * rows)
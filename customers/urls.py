@@ -2,7 +2,9 @@ from django.urls import path
 from .views import (
     CustomerListCreateAPIView,
     CustomerRetrieveUpdateDestroyAPIView,
-    RegisterCustomerView
+    RegisterCustomerView,
+    BulkRegisterCustomerView,
+    customer_export
 )
 
 urlpatterns = [
@@ -12,4 +14,8 @@ urlpatterns = [
     
     # Registration route 
     path('register/', RegisterCustomerView.as_view(), name='register'),              
+    path('register/bulk/', BulkRegisterCustomerView.as_view(), name='register_bulk'),
+
+    # Streaming NDJSON/CSV export
+    path('export/', customer_export, name='customer_export'),
 ]
@@ -1,11 +1,30 @@
 
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
 from rest_framework import generics
+from config.exports import ExportError, date_param, export_response
+from config.idempotency import idempotent
+from config.pagination import KeysetPagination
 from .models import Customer
-from .serializers import CustomerSerializer
+from .serializers import CustomerSerializer, projected_columns, requested_fields
 
 class CustomerListCreateAPIView(generics.ListCreateAPIView):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
+    pagination_class = KeysetPagination
+
+    # ?fields=a,b limits both the selected columns and the response keys
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = requested_fields(self.request)
+        if self.request.method == 'GET' and fields is not None:
+            queryset = queryset.only(*projected_columns(Customer, fields))
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method == 'GET':
+            kwargs.setdefault('fields', requested_fields(self.request))
+        return super().get_serializer(*args, **kwargs)
 
 class CustomerRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Customer.objects.all()
@@ -17,11 +36,64 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from .serializers import CustomerRegistrationSerializer  
+from django.conf import settings
+from django.db import transaction
+from .limits import approved_limits
 
 class RegisterCustomerView(APIView):
+    @idempotent('register')
     def post(self, request):
         serializer = CustomerRegistrationSerializer(data=request.data)
         if serializer.is_valid():
             customer = serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+# BulkRegisterCustomerView: validates a list, prices every approved_limit in
+# one NumPy pass and inserts the valid customers with bulk_create
+class BulkRegisterCustomerView(APIView):
+    @idempotent('register-bulk')
+    def post(self, request):
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get('customers')
+        if not isinstance(items, list) or not items:
+            return Response({"error": "Expected a non-empty list of customers"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.CUSTOMER_BULK_MAX_SIZE:
+            return Response({"error": f"At most {settings.CUSTOMER_BULK_MAX_SIZE} customers per request"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        serializers = [CustomerRegistrationSerializer(data=item) for item in items]
+        ok = [serializer.is_valid() for serializer in serializers]
+        valid = [serializer for serializer, is_valid in zip(serializers, ok) if is_valid]
+        limits = approved_limits([serializer.validated_data['monthly_income'] for serializer in valid])
+        customers = [
+            Customer(approved_limit=limit, current_debt=0, **serializer.validated_data)
+            for serializer, limit in zip(valid, limits)
+        ]
+        with transaction.atomic():
+            Customer.objects.bulk_create(customers, batch_size=settings.INGESTION_BATCH_SIZE)
+
+        created = iter(CustomerRegistrationSerializer(customers, many=True).data)
+        # Same order as the request: the registration, or that item's validation errors
+        results = [next(created) if is_valid else serializer.errors for serializer, is_valid in zip(serializers, ok)]
+        return Response(results, status=status.HTTP_201_CREATED if customers else status.HTTP_400_BAD_REQUEST)
+
+
+CUSTOMER_EXPORT_COLUMNS = ['customer_id', 'first_name', 'last_name', 'age', 'phone_number',
+                           'monthly_income', 'approved_limit', 'current_debt', 'created_at']
+
+# Streams every matching customer as NDJSON or CSV (?from/?to filter on created_at)
+@require_GET
+def customer_export(request):
+    customers = Customer.objects.order_by('id')
+    try:
+        created_from, created_to = date_param(request, 'from'), date_param(request, 'to')
+    except ExportError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if created_from:
+        customers = customers.filter(created_at__date__gte=created_from)
+    if created_to:
+        customers = customers.filter(created_at__date__lte=created_to)
+    return export_response(request, customers, CUSTOMER_EXPORT_COLUMNS, CUSTOMER_EXPORT_COLUMNS, 'customers')
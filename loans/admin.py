@@ -1,4 +1,5 @@
 from django.contrib import admin
-from .models import Loan
+from .models import CustomerCreditProfile, Loan
 
 admin.site.register(Loan)
+admin.site.register(CustomerCreditProfile)
@@ -0,0 +1,65 @@
+import json
+import logging
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from . import cache, memo
+from .serializers import EligibilityApplicationSerializer
+from .views import eligibility_response
+
+# Async versions of the hot endpoints for the ASGI deployment (ASYNC_VIEWS=True,
+# see loans/urls.py). They give the same responses as CheckEligibilityView,
+# ViewLoanView and ViewLoansView but wait on the async ORM and cache APIs, so
+# a slow database round trip does not hold a worker.
+
+logger = logging.getLogger(__name__)
+
+
+def request_data(request):
+    if request.content_type == 'application/json':
+        return json.loads(request.body or b'{}')
+    return request.POST
+
+
+# check_eligibility view
+@csrf_exempt  # As for DRF's APIView, which skips CSRF for unauthenticated clients
+@require_POST
+async def check_eligibility(request):
+    try:
+        data = request_data(request)
+    except ValueError as e:
+        return JsonResponse({"detail": f"JSON parse error - {e}"}, status=400)
+
+    serializer = EligibilityApplicationSerializer(data=data)
+    if not serializer.is_valid():
+        logger.error(f"Eligibility validation error: {serializer.errors}")
+        return JsonResponse(serializer.errors, status=400)
+
+    data = serializer.validated_data
+    decision = await memo.aeligibility(data['customer_id'], data['loan_amount'], data['interest_rate'],
+                                       data['tenure'])
+    if decision is None:
+        errors = {"customer_id": ["Customer does not exist"]}
+        logger.error(f"Eligibility validation error: {errors}")
+        return JsonResponse(errors, status=400)
+    return JsonResponse(eligibility_response(data, *decision))
+
+
+# view_loan view
+@require_GET
+async def view_loan(request, loan_id):
+    response = await cache.aloan_detail(loan_id)
+    if response is None:
+        return JsonResponse({"error": "Loan not found"}, status=404)
+    return JsonResponse(response)
+
+
+# view_loans view
+@require_GET
+async def view_loans(request, customer_id):
+    response = await cache.acustomer_loans(customer_id)
+    if response is None:
+        return JsonResponse({"error": "Customer not found"}, status=404)
+    if not response:
+        return JsonResponse({"message": "No loans found for this customer"})
+    return JsonResponse(response, safe=False)
@@ -0,0 +1,187 @@
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from customers.models import Customer
+from . import reads
+from .models import Loan
+
+# Read-through cache in front of loans/reads.py for /view-loan/ and
+# /view-loans/, keyed by loan_id and customer_id. Every path that writes loans
+# or the customer columns those responses show drops the affected keys:
+# single-row writes through loans/signals.py, ingestion and the expired-loan
+# sweeper explicitly. Keys are deleted once the transaction commits, which also
+# drops entries cached from the old rows while the write was in flight. It is
+# not a fence: a reader that loaded its rows before the commit can still store
+# that snapshot just after the delete, and the entry is then served until
+# LOAN_CACHE_TIMEOUT expires it, which bounds how stale a response can get.
+#
+# The same writes bump a per-customer state version, which keys the memoised
+# eligibility decisions in loans/memo.py. Versions expire with the memo
+# entries they key (ELIGIBILITY_MEMO_TTL): a version that is gone simply comes
+# back as a new token, and ids that never resolve to a customer do not leave
+# keys behind.
+
+ENDPOINTS = ('view_loan', 'view_loans', 'check_eligibility')
+ALL_CUSTOMERS = '*'
+
+
+def loan_key(loan_id):
+    return f'loans:view-loan:{loan_id}'
+
+
+def customer_loans_key(customer_id):
+    return f'loans:view-loans:{customer_id}'
+
+
+def version_key(customer_id):
+    return f'loans:state-version:{customer_id}'
+
+
+def version_timeout():
+    return max(settings.ELIGIBILITY_MEMO_TTL, 1)
+
+
+def stats_key(endpoint, outcome):
+    return f'loans:cache-stats:{endpoint}:{outcome}'
+
+
+def record(endpoint, outcome):
+    # Counters live in the cache itself so every worker adds to the same totals
+    key = stats_key(endpoint, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+async def arecord(endpoint, outcome):
+    key = stats_key(endpoint, outcome)
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        if not await cache.aadd(key, 1, timeout=None):
+            await cache.aincr(key)
+
+
+def read_through(endpoint, key, load):
+    value = cache.get(key)
+    if value is not None:
+        record(endpoint, 'hits')
+        return value
+    record(endpoint, 'misses')
+    value = load()
+    # Unknown loans/customers (None) are not cached
+    if value is not None:
+        cache.set(key, value, settings.LOAN_CACHE_TIMEOUT)
+    return value
+
+
+def loan_detail(loan_id):
+    return read_through('view_loan', loan_key(loan_id), lambda: reads.loan_detail(loan_id))
+
+
+def customer_loans(customer_id):
+    return read_through('view_loans', customer_loans_key(customer_id), lambda: reads.customer_loans(customer_id))
+
+
+async def aread_through(endpoint, key, load):
+    value = await cache.aget(key)
+    if value is not None:
+        await arecord(endpoint, 'hits')
+        return value
+    await arecord(endpoint, 'misses')
+    value = await load()
+    if value is not None:
+        await cache.aset(key, value, settings.LOAN_CACHE_TIMEOUT)
+    return value
+
+
+async def aloan_detail(loan_id):
+    return await aread_through('view_loan', loan_key(loan_id), lambda: reads.aloan_detail(loan_id))
+
+
+async def acustomer_loans(customer_id):
+    return await aread_through('view_loans', customer_loans_key(customer_id),
+                               lambda: reads.acustomer_loans(customer_id))
+
+
+def stats():
+    """``{endpoint: {'hits', 'misses', 'hit_ratio'}}`` summed over every worker."""
+    keys = [stats_key(endpoint, outcome) for endpoint in ENDPOINTS for outcome in ('hits', 'misses')]
+    counts = cache.get_many(keys)
+    result = {}
+    for endpoint in ENDPOINTS:
+        hits = counts.get(stats_key(endpoint, 'hits'), 0)
+        misses = counts.get(stats_key(endpoint, 'misses'), 0)
+        result[endpoint] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        }
+    return result
+
+
+def reset_stats():
+    cache.delete_many([stats_key(endpoint, outcome) for endpoint in ENDPOINTS for outcome in ('hits', 'misses')])
+
+
+def state_version(customer_id):
+    """Opaque token that changes whenever the customer's loans or the customer change.
+
+    Combines the customer's own version with a global one (bumped by bulk
+    rewrites of every customer). Tokens are random rather than counters, so an
+    evicted version can never come back with a value that was already used.
+    """
+    keys = [version_key(ALL_CUSTOMERS), version_key(customer_id)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, timeout=version_timeout())
+            versions[key] = cache.get(key)
+    return tuple(versions[key] for key in keys)
+
+
+async def astate_version(customer_id):
+    keys = [version_key(ALL_CUSTOMERS), version_key(customer_id)]
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, uuid.uuid4().hex, timeout=version_timeout())
+            versions[key] = await cache.aget(key)
+    return tuple(versions[key] for key in keys)
+
+
+def bump_versions(customer_ids):
+    """Give ``customer_ids`` (or ``[ALL_CUSTOMERS]``) a new state version once the transaction commits."""
+    keys = [version_key(customer_id) for customer_id in customer_ids]
+    if keys:
+        transaction.on_commit(
+            lambda: cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=version_timeout()))
+
+
+def delete_on_commit(keys):
+    keys = list(keys)
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_loans(loan_ids=(), customer_pks=()):
+    """Drop the cached detail of ``loan_ids`` and the loan lists of ``customer_pks``."""
+    customer_ids = list(Customer.objects.filter(pk__in=set(customer_pks)).values_list('customer_id', flat=True))
+    delete_on_commit(
+        [loan_key(loan_id) for loan_id in loan_ids]
+        + [customer_loans_key(customer_id) for customer_id in customer_ids]
+    )
+    bump_versions(customer_ids)
+
+
+def invalidate_customers(customer_pks):
+    """Drop everything cached for ``customer_pks``: their loan lists and every loan detail,
+    which embeds the customer's name, phone number and age."""
+    customer_pks = set(customer_pks)
+    if not customer_pks:
+        return
+    loan_ids = Loan.objects.filter(customer_id__in=customer_pks).values_list('loan_id', flat=True)
+    invalidate_loans(loan_ids, customer_pks)
@@ -0,0 +1,81 @@
+import math
+import numpy as np
+
+# EMI and amortisation maths on NumPy arrays. The array functions accept
+# scalars or equally-shaped arrays of (principal, annual rate in %, tenure in
+# months), so pricing thousands of offers is a single vectorised pass.
+
+
+def monthly_installments(principal, rate, tenure):
+    """Compound-interest EMI for each (principal, rate, tenure) triple."""
+    principal = np.asarray(principal, dtype=float)
+    monthly_rate = np.asarray(rate, dtype=float) / 12 / 100
+    tenure = np.asarray(tenure, dtype=float)
+    growth = np.power(1 + monthly_rate, tenure)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        amortised = principal * monthly_rate * growth / (growth - 1)
+    return np.where(monthly_rate == 0, principal / tenure, amortised)
+
+
+def calculate_emi(principal, rate, tenure):
+    """Scalar EMI for a single loan.
+
+    Uses ``math.pow`` so stored installments stay bit-for-bit what the API has
+    always returned; NumPy's ``power`` can differ from it in the last ulp.
+    """
+    monthly_rate = rate / 12 / 100
+    if monthly_rate == 0:
+        return principal / tenure
+    return principal * monthly_rate * math.pow(1 + monthly_rate, tenure) / (math.pow(1 + monthly_rate, tenure) - 1)
+
+
+def amortisation_schedules(principal, rate, tenure):
+    """Month-by-month split of each loan's installments.
+
+    Returns a dict of ``(loans, max_tenure)`` arrays: ``installment``,
+    ``interest``, ``principal`` and ``balance`` (outstanding after the
+    payment). Months past a loan's own tenure are zero.
+    """
+    principal = np.atleast_1d(np.asarray(principal, dtype=float))
+    monthly_rate = np.atleast_1d(np.asarray(rate, dtype=float)) / 12 / 100
+    tenure = np.atleast_1d(np.asarray(tenure, dtype=int))
+    installment = monthly_installments(principal, rate, tenure)
+
+    months = np.arange(1, tenure.max(initial=0) + 1)
+    within = months[None, :] <= tenure[:, None]
+    r = monthly_rate[:, None]
+    growth = np.power(1 + r, months[None, :])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Closed form of the outstanding balance after k payments
+        balance = np.where(
+            r == 0,
+            principal[:, None] - installment[:, None] * months[None, :],
+            principal[:, None] * growth - installment[:, None] * (growth - 1) / r,
+        )
+    balance = np.where(within, np.clip(balance, 0, None), 0.0)
+    opening = np.hstack([principal[:, None], balance[:, :-1]])
+    interest = np.where(within, opening * r, 0.0)
+    installments = np.where(within, installment[:, None], 0.0)
+    # The final payment clears whatever rounding left on the balance
+    principal_paid = np.where(months[None, :] == tenure[:, None], opening, installments - interest)
+    return {
+        'installment': installments,
+        'interest': interest,
+        'principal': np.where(within, principal_paid, 0.0),
+        'balance': balance,
+    }
+
+
+def amortisation_schedule(principal, rate, tenure):
+    """Rows of ``{month, installment, principal, interest, balance}`` for one loan."""
+    schedule = amortisation_schedules(principal, rate, tenure)
+    return [
+        {
+            'month': month + 1,
+            'installment': float(schedule['installment'][0, month]),
+            'principal': float(schedule['principal'][0, month]),
+            'interest': float(schedule['interest'][0, month]),
+            'balance': float(schedule['balance'][0, month]),
+        }
+        for month in range(int(tenure))
+    ]
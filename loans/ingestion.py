@@ -0,0 +1,311 @@
+import datetime
+import hashlib
+from itertools import islice
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from customers.limits import calculate_approved_limit
+from customers.models import Customer
+from loans import cache
+from loans.loaders import get_loader
+from loans.models import Loan
+from loans.profiles import rebuild_profiles
+
+# Column layout of each source file (header row is skipped for xlsx/csv). The
+# trailing id column is optional: rows that carry one keep it as their public id
+# and can be updated by --incremental runs, rows without one get a generated id
+CUSTOMER_COLUMNS = ('first_name', 'last_name', 'age', 'phone_number', 'monthly_income', 'customer_id')
+LOAN_COLUMNS = ('customer_id', 'loan_amount', 'tenure', 'interest_rate', 'monthly_repayment',
+                'emis_paid_on_time', 'start_date', 'end_date', 'loan_id')
+
+# Only the first N failed rows are kept in the report, the rest are just counted
+MAX_REPORTED_ERRORS = 1000
+
+
+class RowError(Exception):
+    """Raised when a spreadsheet row cannot be turned into a model instance."""
+
+
+class IngestionReport:
+    """Counters and failed rows for one ingestion run, returned as the task result."""
+
+    def __init__(self, source):
+        self.source = source
+        self.rows_read = 0
+        self.rows_inserted = 0
+        self.rows_updated = 0
+        self.rows_unchanged = 0
+        self.rows_failed = 0
+        self.errors = []
+        self.started = timezone.now()
+
+    def add_error(self, row_number, values, message):
+        self.rows_failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({
+                'row': row_number,
+                'values': [None if value is None else str(value) for value in values],
+                'error': str(message),
+            })
+
+    def as_dict(self):
+        elapsed = (timezone.now() - self.started).total_seconds()
+        return {
+            'source': self.source,
+            'started_at': self.started.isoformat(),
+            'rows_read': self.rows_read,
+            'rows_inserted': self.rows_inserted,
+            'rows_updated': self.rows_updated,
+            'rows_unchanged': self.rows_unchanged,
+            'rows_failed': self.rows_failed,
+            'errors': self.errors,
+            'errors_truncated': self.rows_failed > len(self.errors),
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_sec': round(self.rows_read / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def to_date(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value).strip()[:10])
+
+
+def unpack(values, columns, required):
+    values = tuple(values)
+    if len(values) < required:
+        raise RowError(f"Expected at least {required} columns, got {len(values)}")
+    values = values[:len(columns)] + (None,) * (len(columns) - len(values))
+    return dict(zip(columns, values))
+
+
+def source_id(value):
+    """The row's own id column, or None when the file leaves it out."""
+    if value is None or str(value).strip() == '':
+        return None
+    return str(value).strip()
+
+
+def build_customer(values):
+    data = unpack(values, CUSTOMER_COLUMNS, required=4)
+    monthly_income = int(data['monthly_income'] or 0)
+    customer = Customer(
+        first_name=data['first_name'],
+        last_name=data['last_name'],
+        age=int(data['age']),
+        phone_number=str(data['phone_number']),
+        monthly_income=monthly_income,
+        approved_limit=calculate_approved_limit(monthly_income),
+        created_at=timezone.now(),
+    )
+    return with_source_id(customer, 'customer_id', data['customer_id'])
+
+
+def build_loan(values, customer_pks, today):
+    data = unpack(values, LOAN_COLUMNS, required=8)
+    customer_pk = customer_pks.get(str(data['customer_id']))
+    if customer_pk is None:
+        raise RowError(f"Customer not found: {data['customer_id']}")
+    end_date = to_date(data['end_date'])
+    loan = Loan(
+        customer_id=customer_pk,
+        loan_amount=float(data['loan_amount']),
+        tenure=int(data['tenure']),
+        interest_rate=float(data['interest_rate']),
+        monthly_repayment=float(data['monthly_repayment']),
+        emis_paid_on_time=int(data['emis_paid_on_time']),
+        start_date=to_date(data['start_date']),
+        end_date=end_date,
+        # bulk_create skips Loan.save(), so apply its is_active rule here
+        is_active=not (end_date and end_date < today),
+    )
+    return with_source_id(loan, 'loan_id', data['loan_id'])
+
+
+def with_source_id(instance, field, value):
+    """Use the row's id column, when it has one, as both the public id and ``source_key``."""
+    identifier = source_id(value)
+    if identifier is not None:
+        setattr(instance, field, identifier)
+    instance.source_key = identifier
+    return instance
+
+
+# Incremental ingestion: rows are keyed on their id column (source_key) and get
+# a content hash. Keyed rows whose hash is unchanged are skipped, changed rows
+# are bulk updated and unknown keys are bulk inserted, so re-running a mostly
+# unchanged file only writes the rows that actually changed. Rows without an id
+# cannot be matched to anything and are always inserted.
+
+CUSTOMER_UPDATE_FIELDS = ['first_name', 'last_name', 'age', 'phone_number', 'monthly_income',
+                          'approved_limit', 'source_hash']
+LOAN_UPDATE_FIELDS = ['loan_amount', 'tenure', 'interest_rate', 'monthly_repayment',
+                      'emis_paid_on_time', 'start_date', 'end_date', 'is_active', 'source_hash']
+
+UPDATE_FIELDS = {
+    Customer: CUSTOMER_UPDATE_FIELDS,
+    Loan: LOAN_UPDATE_FIELDS,
+}
+
+
+def fingerprint(instance):
+    """Set ``source_hash`` on an unsaved instance built from a row."""
+    fields = (['customer_id'] + UPDATE_FIELDS[Loan]) if isinstance(instance, Loan) else UPDATE_FIELDS[Customer]
+    content = repr([getattr(instance, field) for field in fields if field != 'source_hash'])
+    instance.source_hash = hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+def upsert_batch(model, rows, report):
+    """Write ``[(row_number, values, instance)]`` by ``source_key``; returns the instances written.
+
+    A row repeating an id already seen in the chunk is reported, not merged.
+    Rows updating a stored one must have been keyed by an earlier ingestion:
+    an id taken by an API-created row fails its insert instead of overwriting it.
+    """
+    keyed, to_insert = {}, []
+    for row in rows:
+        key = row[2].source_key
+        if key is None:
+            to_insert.append(row)
+        elif key in keyed:
+            report.add_error(row[0], row[1], f'Duplicate id {key}, already in row {keyed[key][0]}')
+        else:
+            keyed[key] = row
+
+    existing = {
+        key: (pk, source_hash)
+        for key, pk, source_hash in model.objects.filter(source_key__in=keyed)
+        .values_list('source_key', 'pk', 'source_hash')
+    }
+    to_update = []
+    for key, row in keyed.items():
+        instance = row[2]
+        if key not in existing:
+            to_insert.append(row)
+        elif existing[key][1] == instance.source_hash:
+            report.rows_unchanged += 1
+        else:
+            instance.pk = existing[key][0]
+            to_update.append(instance)
+
+    if to_update:
+        with transaction.atomic():
+            model.objects.bulk_update(to_update, UPDATE_FIELDS[model], batch_size=len(to_update))
+        report.rows_updated += len(to_update)
+    return to_update + insert_batch(model, sorted(to_insert, key=lambda row: row[0]), report)
+
+
+def insert_batch(model, rows, report):
+    """Insert ``[(row_number, values, instance)]`` in one transaction; returns the instances inserted.
+
+    If the batch is rejected by the database, fall back to one savepoint per
+    row so only the offending rows end up in the report.
+    """
+    if not rows:
+        return []
+    instances = [instance for _, _, instance in rows]
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create(instances, batch_size=len(rows))
+        report.rows_inserted += len(rows)
+        return instances
+    except DatabaseError:
+        pass
+
+    inserted = []
+    with transaction.atomic():
+        for row_number, values, instance in rows:
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_create([instance])
+                report.rows_inserted += 1
+                inserted.append(instance)
+            except DatabaseError as e:
+                report.add_error(row_number, values, e)
+    return inserted
+
+
+def ingest_customers(file_path, batch_size=None, min_row=None, max_row=None, progress=None,
+                     incremental=False, file_format=None):
+    def prepare(chunk):
+        return build_customer
+
+    def written(instances):
+        # Updated names/phones appear in cached view-loan responses
+        if incremental:
+            cache.invalidate_customers({customer.pk for customer in instances})
+
+    loader = get_loader(file_path, CUSTOMER_COLUMNS, file_format)
+    return ingest_rows(Customer, loader, prepare, batch_size, min_row, max_row, progress, incremental,
+                       written)
+
+
+def ingest_loans(file_path, batch_size=None, min_row=None, max_row=None, progress=None,
+                 incremental=False, file_format=None):
+    today = timezone.now().date()
+
+    def prepare(chunk):
+        # One lookup per chunk instead of one per row
+        customer_ids = {str(values[0]) for _, values in chunk if values and values[0] is not None}
+        customer_pks = dict(
+            Customer.objects.filter(customer_id__in=customer_ids).values_list('customer_id', 'pk')
+        )
+        return lambda values: build_loan(values, customer_pks, today)
+
+    def written(instances):
+        # bulk_create/bulk_update skip the Loan signals that maintain credit profiles and the cache
+        customer_pks = {loan.customer_id for loan in instances}
+        rebuild_profiles(customer_pks)
+        cache.invalidate_loans([loan.loan_id for loan in instances], customer_pks)
+
+    loader = get_loader(file_path, LOAN_COLUMNS, file_format)
+    return ingest_rows(Loan, loader, prepare, batch_size, min_row, max_row, progress, incremental,
+                       written)
+
+
+def ingest_rows(model, loader, prepare, batch_size, min_row, max_row, progress, incremental, written):
+    """Shared chunk loop: ``prepare(chunk)`` returns the row -> instance builder for that chunk.
+
+    ``written(instances)``, when given, runs after each chunk with the instances
+    inserted or updated in it, and is skipped when nothing was written.
+    """
+    batch_size = batch_size or settings.INGESTION_BATCH_SIZE
+    report = IngestionReport(loader.file_path)
+
+    for chunk in chunked(loader.iter_rows(min_row, max_row), batch_size):
+        report.rows_read += len(chunk)
+        build = prepare(chunk)
+        rows = []
+        for row_number, values in chunk:
+            try:
+                instance = build(values)
+                if incremental:
+                    fingerprint(instance)
+                rows.append((row_number, values, instance))
+            except (RowError, TypeError, ValueError) as e:
+                report.add_error(row_number, values, e)
+        if incremental:
+            instances = upsert_batch(model, rows, report)
+        else:
+            instances = insert_batch(model, rows, report)
+        if written and instances:
+            written(instances)
+        if progress:
+            progress(report)
+
+    return report
@@ -0,0 +1,189 @@
+import csv
+import json
+import os
+from itertools import islice
+
+import openpyxl
+import pyarrow
+import pyarrow.ipc
+import pyarrow.parquet
+
+# Streaming readers for the ingestion tasks. Every loader yields
+# ``(row_number, values)`` where ``values`` follows the ingestion column
+# layout, and can read an inclusive ``[min_row, max_row]`` range so chunks can
+# be spread across workers. Row numbers match what a person sees in the file:
+# spreadsheet/CSV rows start at 2 (after the header), NDJSON lines and
+# Parquet/Arrow records start at 1.
+
+
+class LoaderError(Exception):
+    """Raised for an unknown ingestion format."""
+
+
+def is_blank(values):
+    return all(value is None or value == '' for value in values)
+
+
+class Loader:
+    first_row = 1
+
+    def __init__(self, file_path, columns):
+        self.file_path = file_path
+        self.columns = columns
+
+    def count_rows(self):
+        raise NotImplementedError
+
+    def iter_rows(self, min_row=None, max_row=None):
+        raise NotImplementedError
+
+    def row_slice(self, rows, min_row, max_row):
+        """Cut ``(row_number, values)`` pairs numbered from ``first_row`` down to a range."""
+        min_row = min_row or self.first_row
+        stop = None if max_row is None else max_row - self.first_row + 1
+        for row_number, values in enumerate(islice(rows, min_row - self.first_row, stop), start=min_row):
+            if not is_blank(values):
+                yield row_number, tuple(values)
+
+    def from_record(self, record):
+        if isinstance(record, dict):
+            return tuple(record.get(column) for column in self.columns)
+        return tuple(record)
+
+
+class XlsxLoader(Loader):
+    first_row = 2
+
+    def count_rows(self):
+        workbook = openpyxl.load_workbook(self.file_path, read_only=True)
+        try:
+            sheet = workbook.active
+            max_row = sheet.max_row
+            if max_row is None:
+                # Workbook written without a <dimension> tag, count the hard way
+                sheet.reset_dimensions()
+                max_row = sum(1 for _ in sheet.iter_rows(values_only=True))
+            return max(max_row - 1, 0)
+        finally:
+            workbook.close()
+
+    def iter_rows(self, min_row=None, max_row=None):
+        min_row = min_row or self.first_row
+        workbook = openpyxl.load_workbook(self.file_path, read_only=True, data_only=True)
+        try:
+            sheet = workbook.active
+            rows = sheet.iter_rows(min_row=min_row, max_row=max_row, values_only=True)
+            for row_number, values in enumerate(rows, start=min_row):
+                if not is_blank(values):
+                    yield row_number, values
+        finally:
+            workbook.close()
+
+
+class CsvLoader(Loader):
+    first_row = 2
+
+    def count_rows(self):
+        with open(self.file_path, newline='', encoding='utf-8') as f:
+            return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+
+    def iter_rows(self, min_row=None, max_row=None):
+        with open(self.file_path, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # header
+            yield from self.row_slice(reader, min_row, max_row)
+
+
+class NdjsonLoader(Loader):
+    """One JSON object (keyed by column name) or array per line."""
+
+    def count_rows(self):
+        with open(self.file_path, 'rb') as f:
+            return sum(1 for _ in f)
+
+    def iter_rows(self, min_row=None, max_row=None):
+        with open(self.file_path, encoding='utf-8') as f:
+            records = (self.from_record(json.loads(line)) if line.strip() else () for line in f)
+            yield from self.row_slice(records, min_row, max_row)
+
+
+class ColumnarLoader(Loader):
+    """Shared record-batch walk for Parquet and Arrow IPC files.
+
+    Only the batches overlapping the requested range are decoded, and only
+    the ingestion columns are read when the file has them by name.
+    """
+
+    def batches(self):
+        """Yield ``(num_rows, load)`` where ``load()`` returns a pyarrow RecordBatch/Table."""
+        raise NotImplementedError
+
+    def count_rows(self):
+        return sum(num_rows for num_rows, _ in self.batches())
+
+    def iter_rows(self, min_row=None, max_row=None):
+        min_row = min_row or self.first_row
+        offset = self.first_row
+        for num_rows, load in self.batches():
+            batch_first, batch_last = offset, offset + num_rows - 1
+            offset += num_rows
+            if batch_last < min_row:
+                continue
+            if max_row is not None and batch_first > max_row:
+                return
+            batch = load()
+            names = batch.schema.names
+            if any(column in names for column in self.columns):
+                # By name; an optional column the file leaves out reads as None
+                columns = [batch.column(column).to_pylist() if column in names else [None] * batch.num_rows
+                           for column in self.columns]
+            else:
+                columns = [batch.column(i).to_pylist() for i in range(len(names))]
+            rows = zip(*columns)
+            start = max(min_row, batch_first)
+            stop = batch_last if max_row is None else min(batch_last, max_row)
+            rows = islice(rows, start - batch_first, stop - batch_first + 1)
+            for row_number, values in enumerate(rows, start=start):
+                if not is_blank(values):
+                    yield row_number, values
+
+
+class ParquetLoader(ColumnarLoader):
+    def batches(self):
+        parquet_file = pyarrow.parquet.ParquetFile(self.file_path)
+        names = parquet_file.schema_arrow.names
+        columns = [column for column in self.columns if column in names] or None
+        for i in range(parquet_file.num_row_groups):
+            yield (parquet_file.metadata.row_group(i).num_rows,
+                   lambda i=i: parquet_file.read_row_group(i, columns=columns))
+
+
+class ArrowLoader(ColumnarLoader):
+    def batches(self):
+        # Memory-mapped, so untouched batches are never read from disk
+        with pyarrow.memory_map(self.file_path) as source:
+            reader = pyarrow.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                yield batch.num_rows, lambda batch=batch: batch
+
+
+LOADERS = {
+    'xlsx': XlsxLoader,
+    'csv': CsvLoader,
+    'ndjson': NdjsonLoader,
+    'jsonl': NdjsonLoader,
+    'parquet': ParquetLoader,
+    'arrow': ArrowLoader,
+    'feather': ArrowLoader,
+}
+
+
+def get_loader(file_path, columns, file_format=None):
+    """Pick a loader from ``file_format`` or, when not given, the file extension."""
+    file_format = (file_format or os.path.splitext(file_path)[1].lstrip('.')).lower()
+    try:
+        return LOADERS[file_format](file_path, columns)
+    except KeyError:
+        raise LoaderError(f"Unsupported ingestion format '{file_format}' "
+                          f"(expected one of: {', '.join(sorted(LOADERS))})")
@@ -0,0 +1,186 @@
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import threading
+import time
+import django
+from django.conf import settings
+from django.core.cache import cache as django_cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from customers.models import Customer
+from loans import memo
+from loans.ingestion import ingest_customers, ingest_loans
+from loans.models import Loan
+from .benchmark_http import percentile
+
+ENDPOINTS = ('check-eligibility', 'view-loan', 'view-loans', 'create-loan')
+
+
+class Rollback(Exception):
+    """Undoes a timed ingestion run, so the benchmark leaves the database as it found it."""
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=settings.BASE_DIR, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Drive the API in-process (full middleware stack, no HTTP server) at a given concurrency and '
+            'report p50/p95/p99 latency and requests/sec per endpoint as JSON. Load a fixed dataset with '
+            'generate_portfolio first so runs on different commits are comparable. create-loan writes '
+            'loans and runs last; SQLite rejects concurrent writers, so use PostgreSQL or --concurrency 1')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', action='append', choices=ENDPOINTS,
+                            help='Endpoint to load (repeatable, default: all)')
+        parser.add_argument('--requests', type=int, default=1000, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=50, help='Untimed requests per endpoint first')
+        parser.add_argument('--concurrency', type=int, default=8, help='Client threads')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the request payloads')
+        parser.add_argument('--sample', type=int, default=1000,
+                            help='Customers and loans the requests are spread over')
+        parser.add_argument('--ingest', metavar='DIR',
+                            help='Also time ingesting DIR/customers.* and DIR/loans.* (rolled back afterwards)')
+        parser.add_argument('--output', help='Write the JSON report to this file as well')
+
+    def handle(self, *args, **options):
+        customer_ids = list(Customer.objects.order_by('pk').values_list('customer_id', flat=True)[:options['sample']])
+        loan_ids = list(Loan.objects.order_by('pk').values_list('loan_id', flat=True)[:options['sample']])
+        if not customer_ids or not loan_ids:
+            raise CommandError('No loans to benchmark; run generate_portfolio first')
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'cache': settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1],
+                'debug': settings.DEBUG,
+                'customers': Customer.objects.count(),
+                'loans': Loan.objects.count(),
+                'concurrency': options['concurrency'],
+                'requests': options['requests'],
+                'warmup': options['warmup'],
+                'seed': options['seed'],
+            },
+            'endpoints': {},
+        }
+        if options['ingest']:
+            report['ingestion'] = self.time_ingestion(options['ingest'])
+
+        rng = random.Random(options['seed'])
+        for endpoint in [name for name in ENDPOINTS if name in (options['endpoint'] or ENDPOINTS)]:
+            calls = [self.build_request(endpoint, rng, customer_ids, loan_ids)
+                     for _ in range(options['warmup'] + options['requests'])]
+            # Every endpoint starts cold, whatever ran before it
+            django_cache.clear()
+            memo.decisions.clear()
+            self.load(calls[:options['warmup']], options['concurrency'])
+            result = self.load(calls[options['warmup']:], options['concurrency'])
+            report['endpoints'][endpoint] = result
+            self.stderr.write(
+                f"{endpoint:<18} {result['rps']:>8.0f} req/s  p50 {result['p50_ms']:>7.2f} ms  "
+                f"p95 {result['p95_ms']:>7.2f} ms  p99 {result['p99_ms']:>7.2f} ms  errors {result['errors']}"
+            )
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
+    def build_request(self, endpoint, rng, customer_ids, loan_ids):
+        if endpoint == 'view-loan':
+            return 'get', f'/api/loans/view-loan/{rng.choice(loan_ids)}/', None
+        if endpoint == 'view-loans':
+            return 'get', f'/api/loans/view-loans/{rng.choice(customer_ids)}/', None
+        payload = {
+            'customer_id': rng.choice(customer_ids),
+            'loan_amount': rng.randrange(10000, 500000, 5000),
+            'interest_rate': rng.choice((8, 10, 12, 14, 16)),
+            'tenure': rng.choice((12, 24, 36, 60)),
+        }
+        return 'post', f'/api/loans/{endpoint}/', json.dumps(payload)
+
+    def load(self, calls, concurrency):
+        latencies, statuses, errors = [], {}, 0
+        remaining = iter(calls)
+        lock = threading.Lock()
+
+        def worker():
+            nonlocal errors
+            client = Client(raise_request_exception=False)
+            while True:
+                with lock:
+                    call = next(remaining, None)
+                if call is None:
+                    break
+                method, path, body = call
+                started = time.perf_counter()
+                try:
+                    if method == 'get':
+                        status = client.get(path).status_code
+                    else:
+                        status = client.post(path, body, content_type='application/json').status_code
+                except Exception as e:  # Counted, not raised: the run measures failures too
+                    status = type(e).__name__
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    statuses[status] = statuses.get(status, 0) + 1
+                    if isinstance(status, int) and status < 500:
+                        latencies.append(elapsed)
+                    else:
+                        errors += 1
+            # Each thread opened its own database connection
+            connection.close()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'requests': len(calls),
+            'errors': errors,
+            'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+            'rps': round(len(calls) / wall, 1) if wall else 0.0,
+            'mean_ms': round(statistics.fmean(latencies), 3) if latencies else 0.0,
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+        }
+
+    def time_ingestion(self, directory):
+        results = {}
+        for kind, ingest in (('customers', ingest_customers), ('loans', ingest_loans)):
+            paths = [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                     if os.path.splitext(name)[0] == kind]
+            if not paths:
+                continue
+            try:
+                with transaction.atomic():
+                    summary = ingest(paths[0]).as_dict()
+                    raise Rollback
+            except Rollback:
+                pass
+            results[kind] = {key: summary[key] for key in ('source', 'rows_read', 'rows_inserted', 'rows_failed',
+                                                            'elapsed_seconds', 'rows_per_sec')}
+            self.stderr.write(f"ingest {kind:<10} {summary['rows_per_sec']:>8.0f} rows/s  "
+                              f"({summary['rows_inserted']} rows, {summary['rows_failed']} failed)")
+        return results
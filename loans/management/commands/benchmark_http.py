@@ -0,0 +1,108 @@
+import http.client
+import json
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from customers.models import Customer
+from loans.models import Loan
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = ('Concurrent HTTP load against running servers, e.g. the WSGI (web, :8000) and ASGI '
+            '(web-asgi, :8001) services, to compare throughput at the same worker count')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True, metavar='NAME=URL',
+                            help='Server to load, e.g. wsgi=http://localhost:8000 (repeatable)')
+        parser.add_argument('--concurrency', type=int, default=64, help='Parallel client connections')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint and target')
+        parser.add_argument('--loan-id', help='Loan for view-loan (default: any)')
+        parser.add_argument('--customer-id', help='Customer for view-loans and check-eligibility '
+                                                  '(default: the one with most loans)')
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['target']:
+            name, _, url = target.partition('=')
+            if not url:
+                raise CommandError(f'--target must look like NAME=URL, got {target!r}')
+            targets.append((name, urlsplit(url)))
+
+        loan_id = options['loan_id'] or Loan.objects.values_list('loan_id', flat=True).first()
+        customer_id = options['customer_id'] or (
+            Customer.objects.annotate(loan_count=Count('loans')).order_by('-loan_count')
+            .values_list('customer_id', flat=True).first()
+        )
+        if loan_id is None or customer_id is None:
+            raise CommandError('No loans to read; ingest some data first')
+
+        eligibility = json.dumps({'customer_id': customer_id, 'loan_amount': 100000,
+                                  'interest_rate': 12, 'tenure': 24})
+        endpoints = [
+            ('view-loan', 'GET', f'/api/loans/view-loan/{loan_id}/', None),
+            ('view-loans', 'GET', f'/api/loans/view-loans/{customer_id}/', None),
+            ('check-eligibility', 'POST', '/api/loans/check-eligibility/', eligibility),
+        ]
+        results = {}
+        for name, url in targets:
+            for endpoint, method, path, body in endpoints:
+                result = self.load(url, method, path, body, options['concurrency'], options['requests'])
+                results.setdefault(name, {})[endpoint] = result
+                self.stdout.write(
+                    f"{name:>8} {endpoint:<18} {result['rps']:>8.0f} req/s  p50 {result['p50_ms']:>7.1f} ms  "
+                    f"p95 {result['p95_ms']:>7.1f} ms  errors {result['errors']}"
+                )
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def load(self, url, method, path, body, concurrency, requests):
+        latencies, errors = [], []
+        remaining = iter(range(requests))
+        lock = threading.Lock()
+        headers = {'Content-Type': 'application/json'} if body else {}
+
+        def client():
+            connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        break
+                started = time.perf_counter()
+                try:
+                    connection.request(method, path, body=body, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    failed = response.status >= 500
+                except (OSError, http.client.HTTPException):
+                    failed = True
+                    connection.close()
+                    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    (errors if failed else latencies).append(elapsed)
+            connection.close()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'requests': requests,
+            'errors': len(errors),
+            'rps': round(len(latencies) / wall, 1),
+            'p50_ms': round(statistics.median(latencies), 2) if latencies else 0.0,
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+        }
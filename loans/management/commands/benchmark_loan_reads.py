@@ -0,0 +1,78 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+from customers.models import Customer
+from loans import reads
+from loans.models import Loan
+from loans.serializers import LoanSerializer
+
+
+# The ModelSerializer path /view-loan/ and /view-loans/ used before loans/reads.py
+def serializer_loan_detail(loan_id):
+    loan = Loan.objects.get(loan_id=loan_id)
+    response = LoanSerializer(loan).data
+    response['customer'] = {
+        "customer_id": loan.customer.customer_id,
+        "first_name": loan.customer.first_name,
+        "last_name": loan.customer.last_name,
+        "phone_number": loan.customer.phone_number,
+        "age": loan.customer.age
+    }
+    return response
+
+
+def serializer_customer_loans(customer_id):
+    customer = Customer.objects.get(customer_id=customer_id)
+    return [
+        {
+            "loan_id": loan.loan_id,
+            "loan_amount": loan.loan_amount,
+            "interest_rate": loan.interest_rate,
+            "monthly_installment": loan.monthly_repayment,
+            "repayments_left": loan.tenure - loan.emis_paid_on_time
+        }
+        for loan in Loan.objects.filter(customer=customer).order_by('id')
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Compare the hand-rolled view-loan/view-loans read path with the ModelSerializer one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=500)
+        parser.add_argument('--loan-id', help='Loan to read (default: any)')
+        parser.add_argument('--customer-id', help='Customer to list (default: the one with most loans)')
+
+    def handle(self, *args, **options):
+        loan_id = options['loan_id'] or Loan.objects.values_list('loan_id', flat=True).first()
+        customer_id = options['customer_id'] or (
+            Customer.objects.annotate(loan_count=Count('loans')).order_by('-loan_count')
+            .values_list('customer_id', flat=True).first()
+        )
+        if loan_id is None or customer_id is None:
+            raise CommandError('No loans to read; ingest some data first')
+
+        renderer = JSONRenderer()
+        cases = [
+            ('view-loan', loan_id, serializer_loan_detail, reads.loan_detail),
+            ('view-loans', customer_id, serializer_customer_loans, reads.customer_loans),
+        ]
+        for name, key, legacy, fast in cases:
+            if renderer.render(legacy(key)) != renderer.render(fast(key)):
+                raise CommandError(f'{name}: fast path response differs from the serializer path')
+            legacy_ms = self.time_calls(legacy, key, renderer, options['iterations'])
+            fast_ms = self.time_calls(fast, key, renderer, options['iterations'])
+            self.stdout.write(
+                f'{name} ({key}): serializer {legacy_ms:.3f} ms, values() {fast_ms:.3f} ms '
+                f'-> {legacy_ms / fast_ms:.1f}x faster (median of {options["iterations"]})'
+            )
+
+    def time_calls(self, build, key, renderer, iterations):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            renderer.render(build(key))
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,88 @@
+import re
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+from customers.models import Customer
+from loans import reads
+from loans.models import CustomerCreditProfile, Loan
+from loans.profiles import profile_aggregates_query
+from loans.tasks import expired_loans_query
+
+# Plan lines that read a whole table: PostgreSQL "Seq Scan on t",
+# SQLite "SCAN t" (as opposed to "SEARCH t USING INDEX" or "SCAN t USING INDEX")
+SEQ_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)(?! USING)'),
+}
+
+
+def hot_queries(customer, loan_id, today):
+    """(name, queryset) for the queries behind the busiest endpoints and tasks."""
+    return [
+        ('view-loan: loan with its customer', reads.loan_detail_row(loan_id)),
+        ('view-loans / check-eligibility: customer by customer_id', reads.customer_pk_query(customer.customer_id)),
+        ('view-loans: loans of a customer', reads.customer_loan_rows(customer.pk)),
+        ('check-eligibility: credit profile', CustomerCreditProfile.objects.filter(pk=customer.pk)),
+        ('profile rebuild / loan_stats: loan aggregates of a customer',
+         profile_aggregates_query([customer.pk], today.year)),
+        ('create-loan: active loans of a customer', Loan.objects.filter(customer=customer, is_active=True)),
+        ("loans this year of a customer", Loan.objects.filter(customer=customer, start_date__year=today.year)),
+        ('deactivate_expired_loans: expired active loans', expired_loans_query(today)[:1000]),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('EXPLAIN the hot API and task queries and flag sequential scans of large tables. Seed a '
+            'realistic dataset first (generate_portfolio) and run it on PostgreSQL: on small tables the '
+            'planner rightly prefers a scan')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customer-id', help='Customer to plan for (default: the one with most loans)')
+        parser.add_argument('--min-rows', type=int, default=10000,
+                            help='Only flag scans of tables with at least this many rows')
+        parser.add_argument('--analyze', action='store_true',
+                            help='EXPLAIN ANALYZE on PostgreSQL: runs the queries and shows actual timings')
+        parser.add_argument('--strict', action='store_true', help='Exit with an error if any scan was flagged')
+
+    def handle(self, *args, **options):
+        customers = Customer.objects.all()
+        if options['customer_id']:
+            customers = customers.filter(customer_id=options['customer_id'])
+        else:
+            customers = customers.annotate(loan_count=Count('loans')).order_by('-loan_count')
+        customer = customers.first()
+        loan_id = Loan.objects.filter(customer=customer).values_list('loan_id', flat=True).first()
+        if customer is None or loan_id is None:
+            raise CommandError('No customer with loans to plan for; run generate_portfolio first')
+
+        explain_options = {'analyze': True} if options['analyze'] and connection.vendor == 'postgresql' else {}
+        pattern = SEQ_SCAN.get(connection.vendor)
+        if pattern is None:
+            self.stdout.write(self.style.WARNING(f'Sequential scans are not detected on {connection.vendor}'))
+        models_by_table = {model._meta.db_table: model for model in apps.get_models()}
+        sizes = {}
+        flagged = []
+        for name, queryset in hot_queries(customer, loan_id, timezone.now().date()):
+            plan = queryset.explain(**explain_options)
+            scans = []
+            for table in (pattern.findall(plan) if pattern else []):
+                if table not in sizes:
+                    model = models_by_table.get(table)
+                    sizes[table] = model._default_manager.count() if model else 0
+                if sizes[table] >= options['min_rows']:
+                    scans.append(f'{table} ({sizes[table]} rows)')
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write('    ' + plan.replace('\n', '\n    '))
+            if scans:
+                flagged.append(name)
+                self.stdout.write(self.style.ERROR(f"    Sequential scan of {', '.join(scans)}"))
+
+        if flagged:
+            message = f'{len(flagged)} of the hot queries scan large tables'
+            if options['strict']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'No sequential scans of tables with {options["min_rows"]}+ rows'))
@@ -0,0 +1,58 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand, CommandError
+from customers.models import Customer
+from loans import portfolio
+
+
+class Command(BaseCommand):
+    help = ('Generate a deterministic synthetic portfolio for benchmarks: bulk insert it, write it as '
+            'ingestion files, or both (same --seed and --as-of give the same data on every run)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--loans', default='1:40,3:30,10:25,50:4,500:1',
+                            help='Loans per customer: fixed:N, uniform:A-B or weighted N:W,N:W,... '
+                                 '(default: mostly a few, some with 50 or 500)')
+        parser.add_argument('--seed', type=int, default=0, help=f'0-{portfolio.MAX_SEED}; also the id prefix S<seed>-')
+        parser.add_argument('--as-of', type=datetime.date.fromisoformat, default=None,
+                            help='Date loan histories run up to, YYYY-MM-DD (default: today)')
+        parser.add_argument('--insert', choices=['all', 'customers', 'none'], default='all',
+                            help="Rows to bulk insert; 'customers' with --output gives a loans file "
+                                 "that ingests against them")
+        parser.add_argument('--output', help='Also write customers.<format> and loans.<format> to this directory')
+        parser.add_argument('--format', dest='file_format', choices=['xlsx', 'csv'], default='xlsx')
+        parser.add_argument('--replace', action='store_true',
+                            help="Delete this seed's earlier portfolio (customers S<seed>-*) first")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Customers per insert transaction (defaults to INGESTION_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['seed'] <= portfolio.MAX_SEED:
+            raise CommandError(f'--seed must be between 0 and {portfolio.MAX_SEED}')
+        try:
+            loan_counts = portfolio.loan_count_distribution(options['loans'])
+        except portfolio.DistributionError as e:
+            raise CommandError(str(e))
+
+        def generate():
+            return portfolio.generate(options['customers'], loan_counts, options['seed'], options['as_of'])
+
+        existing = Customer.objects.filter(customer_id__startswith=portfolio.customer_prefix(options['seed']))
+        if options['insert'] != 'none':
+            if options['replace']:
+                deleted, _ = existing.delete()
+                self.stdout.write(f'Deleted {deleted} rows of the previous seed {options["seed"]} portfolio')
+            elif existing.exists():
+                raise CommandError(f'Seed {options["seed"]} is already loaded; pass --replace to reload it')
+
+            started = time.perf_counter()
+            customers, loans = portfolio.insert(generate(), with_loans=options['insert'] == 'all',
+                                                batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Inserted {customers} customers and {loans} loans in {time.perf_counter() - started:.1f}s'
+            ))
+
+        if options['output']:
+            paths = portfolio.write_files(generate(), options['output'], options['file_format'])
+            self.stdout.write(self.style.SUCCESS(f"✅ Wrote {paths['customers']} and {paths['loans']}"))
@@ -1,10 +1,115 @@
-from django.core.management.base import BaseCommand
-from loans.tasks import ingest_customer_data, ingest_loan_data
+import os
+import time
+from celery.result import AsyncResult
+from django.core.management.base import BaseCommand, CommandError
+from loans.loaders import LOADERS, LoaderError
+from loans.tasks import CUSTOMER_FILE, LOAN_FILE, build_ingestion_pipeline
 
 class Command(BaseCommand):
-    help = 'Trigger background ingestion of Excel files'
+    help = 'Trigger parallel background ingestion of customer/loan data files and follow its progress'
 
-    def handle(self, *args, **kwargs):
-        ingest_customer_data.delay()
-        ingest_loan_data.delay()
-        self.stdout.write(self.style.SUCCESS('Data ingestion tasks triggered'))
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', default=CUSTOMER_FILE, help='Customer data file path')
+        parser.add_argument('--loans', default=LOAN_FILE, help='Loan data file path')
+        parser.add_argument('--format', dest='file_format', choices=sorted(LOADERS), default=None,
+                            help='Input format for both files (defaults to each file extension)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows per bulk insert (defaults to INGESTION_BATCH_SIZE)')
+        parser.add_argument('--chunk-rows', type=int, default=None,
+                            help='Rows per celery chunk task (defaults to INGESTION_CHUNK_ROWS)')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Skip unchanged rows and update changed ones instead of inserting every row')
+        parser.add_argument('--no-wait', action='store_true',
+                            help='Only enqueue the pipeline, do not follow its progress')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds between progress updates')
+        parser.add_argument('--timeout', type=float, default=None,
+                            help='Stop following after this many seconds (the pipeline keeps running)')
+
+    def handle(self, *args, **options):
+        for path in (options['customers'], options['loans']):
+            if not os.path.exists(path):
+                raise CommandError(f'Data file not found at: {path}')
+
+        try:
+            pipeline, chunks, summaries = build_ingestion_pipeline(
+                customer_file=options['customers'],
+                loan_file=options['loans'],
+                chunk_rows=options['chunk_rows'],
+                batch_size=options['batch_size'],
+                incremental=options['incremental'],
+                file_format=options['file_format'],
+            )
+        except LoaderError as e:
+            raise CommandError(str(e))
+        if not chunks:
+            self.stdout.write(self.style.WARNING('Nothing to ingest: both files are empty'))
+            return
+
+        pipeline.apply_async()
+        self.stdout.write(self.style.SUCCESS(f'Data ingestion triggered as {len(chunks)} chunk tasks'))
+        if options['no_wait']:
+            return
+
+        started = time.monotonic()
+        while True:
+            elapsed = time.monotonic() - started
+            finished = self.show_progress(chunks, elapsed)
+            if finished and all(AsyncResult(s.id).ready() for s in summaries):
+                break
+            # A failed chunk fails its chord, and the stages after it never start
+            if any(AsyncResult(s.id).failed() for s in chunks + summaries):
+                break
+            if options['timeout'] is not None and elapsed >= options['timeout']:
+                raise CommandError(f"Gave up waiting after {options['timeout']:g}s; the ingestion tasks "
+                                   f"keep running on the workers")
+            time.sleep(options['poll_interval'])
+
+        failed = False
+        for signature in chunks:
+            result = AsyncResult(signature.id)
+            if result.failed():
+                failed = True
+                kind, _, min_row, max_row = signature.args[:4]
+                self.stdout.write(self.style.ERROR(f'{kind} rows {min_row}-{max_row} failed: {result.result!r}'))
+        for summary in summaries:
+            result = AsyncResult(summary.id)
+            if not result.ready():
+                failed = True
+                self.stdout.write(self.style.ERROR(f'{summary.args[0]}: not ingested, a chunk failed'))
+                continue
+            result = result.get(propagate=False)
+            if isinstance(result, dict):
+                self.stdout.write(self.style.SUCCESS(
+                    f"{result['kind']}: {result['rows_inserted']} inserted, {result['rows_updated']} updated, "
+                    f"{result['rows_unchanged']} unchanged, {result['rows_failed']} failed, "
+                    f"{result['rows_per_sec']} rows/sec"
+                ))
+                for error in result['errors'][:20]:
+                    self.stdout.write(self.style.WARNING(f"  row {error['row']}: {error['error']}"))
+            else:
+                failed = True
+                self.stdout.write(self.style.ERROR(f'Reconcile step failed: {result}'))
+        if failed:
+            raise CommandError('Ingestion did not complete')
+
+    def show_progress(self, chunks, elapsed):
+        progress = {}
+        finished = 0
+        for signature in chunks:
+            kind, _, min_row, max_row = signature.args[:4]
+            result = AsyncResult(signature.id)
+            info = result.info if isinstance(result.info, dict) else {}
+            if result.ready():
+                finished += 1
+            done, total = progress.get(kind, (0, 0))
+            progress[kind] = (done + info.get('rows_read', 0), total + max_row - min_row + 1)
+
+        parts = []
+        rows_done = 0
+        for kind, (done, total) in progress.items():
+            rows_done += done
+            parts.append(f'{kind} {done}/{total} ({done * 100 // max(total, 1)}%)')
+        rate = rows_done / elapsed if elapsed else 0.0
+        self.stdout.write(f"{' | '.join(parts)} | {finished}/{len(chunks)} chunks | {rate:.0f} rows/sec")
+        return finished == len(chunks)
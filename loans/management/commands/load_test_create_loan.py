@@ -0,0 +1,115 @@
+import statistics
+import threading
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.test import APIRequestFactory
+from customers.limits import calculate_approved_limit
+from customers.models import Customer
+from loans.models import Loan
+from loans.views import CreateLoanView
+
+
+def check_invariants(customer, initial_debt, loans):
+    """Problems with ``loans`` (the loans created by the run, oldest first), or an empty list.
+
+    current_debt must have grown by exactly the loans created, and every loan
+    must have been approved while the customer's active loans were still within
+    the approved limit, as if the requests had been decided one at a time.
+    """
+    problems = []
+    customer.refresh_from_db()
+    expected_debt = initial_debt + sum(int(loan.loan_amount) for loan in loans)
+    if customer.current_debt != expected_debt:
+        problems.append(f'current_debt is {customer.current_debt}, expected {expected_debt} (lost update)')
+
+    active_sum = sum(
+        Loan.objects.filter(customer=customer, is_active=True)
+        .exclude(pk__in=[loan.pk for loan in loans])
+        .values_list('loan_amount', flat=True)
+    )
+    for loan in loans:
+        if active_sum > customer.approved_limit:
+            problems.append(f'{loan.loan_id} approved with {active_sum} active against a limit of '
+                            f'{customer.approved_limit}')
+        active_sum += loan.loan_amount
+    return problems
+
+
+class Command(BaseCommand):
+    help = ('Fire parallel /create-loan/ requests at one customer and verify no update was lost '
+            '(run it against PostgreSQL: SQLite rejects concurrent writers with "database is locked")')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customer-id', help='Customer to load (default: a new throwaway customer)')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--loan-amount', type=float, default=50000)
+        parser.add_argument('--interest-rate', type=float, default=14)
+        parser.add_argument('--tenure', type=int, default=240)
+
+    def handle(self, *args, **options):
+        if options['customer_id']:
+            customer = Customer.objects.filter(customer_id=options['customer_id']).first()
+            if customer is None:
+                raise CommandError(f"Customer {options['customer_id']} not found")
+        else:
+            # Long tenure keeps EMIs small, so the approved limit is what stops approvals
+            customer = Customer.objects.create(first_name='Load', last_name='Test', age=30, phone_number='0',
+                                               monthly_income=100000, approved_limit=calculate_approved_limit(100000))
+        initial_debt = customer.current_debt
+        last_loan_pk = Loan.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+        factory = APIRequestFactory()
+        view = CreateLoanView.as_view()
+        payload = {
+            'customer_id': customer.customer_id,
+            'loan_amount': options['loan_amount'],
+            'interest_rate': options['interest_rate'],
+            'tenure': options['tenure'],
+        }
+        results = []
+        remaining = iter(range(options['requests']))
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        break
+                started = time.perf_counter()
+                try:
+                    outcome = view(factory.post('/api/loans/create-loan/', payload, format='json')).status_code
+                except Exception as e:  # Reported, not raised: the run measures failures too
+                    outcome = type(e).__name__
+                with lock:
+                    results.append((outcome, (time.perf_counter() - started) * 1000))
+            # Each thread opened its own database connection
+            connection.close()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        outcomes = {}
+        for outcome, _ in results:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        latencies = sorted(latency for _, latency in results)
+        loans = list(Loan.objects.filter(customer=customer, pk__gt=last_loan_pk).order_by('pk'))
+
+        self.stdout.write(f"{options['requests']} requests, {options['concurrency']} threads, customer "
+                          f"{customer.customer_id}: {elapsed:.2f}s ({options['requests'] / elapsed:.0f} req/s)")
+        self.stdout.write(f"Outcomes: {outcomes}; {len(loans)} loans created")
+        self.stdout.write(f"Latency: median {statistics.median(latencies):.1f} ms, "
+                          f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} ms")
+
+        problems = check_invariants(customer, initial_debt, loans)
+        if problems:
+            for problem in problems:
+                self.stderr.write(problem)
+            raise CommandError('Concurrency invariants violated')
+        self.stdout.write(self.style.SUCCESS('Debt and approval limit are consistent'))
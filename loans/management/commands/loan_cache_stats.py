@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from loans import cache
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the view-loan and view-loans response cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing them')
+
+    def handle(self, *args, **options):
+        for endpoint, counts in cache.stats().items():
+            self.stdout.write(f"{endpoint}: {counts['hits']} hits, {counts['misses']} misses "
+                              f"({counts['hit_ratio']:.1%} hit ratio)")
+        if options['reset']:
+            cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
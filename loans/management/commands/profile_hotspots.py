@@ -0,0 +1,71 @@
+import json
+import os
+import pstats
+from io import StringIO
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from config import profiling
+
+
+class Command(BaseCommand):
+    help = 'List stored request profiles and sum the top functions and SQL across them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', help='Only captures of this URL name, e.g. check_eligibility')
+        parser.add_argument('--limit', type=int, default=20, help='Rows per hot spot table')
+        parser.add_argument('--sort', choices=['tottime', 'cumulative'], default='tottime',
+                            help='Order functions by own time or time including callees')
+        parser.add_argument('--issue-token', action='store_true',
+                            help=f'Print a {profiling.HEADER} header value and exit')
+
+    def handle(self, *args, **options):
+        if options['issue_token']:
+            self.stdout.write(profiling.issue_token())
+            return
+
+        directory = settings.PROFILE_DIR
+        captures = []
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(directory, name)) as f:
+                        capture = json.load(f)
+                except (OSError, ValueError):
+                    continue  # Pruned or half-written while listing
+                if options['view'] in (None, capture['view']):
+                    captures.append(capture)
+        if not captures:
+            self.stdout.write(f'No captures in {directory}')
+            return
+
+        self.stdout.write(f'{len(captures)} captures in {directory}')
+        stats = None
+        sql = {}
+        for capture in captures:
+            db_ms = sum(query['ms'] for query in capture['queries'])
+            self.stdout.write(f"  {capture['id']}  {capture['method']:<6} {capture['status']}  {capture['view']:<22} "
+                              f"{capture['elapsed_ms']:>9.1f} ms  {len(capture['queries']):>4} queries "
+                              f"{db_ms:>8.1f} ms  ({capture['trigger']})")
+            path = os.path.join(directory, f"{capture['id']}.prof")
+            if os.path.exists(path):
+                if stats is None:
+                    stats = pstats.Stats(path, stream=StringIO())
+                else:
+                    stats.add(path)
+            for query in capture['queries']:
+                total = sql.setdefault(query['sql'], [0, 0.0])
+                total[0] += 1
+                total[1] += query['ms']
+
+        if stats is not None:
+            self.stdout.write(f"\nTop functions by {options['sort']}:")
+            stats.stream = StringIO()
+            stats.sort_stats(options['sort']).print_stats(options['limit'])
+            self.stdout.write(stats.stream.getvalue().split('\n\n', 1)[-1].rstrip())
+
+        if sql:
+            self.stdout.write('\nTop SQL by total time:')
+            for statement, (count, ms) in sorted(sql.items(), key=lambda item: -item[1][1])[:options['limit']]:
+                self.stdout.write(f'  {ms:>9.1f} ms {count:>6}x  {" ".join(statement.split())[:200]}')
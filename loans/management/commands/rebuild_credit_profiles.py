@@ -0,0 +1,16 @@
+import time
+from django.core.management.base import BaseCommand
+from loans.profiles import REBUILD_BATCH_SIZE, rebuild_all_profiles
+
+class Command(BaseCommand):
+    help = 'Rebuild every CustomerCreditProfile from the loan table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE,
+                            help='Customers per grouped aggregate query and upsert')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rebuilt = rebuild_all_profiles(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} credit profiles in {elapsed:.2f}s'))
@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.utils import timezone
+from customers.models import Customer
+from . import cache
+from .profiles import acredit_stats
+from .scoring import check_eligibility
+
+# Per-process memo of /check-eligibility/ decisions. The key is the request
+# tuple plus the customer's state version from loans/cache.py, which every
+# loan or customer write replaces, so a stored decision is never served after
+# the data it was computed from has changed. A repeated check costs one cache
+# round trip for the version instead of the customer and profile queries.
+
+MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe dict bounded by ``maxsize`` entries, each expiring ``ttl`` seconds after it was stored."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return MISSING
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+decisions = LRUCache(settings.ELIGIBILITY_MEMO_SIZE, settings.ELIGIBILITY_MEMO_TTL)
+
+
+def eligibility(customer_id, loan_amount, interest_rate, tenure):
+    """Memoised ``check_eligibility`` by external customer id; None if the customer does not exist."""
+    # Version first: a decision computed after it was read is at least that fresh
+    key = (customer_id, loan_amount, interest_rate, tenure, timezone.now().year, cache.state_version(customer_id))
+    decision = decisions.get(key)
+    if decision is not MISSING:
+        cache.record('check_eligibility', 'hits')
+        return decision
+    cache.record('check_eligibility', 'misses')
+
+    customer = Customer.objects.filter(customer_id=customer_id).first()
+    if customer is None:
+        return None
+    decision = check_eligibility(customer, loan_amount, interest_rate, tenure)
+    decisions.set(key, decision)
+    return decision
+
+
+async def aeligibility(customer_id, loan_amount, interest_rate, tenure):
+    """``eligibility`` on the async ORM and cache API, sharing the same memo."""
+    key = (customer_id, loan_amount, interest_rate, tenure, timezone.now().year,
+           await cache.astate_version(customer_id))
+    decision = decisions.get(key)
+    if decision is not MISSING:
+        await cache.arecord('check_eligibility', 'hits')
+        return decision
+    await cache.arecord('check_eligibility', 'misses')
+
+    customer = await Customer.objects.filter(customer_id=customer_id).afirst()
+    if customer is None:
+        return None
+    stats = await acredit_stats(customer)
+    decision = check_eligibility(customer, loan_amount, interest_rate, tenure, stats=stats)
+    decisions.set(key, decision)
+    return decision
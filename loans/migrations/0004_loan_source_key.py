@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0003_loan_is_active_alter_loan_emis_paid_on_time_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='source_hash',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='source_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:10
+
+import django.db.models.deletion
+import loans.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0005_customer_source_key'),
+        ('loans', '0004_loan_source_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerCreditProfile',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='credit_profile', serialize=False, to='customers.customer')),
+                ('total_loans', models.IntegerField(default=0)),
+                ('paid_on_time', models.IntegerField(default=0)),
+                ('year', models.IntegerField(default=loans.models.current_year, help_text='year loans_this_year refers to')),
+                ('loans_this_year', models.IntegerField(default=0)),
+                ('loan_volume', models.FloatField(default=0.0)),
+                ('current_loans_sum', models.FloatField(default=0.0)),
+                ('current_emis', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0005_customer_source_key'),
+        ('loans', '0005_customercreditprofile'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['is_active', 'end_date'], name='loan_active_end_date_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0005_customer_source_key'),
+        ('loans', '0006_loan_active_end_date_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='loan',
+            name='loan_active_end_date_idx',
+        ),
+        migrations.AlterField(
+            model_name='loan',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='loans', to='customers.customer'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['customer', 'is_active'], name='loan_customer_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['customer', 'start_date'], name='loan_customer_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['end_date'], name='loan_active_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def rekey_ingested_loans(apps, schema_editor):
+    # Incremental ingestion used to key loans on customer and term, which merged
+    # distinct loans sharing a term. It now keys them on the file's loan_id
+    # column, so re-key the loans it wrote (the only ones with a source_key) to
+    # their loan_id; their content hash is unchanged. Loans created through the
+    # API or plain ingestion keep a NULL key and are never updated by an
+    # ingestion run.
+    Loan = apps.get_model('loans', 'Loan')
+    Loan.objects.filter(source_key__isnull=False).update(source_key=F('loan_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0007_loan_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(rekey_ingested_loans, migrations.RunPython.noop),
+    ]
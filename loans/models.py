@@ -7,7 +7,8 @@ def generate_loan_id():
     return f'L{timezone.now().strftime("%Y%m%d")}{str(uuid.uuid4().hex)[:8].upper()}'
 
 class Loan(models.Model):
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="loans")
+    # Indexed by the (customer, ...) composite indexes below, which also serve customer_id lookups
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="loans", db_index=False)
     loan_id = models.CharField(max_length=20, unique=True, default=generate_loan_id)
     loan_amount = models.FloatField()
     tenure = models.IntegerField(help_text="in months")
@@ -18,6 +19,21 @@ class Loan(models.Model):
     end_date = models.DateField(null=True, blank=True)
     is_active = models.BooleanField(default=True)  # New: For easy active loan checks
     created_at = models.DateTimeField(auto_now_add=True)
+    # Incremental ingestion: id column and content hash of the source row
+    source_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    source_hash = models.CharField(max_length=32, blank=True, default='')
+
+    class Meta:
+        # Checked with manage.py explain_hot_queries
+        indexes = [
+            # A customer's active loans (current debt and EMI sums, create-loan checks)
+            models.Index(fields=['customer', 'is_active'], name='loan_customer_active_idx'),
+            # A customer's loans by start date (loans this year, history in date order)
+            models.Index(fields=['customer', 'start_date'], name='loan_customer_start_idx'),
+            # Expired-loan sweeper (loans.tasks.deactivate_expired_loans). Partial, so it
+            # only holds active loans and shrinks as they are paid off or expire
+            models.Index(fields=['end_date'], condition=models.Q(is_active=True), name='loan_active_expiry_idx'),
+        ]
 
     def __str__(self):
         return self.loan_id
@@ -32,3 +48,35 @@ class Loan(models.Model):
         if self.end_date and self.end_date < timezone.now().date():
             self.is_active = False
         super().save(*args, **kwargs)
+
+
+def current_year():
+    return timezone.now().year
+
+
+class CustomerCreditProfile(models.Model):
+    """Denormalised loan history aggregates used for credit scoring.
+
+    Kept up to date by the Loan signals in loans/signals.py and rebuilt in
+    bulk by ``manage.py rebuild_credit_profiles``. Field names match the
+    keys of ``loans.scoring.loan_stats``.
+    """
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True,
+                                    related_name="credit_profile")
+    total_loans = models.IntegerField(default=0)
+    paid_on_time = models.IntegerField(default=0)
+    year = models.IntegerField(default=current_year, help_text="year loans_this_year refers to")
+    loans_this_year = models.IntegerField(default=0)
+    loan_volume = models.FloatField(default=0.0)
+    current_loans_sum = models.FloatField(default=0.0)  # Active principal
+    current_emis = models.FloatField(default=0.0)  # Active EMI sum
+    updated_at = models.DateTimeField(auto_now=True)
+
+    STAT_FIELDS = ['total_loans', 'paid_on_time', 'loans_this_year', 'loan_volume',
+                   'current_loans_sum', 'current_emis']
+
+    def __str__(self):
+        return f"Credit profile of {self.customer_id}"
+
+    def as_stats(self):
+        return {field: getattr(self, field) for field in self.STAT_FIELDS}
@@ -0,0 +1,171 @@
+import csv
+import os
+import random
+import openpyxl
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from customers.limits import approved_limits
+from customers.models import Customer
+from loans.emi import calculate_emi
+from loans.ingestion import CUSTOMER_COLUMNS, LOAN_COLUMNS, chunked
+from loans.models import Loan
+from loans.profiles import rebuild_profiles
+
+# Deterministic synthetic portfolios for benchmarks (manage.py generate_portfolio).
+# The same seed, size, loan-count distribution and as-of date always give the
+# same customers and loans, ids included, so runs on different commits load
+# identical data. Customer ids are "S<seed>-<n>", so a seed's portfolio can be
+# found and replaced without touching real customers.
+
+FIRST_NAMES = ('Aarav', 'Asha', 'Divya', 'Farhan', 'Ishaan', 'Kavya', 'Meera', 'Neha', 'Nikhil', 'Priya',
+               'Rahul', 'Ravi', 'Rohan', 'Sana', 'Tara', 'Vikram')
+LAST_NAMES = ('Bose', 'Das', 'Gupta', 'Iyer', 'Joshi', 'Khan', 'Kumar', 'Menon', 'Nair', 'Patel', 'Rao',
+              'Reddy', 'Shah', 'Singh', 'Verma')
+TENURES = (6, 12, 18, 24, 36, 48, 60, 84, 120)
+MAX_SEED = 999999  # Keeps "S<seed>-L<9 digits>" within the 20-character loan_id
+
+
+class DistributionError(ValueError):
+    """Raised for a loan-count distribution that cannot be parsed."""
+
+
+def loan_count_distribution(spec):
+    """``rng -> loans for one customer`` from ``fixed:N``, ``uniform:A-B`` or weights ``N:W,N:W,...``."""
+    kind, _, value = spec.partition(':')
+    try:
+        if kind == 'fixed':
+            count = int(value)
+            return lambda rng: count
+        if kind == 'uniform':
+            low, high = (int(part) for part in value.split('-'))
+            return lambda rng: rng.randint(low, high)
+        pairs = [pair.split(':') for pair in spec.split(',')]
+        counts = [int(count) for count, _ in pairs]
+        weights = [float(weight) for _, weight in pairs]
+    except ValueError:
+        raise DistributionError(f"Invalid loan-count distribution '{spec}' "
+                                f"(expected fixed:N, uniform:A-B or N:weight,N:weight,...)")
+    return lambda rng: rng.choices(counts, weights)[0]
+
+
+def customer_prefix(seed):
+    return f'S{seed}-'
+
+
+def generate(customers, loan_counts, seed=0, as_of=None):
+    """Yield ``(customer, loans)`` dicts, keyed like the ingestion columns plus ids, one customer at a time."""
+    rng = random.Random(seed)
+    as_of = as_of or timezone.now().date()
+    prefix = customer_prefix(seed)
+    loan_number = 0
+    for n in range(customers):
+        customer = {
+            'customer_id': f'{prefix}{n:08d}',
+            'first_name': rng.choice(FIRST_NAMES),
+            'last_name': rng.choice(LAST_NAMES),
+            'age': rng.randint(21, 65),
+            'phone_number': str(rng.randint(6000000000, 9999999999)),
+            'monthly_income': rng.randrange(15000, 500000, 1000),
+        }
+        loans = []
+        for _ in range(loan_counts(rng)):
+            tenure = rng.choice(TENURES)
+            loan_amount = float(rng.randrange(20000, 2000000, 5000))
+            interest_rate = round(rng.uniform(7, 20), 2)
+            start_date = as_of - relativedelta(months=rng.randint(0, 96), days=rng.randint(0, 27))
+            elapsed = (as_of.year - start_date.year) * 12 + as_of.month - start_date.month
+            paid = min(elapsed, tenure)
+            loans.append({
+                'loan_id': f'{prefix}L{loan_number:09d}',
+                'customer_id': customer['customer_id'],
+                'loan_amount': loan_amount,
+                'tenure': tenure,
+                'interest_rate': interest_rate,
+                'monthly_repayment': round(calculate_emi(loan_amount, interest_rate, tenure), 2),
+                # Most borrowers are up to date, some missed a few EMIs
+                'emis_paid_on_time': max(0, paid - rng.choices((0, 1, 3, 6), (80, 10, 6, 4))[0]),
+                'start_date': start_date,
+                'end_date': start_date + relativedelta(months=tenure),
+            })
+            loan_number += 1
+        yield customer, loans
+
+
+def write_files(portfolio, directory, file_format='xlsx'):
+    """Write customers.<format> and loans.<format> in the layout manage.py ingest_excel reads.
+
+    Both files carry their ids, so the loans file ingests against customers
+    ingested from the customers file or inserted by ``insert`` from the same seed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = {kind: os.path.join(directory, f'{kind}.{file_format}') for kind in ('customers', 'loans')}
+    customers, loans = RowWriter(paths['customers'], file_format), RowWriter(paths['loans'], file_format)
+    try:
+        customers.write(CUSTOMER_COLUMNS)
+        loans.write(LOAN_COLUMNS)
+        for customer, rows in portfolio:
+            customers.write([customer[column] for column in CUSTOMER_COLUMNS])
+            for row in rows:
+                loans.write([row[column] for column in LOAN_COLUMNS])
+    finally:
+        customers.close()
+        loans.close()
+    return paths
+
+
+class RowWriter:
+    """Streams rows to a CSV file or a write-only xlsx workbook."""
+
+    def __init__(self, path, file_format):
+        self.path = path
+        self.file_format = file_format
+        if file_format == 'csv':
+            self.file = open(path, 'w', newline='', encoding='utf-8')
+            self.writer = csv.writer(self.file)
+        elif file_format == 'xlsx':
+            self.workbook = openpyxl.Workbook(write_only=True)
+            self.sheet = self.workbook.create_sheet()
+        else:
+            raise ValueError(f"Unsupported portfolio format '{file_format}' (expected csv or xlsx)")
+
+    def write(self, row):
+        if self.file_format == 'csv':
+            self.writer.writerow(row)
+        else:
+            self.sheet.append(row)
+
+    def close(self):
+        if self.file_format == 'csv':
+            self.file.close()
+        else:
+            self.workbook.save(self.path)
+
+
+def insert(portfolio, with_loans=True, batch_size=None):
+    """Bulk insert ``portfolio`` and build the credit profiles; returns ``(customers, loans)`` inserted."""
+    batch_size = batch_size or settings.INGESTION_BATCH_SIZE
+    # Same clock as Loan.save()'s is_active rule
+    today = timezone.now().date()
+    inserted_customers = inserted_loans = 0
+    for batch in chunked(portfolio, batch_size):
+        limits = approved_limits([customer['monthly_income'] for customer, _ in batch])
+        customers = [Customer(approved_limit=limit, current_debt=0, **customer)
+                     for (customer, _), limit in zip(batch, limits)]
+        loans = []
+        for customer, (_, rows) in zip(customers, batch if with_loans else ()):
+            for row in rows:
+                # bulk_create skips Loan.save(), so apply its is_active rule here
+                loan = Loan(customer=customer, is_active=row['end_date'] >= today,
+                            **{key: value for key, value in row.items() if key != 'customer_id'})
+                if loan.is_active:
+                    customer.current_debt += int(loan.loan_amount)
+                loans.append(loan)
+        with transaction.atomic():
+            Customer.objects.bulk_create(customers)
+            Loan.objects.bulk_create(loans, batch_size=batch_size)
+            rebuild_profiles(customer.pk for customer in customers)
+        inserted_customers += len(customers)
+        inserted_loans += len(loans)
+    return inserted_customers, inserted_loans
@@ -0,0 +1,138 @@
+from asgiref.sync import sync_to_async
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from customers.models import Customer
+from .models import CustomerCreditProfile, Loan
+
+# Maintenance of CustomerCreditProfile. Single loan writes apply a delta with
+# F() expressions (see loans/signals.py); bulk writes that bypass signals
+# (ingestion, sweeps) call rebuild_profiles() for the customers they touched.
+# A missing or last-year profile is rebuilt lazily when it is read.
+
+REBUILD_BATCH_SIZE = 2000
+
+
+def loan_contribution(values, year):
+    """What a single loan adds to its customer's profile."""
+    is_active = values['is_active']
+    return {
+        'total_loans': 1,
+        'paid_on_time': int(values['emis_paid_on_time'] >= values['tenure']),
+        'loans_this_year': int(values['start_date'] is not None and values['start_date'].year == year),
+        'loan_volume': values['loan_amount'],
+        'current_loans_sum': values['loan_amount'] if is_active else 0,
+        'current_emis': values['monthly_repayment'] if is_active else 0,
+    }
+
+
+def loan_values(loan):
+    return {
+        'customer_id': loan.customer_id,
+        'emis_paid_on_time': loan.emis_paid_on_time,
+        'tenure': loan.tenure,
+        'start_date': loan.start_date,
+        'loan_amount': loan.loan_amount,
+        'monthly_repayment': loan.monthly_repayment,
+        'is_active': loan.is_active,
+    }
+
+
+def apply_delta(customer_id, old=None, new=None):
+    """Move a profile from including loan ``old`` to including loan ``new`` (either may be None)."""
+    year = timezone.now().year
+    delta = dict.fromkeys(CustomerCreditProfile.STAT_FIELDS, 0)
+    for values, sign in ((old, -1), (new, 1)):
+        if values is not None:
+            for field, amount in loan_contribution(values, year).items():
+                delta[field] += sign * amount
+
+    changes = {field: F(field) + amount for field, amount in delta.items() if amount}
+    if changes:
+        # Missing profiles are left alone and built on first read
+        CustomerCreditProfile.objects.filter(pk=customer_id, year=year).update(
+            updated_at=timezone.now(), **changes
+        )
+
+
+def profile_aggregates_query(customer_ids, year):
+    return (
+        Loan.objects.filter(customer_id__in=customer_ids)
+        .values('customer_id')
+        .annotate(
+            total_loans=Count('id'),
+            paid_on_time=Count('id', filter=Q(emis_paid_on_time__gte=F('tenure'))),
+            loans_this_year=Count('id', filter=Q(start_date__year=year)),
+            loan_volume=Sum('loan_amount'),
+            current_loans_sum=Sum('loan_amount', filter=Q(is_active=True)),
+            current_emis=Sum('monthly_repayment', filter=Q(is_active=True)),
+        )
+        .order_by()
+    )
+
+
+def aggregate_profiles(customer_ids, year):
+    rows = profile_aggregates_query(customer_ids, year)
+    return {row.pop('customer_id'): row for row in rows}
+
+
+def rebuild_profiles(customer_ids):
+    """Recompute the profiles of ``customer_ids`` with one grouped query and one upsert."""
+    customer_ids = list(customer_ids)
+    if not customer_ids:
+        return []
+    year = timezone.now().year
+    aggregates = aggregate_profiles(customer_ids, year)
+    profiles = []
+    for customer_id in customer_ids:
+        stats = aggregates.get(customer_id, {})
+        profiles.append(CustomerCreditProfile(
+            customer_id=customer_id,
+            year=year,
+            **{field: stats.get(field) or 0 for field in CustomerCreditProfile.STAT_FIELDS},
+        ))
+    CustomerCreditProfile.objects.bulk_create(
+        profiles,
+        update_conflicts=True,
+        unique_fields=['customer'],
+        update_fields=['year', 'updated_at'] + CustomerCreditProfile.STAT_FIELDS,
+    )
+    return profiles
+
+
+def rebuild_all_profiles(batch_size=REBUILD_BATCH_SIZE):
+    batch, rebuilt = [], 0
+    for customer_id in Customer.objects.values_list('pk', flat=True).order_by('pk').iterator(chunk_size=batch_size):
+        batch.append(customer_id)
+        if len(batch) == batch_size:
+            rebuilt += len(rebuild_profiles(batch))
+            batch = []
+    rebuilt += len(rebuild_profiles(batch))
+    return rebuilt
+
+
+def credit_stats(customer):
+    """Scoring inputs for ``customer`` from its profile: a primary-key lookup."""
+    profile = CustomerCreditProfile.objects.filter(pk=customer.pk).first()
+    if profile is None or profile.year != timezone.now().year:
+        profile = rebuild_profiles([customer.pk])[0]
+    return profile.as_stats()
+
+
+async def acredit_stats(customer):
+    profile = await CustomerCreditProfile.objects.filter(pk=customer.pk).afirst()
+    if profile is None or profile.year != timezone.now().year:
+        profile = (await sync_to_async(rebuild_profiles)([customer.pk]))[0]
+    return profile.as_stats()
+
+
+def credit_stats_bulk(customer_ids):
+    """``{customer_pk: stats}`` for many customers in a fixed number of queries."""
+    year = timezone.now().year
+    customer_ids = set(customer_ids)
+    profiles = {
+        profile.pk: profile
+        for profile in CustomerCreditProfile.objects.filter(pk__in=customer_ids, year=year)
+    }
+    missing = customer_ids - profiles.keys()
+    profiles.update((profile.customer_id, profile) for profile in rebuild_profiles(missing))
+    return {customer_id: profile.as_stats() for customer_id, profile in profiles.items()}
@@ -0,0 +1,93 @@
+from rest_framework import serializers
+from .models import Loan
+from customers.models import Customer
+
+# Read layer for /view-loan/ and /view-loans/. Each response is built from a
+# single .values() query that fetches exactly the columns it returns, and
+# serialised by hand into the same JSON the ModelSerializer path produced.
+# The a-prefixed variants run the same queries on the async ORM for the
+# ASGI views in loans/async_views.py.
+
+LOAN_DETAIL_FIELDS = ['id', 'loan_id', 'loan_amount', 'tenure', 'interest_rate', 'monthly_repayment',
+                      'emis_paid_on_time', 'start_date', 'end_date', 'is_active', 'created_at']
+LOAN_CUSTOMER_FIELDS = ['customer_id', 'first_name', 'last_name', 'phone_number', 'age']
+
+# DRF's own formatting, so timestamps match LoanSerializer exactly
+datetime_field = serializers.DateTimeField()
+
+
+def iso_date(value):
+    return value.isoformat() if value is not None else None
+
+
+def loan_detail_row(loan_id):
+    return (
+        Loan.objects.filter(loan_id=loan_id)
+        .values(*LOAN_DETAIL_FIELDS, *(f'customer__{field}' for field in LOAN_CUSTOMER_FIELDS))
+    )
+
+
+def loan_detail_payload(row):
+    if row is None:
+        return None
+    return {
+        'id': row['id'],
+        'customer': {field: row[f'customer__{field}'] for field in LOAN_CUSTOMER_FIELDS},
+        'loan_id': row['loan_id'],
+        'loan_amount': row['loan_amount'],
+        'tenure': row['tenure'],
+        'interest_rate': row['interest_rate'],
+        'monthly_repayment': row['monthly_repayment'],
+        'emis_paid_on_time': row['emis_paid_on_time'],
+        'start_date': iso_date(row['start_date']),
+        'end_date': iso_date(row['end_date']),
+        'is_active': row['is_active'],
+        'created_at': datetime_field.to_representation(row['created_at']),
+    }
+
+
+def loan_detail(loan_id):
+    """The /view-loan/ payload for ``loan_id``, or None if there is no such loan."""
+    return loan_detail_payload(loan_detail_row(loan_id).first())
+
+
+async def aloan_detail(loan_id):
+    return loan_detail_payload(await loan_detail_row(loan_id).afirst())
+
+
+def customer_pk_query(customer_id):
+    return Customer.objects.filter(customer_id=customer_id).values_list('pk', flat=True)
+
+
+def customer_loan_rows(customer_pk):
+    return Loan.objects.filter(customer_id=customer_pk).order_by('id').values_list(
+        'loan_id', 'loan_amount', 'interest_rate', 'monthly_repayment', 'tenure', 'emis_paid_on_time'
+    )
+
+
+def customer_loan_payload(rows):
+    return [
+        {
+            'loan_id': loan_id,
+            'loan_amount': loan_amount,
+            'interest_rate': interest_rate,
+            'monthly_installment': monthly_repayment,
+            'repayments_left': tenure - emis_paid_on_time,
+        }
+        for loan_id, loan_amount, interest_rate, monthly_repayment, tenure, emis_paid_on_time in rows
+    ]
+
+
+def customer_loans(customer_id):
+    """The /view-loans/ rows for ``customer_id``, or None if there is no such customer."""
+    customer_pk = customer_pk_query(customer_id).first()
+    if customer_pk is None:
+        return None
+    return customer_loan_payload(customer_loan_rows(customer_pk))
+
+
+async def acustomer_loans(customer_id):
+    customer_pk = await customer_pk_query(customer_id).afirst()
+    if customer_pk is None:
+        return None
+    return customer_loan_payload([row async for row in customer_loan_rows(customer_pk)])
@@ -0,0 +1,126 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from loans.cache import invalidate_loans
+from loans.ingestion import MAX_REPORTED_ERRORS, chunked
+from loans.models import Loan
+from loans.profiles import rebuild_profiles
+
+# Month-end EMI posting. Records of (loan_id, installments_paid) are summed per
+# loan, then applied chunk by chunk: the chunk's loans are locked, and one
+# UPDATE per distinct installment count (in practice one, for a single EMI)
+# advances emis_paid_on_time and deactivates the loans it completes.
+
+
+class RepaymentReport:
+    """Reconciliation summary of one posting run, returned by the API and the task."""
+
+    def __init__(self):
+        self.records_received = 0
+        self.records_rejected = 0
+        self.loans_posted = 0
+        self.installments_applied = 0
+        self.excess_installments = 0
+        self.loans_completed = 0
+        self.unknown_loans = 0
+        self.errors = []
+        self.started = timezone.now()
+
+    def add_error(self, record, message):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'record': record, 'error': str(message)})
+
+    def as_dict(self):
+        elapsed = (timezone.now() - self.started).total_seconds()
+        return {
+            'started_at': self.started.isoformat(),
+            'records_received': self.records_received,
+            'records_rejected': self.records_rejected,
+            'unknown_loans': self.unknown_loans,
+            'loans_posted': self.loans_posted,
+            'installments_applied': self.installments_applied,
+            'excess_installments': self.excess_installments,
+            'loans_completed': self.loans_completed,
+            'errors': self.errors,
+            'errors_truncated': self.records_rejected + self.unknown_loans > len(self.errors),
+            'elapsed_seconds': round(elapsed, 3),
+            'records_per_sec': round(self.records_received / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+def total_installments(records, report):
+    """``{loan_id: installments}`` summed over ``records``; malformed records are rejected."""
+    totals = defaultdict(int)
+    for record in records:
+        report.records_received += 1
+        try:
+            if not isinstance(record, dict):
+                raise ValueError('record must be an object with loan_id and installments_paid')
+            loan_id = record['loan_id']
+            installments = record['installments_paid']
+            if not isinstance(loan_id, str) or not loan_id:
+                raise ValueError('loan_id must be a non-empty string')
+            if isinstance(installments, bool) or not isinstance(installments, int) or installments < 1:
+                raise ValueError('installments_paid must be a positive integer')
+        except (KeyError, TypeError, ValueError) as e:
+            report.records_rejected += 1
+            report.add_error(record, e if not isinstance(e, KeyError) else f'missing {e}')
+            continue
+        totals[loan_id] += installments
+    return totals
+
+
+def post_chunk(totals, report):
+    with transaction.atomic():
+        loans = list(
+            Loan.objects.select_for_update()
+            .filter(loan_id__in=list(totals))
+            .values_list('pk', 'loan_id', 'customer_id', 'tenure', 'emis_paid_on_time')
+        )
+        for loan_id in totals.keys() - {loan_id for _, loan_id, _, _, _ in loans}:
+            report.unknown_loans += 1
+            report.add_error({'loan_id': loan_id, 'installments_paid': totals[loan_id]}, 'Loan not found')
+
+        by_installments = defaultdict(list)
+        for pk, loan_id, _, tenure, paid in loans:
+            installments = totals[loan_id]
+            by_installments[installments].append(pk)
+            applied = max(0, min(installments, tenure - paid))
+            report.installments_applied += applied
+            report.excess_installments += installments - applied
+            if paid < tenure <= paid + installments:
+                report.loans_completed += 1
+        report.loans_posted += len(loans)
+
+        for installments, pks in by_installments.items():
+            # Both right-hand sides read the pre-update emis_paid_on_time. Postings stop
+            # at the tenure, counts already above it (legacy rows) are left as they are.
+            Loan.objects.filter(pk__in=pks).update(
+                emis_paid_on_time=Greatest(
+                    F('emis_paid_on_time'), Least(F('emis_paid_on_time') + installments, F('tenure'))
+                ),
+                is_active=Case(
+                    When(emis_paid_on_time__gte=F('tenure') - installments, then=Value(False)),
+                    default=F('is_active'),
+                ),
+            )
+
+        # update() skips the signals that keep credit profiles and the cache current
+        customer_pks = {customer_id for _, _, customer_id, _, _ in loans}
+        rebuild_profiles(customer_pks)
+        invalidate_loans([loan_id for _, loan_id, _, _, _ in loans], customer_pks)
+
+
+def post_repayments(records, batch_size=None):
+    """Apply ``[{'loan_id', 'installments_paid'}]`` postings; returns a RepaymentReport."""
+    batch_size = batch_size or settings.REPAYMENT_BATCH_SIZE
+    report = RepaymentReport()
+    totals = total_installments(records, report)
+    for chunk in chunked(totals.items(), batch_size):
+        post_chunk(dict(chunk), report)
+    return report
@@ -0,0 +1,90 @@
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from .emi import calculate_emi, monthly_installments
+from .models import Loan
+from .profiles import credit_stats
+
+# Credit scoring shared by /check-eligibility/ and /create-loan/.
+# loan_stats() computes all inputs in a single aggregate query over the
+# customer's loans; the request path reads the same numbers from the
+# maintained CustomerCreditProfile (see loans/profiles.py).
+
+
+def loan_stats(customer):
+    """Return the loan history aggregates the credit score and EMI checks need."""
+    stats = Loan.objects.filter(customer=customer).aggregate(
+        total_loans=Count('id'),
+        paid_on_time=Count('id', filter=Q(emis_paid_on_time__gte=F('tenure'))),
+        loans_this_year=Count('id', filter=Q(start_date__year=timezone.now().year)),
+        loan_volume=Sum('loan_amount'),
+        current_loans_sum=Sum('loan_amount', filter=Q(is_active=True)),
+        current_emis=Sum('monthly_repayment', filter=Q(is_active=True)),
+    )
+    for key in ('loan_volume', 'current_loans_sum', 'current_emis'):
+        stats[key] = stats[key] or 0
+    return stats
+
+
+def calculate_credit_score(customer, stats):
+    if not stats['total_loans']:
+        return 100
+
+    if stats['current_loans_sum'] > customer.approved_limit:
+        return 0
+
+    score = (
+        (stats['paid_on_time'] / max(stats['total_loans'], 1) * 40)
+        + (stats['loans_this_year'] * 20)
+        + (stats['loan_volume'] / 10000 * 10)
+    )
+    return min(100, int(score))
+
+
+def approval_terms(customer, interest_rate, stats):
+    """Credit-score rules only: ``(approval, corrected_rate)`` before the EMI affordability check."""
+    credit_score = calculate_credit_score(customer, stats)
+
+    approval = False
+    corrected_rate = interest_rate
+    if credit_score > 50:
+        approval = True
+    elif 30 < credit_score <= 50 and interest_rate > 12:
+        approval = True
+        corrected_rate = max(corrected_rate, 12)
+    elif 10 < credit_score <= 30 and interest_rate > 16:
+        approval = True
+        corrected_rate = max(corrected_rate, 16)
+    return approval, corrected_rate
+
+
+def is_affordable(customer, stats, monthly_installment):
+    return (stats['current_emis'] + monthly_installment) <= 0.5 * customer.monthly_income
+
+
+def check_eligibility(customer, loan_amount, interest_rate, tenure, stats=None):
+    """Apply the approval rules; returns ``(approval, corrected_rate, monthly_installment)``."""
+    if stats is None:
+        stats = credit_stats(customer)
+    approval, corrected_rate = approval_terms(customer, interest_rate, stats)
+    monthly_installment = calculate_emi(loan_amount, corrected_rate, tenure)
+    approval = approval and is_affordable(customer, stats, monthly_installment)
+    return approval, corrected_rate, monthly_installment
+
+
+def check_eligibility_many(applications):
+    """Vectorised ``check_eligibility`` for ``[(customer, loan_amount, interest_rate, tenure, stats)]``.
+
+    All installments are priced in one NumPy pass, so they can differ from the
+    scalar path in the last floating-point digit.
+    """
+    terms = [approval_terms(customer, rate, stats) for customer, _, rate, _, stats in applications]
+    installments = monthly_installments(
+        [application[1] for application in applications],
+        [corrected_rate for _, corrected_rate in terms],
+        [application[3] for application in applications],
+    ).tolist()
+    return [
+        (approval and is_affordable(customer, stats, installment), corrected_rate, installment)
+        for (customer, _, _, _, stats), (approval, corrected_rate), installment
+        in zip(applications, terms, installments)
+    ]
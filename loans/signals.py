@@ -0,0 +1,93 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from customers.models import Customer
+from . import cache
+from .models import Loan
+from .profiles import apply_delta, loan_values
+
+# Keep CustomerCreditProfile, the view-loan/view-loans cache and the
+# eligibility state versions in step with
+# single-row writes (loan_list, loan_detail, create-loan, admin). Bulk paths
+# rebuild and invalidate explicitly.
+
+# Customer columns shown by /view-loan/ and /view-loans/ lookups
+CACHED_CUSTOMER_FIELDS = {'customer_id', 'first_name', 'last_name', 'phone_number', 'age'}
+
+
+@receiver(pre_save, sender=Loan)
+def remember_previous_loan(sender, instance, raw=False, **kwargs):
+    instance._profile_previous = None
+    if instance.pk and not raw:
+        instance._profile_previous = (
+            Loan.objects.filter(pk=instance.pk)
+            .values('customer_id', 'emis_paid_on_time', 'tenure', 'start_date', 'loan_amount',
+                    'monthly_repayment', 'is_active')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Loan)
+def update_profile_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_profile_previous', None)
+    current = loan_values(instance)
+    cache.invalidate_loans([instance.loan_id], {current['customer_id'], previous and previous['customer_id']} - {None})
+    if previous and previous['customer_id'] != current['customer_id']:
+        apply_delta(previous['customer_id'], old=previous)
+        previous = None
+    apply_delta(current['customer_id'], old=previous, new=current)
+
+
+def deleted_with_customer(origin):
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model is Customer
+
+
+@receiver(post_delete, sender=Loan)
+def update_profile_on_delete(sender, instance, origin=None, **kwargs):
+    if origin is not None and deleted_with_customer(origin):
+        # Cascade: the profile goes with the customer and invalidate_customer_on_delete
+        # drops the cache once, instead of two queries per loan
+        return
+    cache.invalidate_loans([instance.loan_id], [instance.customer_id])
+    apply_delta(instance.customer_id, old=loan_values(instance))
+
+
+@receiver(pre_save, sender=Customer)
+def remember_previous_customer_id(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Caches are keyed by customer_id, so a rename must also drop the old id's entries
+    # (as loaded by Customer.from_db, or read back for instances built by hand)
+    instance._previous_customer_id = None
+    if instance.pk and not raw and (update_fields is None or 'customer_id' in update_fields):
+        instance._previous_customer_id = getattr(instance, '_loaded_customer_id', None) or (
+            Customer.objects.filter(pk=instance.pk).values_list('customer_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Customer)
+def invalidate_customer_on_save(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    previous_id = getattr(instance, '_previous_customer_id', None)
+    instance._loaded_customer_id = instance.customer_id
+    if created:
+        return
+    if previous_id and previous_id != instance.customer_id:
+        cache.delete_on_commit([cache.customer_loans_key(previous_id)])
+        cache.bump_versions([previous_id])
+    if update_fields is not None and not CACHED_CUSTOMER_FIELDS.intersection(update_fields):
+        # Cached responses are unaffected, memoised eligibility may not be
+        cache.bump_versions([instance.customer_id])
+        return
+    cache.invalidate_customers([instance.pk])
+
+
+@receiver(pre_delete, sender=Customer)
+def invalidate_customer_on_delete(sender, instance, **kwargs):
+    # Before the cascade, while its loan ids can still be read
+    loan_ids = Loan.objects.filter(customer=instance).values_list('loan_id', flat=True)
+    cache.delete_on_commit([cache.loan_key(loan_id) for loan_id in loan_ids]
+                           + [cache.customer_loans_key(instance.customer_id)])
+    cache.bump_versions([instance.customer_id])
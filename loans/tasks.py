@@ -1,80 +1,217 @@
 import os
-import openpyxl
-from celery import shared_task
-from customers.models import Customer
-from loans.models import Loan
+import time
+from celery import chain, chord, group, shared_task
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
-from decimal import Decimal
+from django.utils.dateparse import parse_datetime
+from loans.ingestion import (CUSTOMER_COLUMNS, LOAN_COLUMNS, MAX_REPORTED_ERRORS, ingest_customers,
+                             ingest_loans)
+from config.metrics import registry
+from loans.cache import invalidate_loans
+from loans.loaders import get_loader
+from loans.models import Loan
+from loans.profiles import rebuild_profiles
+from loans.repayments import post_repayments
 
+CUSTOMER_FILE = os.path.join('excel_data', 'customer_data.xlsx')
+LOAN_FILE = os.path.join('excel_data', 'loan_data.xlsx')
 
-@shared_task
-def ingest_customer_data():
-    file_path = os.path.join('excel_data', 'customer_data.xlsx')
+INGESTERS = {
+    'customers': (ingest_customers, CUSTOMER_COLUMNS),
+    'loans': (ingest_loans, LOAN_COLUMNS),
+}
+
+
+def record_ingestion(kind, report=None):
+    """Export an ingestion run (``report`` None when it failed) to /metrics."""
+    if report is None:
+        registry.inc('ingestion_runs_total', {'kind': kind, 'status': 'error'})
+    else:
+        registry.inc('ingestion_runs_total', {'kind': kind, 'status': 'ok'})
+        for outcome in ('inserted', 'updated', 'unchanged', 'failed'):
+            registry.inc('ingestion_rows_total', {'kind': kind, 'outcome': outcome}, report[f'rows_{outcome}'])
+        registry.inc('ingestion_seconds_total', {'kind': kind}, report['elapsed_seconds'])
+    # Tasks are long and few: write the worker's totals straight away
+    registry.flush(force=True)
 
+
+def run_ingestion(label, ingest, file_path, batch_size, incremental, file_format):
+    kind = f'{label.lower()}s'
     if not os.path.exists(file_path):
-        print(f"❌ Customer Excel file not found at: {file_path}")
-        return "Customer Excel file not found"
+        print(f"❌ {label} data file not found at: {file_path}")
+        record_ingestion(kind)
+        return f"{label} data file not found"
 
     try:
-        workbook = openpyxl.load_workbook(file_path)
-        sheet = workbook.active
+        report = ingest(file_path, batch_size=batch_size, incremental=incremental,
+                        file_format=file_format).as_dict()
     except Exception as e:
-        print(f"❌ Failed to load customer Excel file: {e}")
-        return f"Failed to load customer Excel file: {e}"
-
-    for row in sheet.iter_rows(min_row=2, values_only=True):
-        try:
-            first_name, last_name, age, phone_number = row
-            Customer.objects.create(
-                first_name=first_name,
-                last_name=last_name,
-                age=int(age),
-                phone_number=str(phone_number),
-                created_at=timezone.now()
-            )
-        except Exception as e:
-            print(f"❌ Error ingesting customer row {row}: {e}")
-
-    print("✅ Customer data ingestion complete")
-    return "Customer data ingestion complete"
+        print(f"❌ Failed to load {label.lower()} data file: {e}")
+        record_ingestion(kind)
+        return f"Failed to load {label.lower()} data file: {e}"
+
+    record_ingestion(kind, report)
+    print(
+        f"✅ {label} data ingestion complete: {report['rows_inserted']} inserted, "
+        f"{report['rows_updated']} updated, {report['rows_unchanged']} unchanged, "
+        f"{report['rows_failed']} failed in {report['elapsed_seconds']}s"
+    )
+    return report
 
 
 @shared_task
-def ingest_loan_data():
-    file_path = os.path.join('excel_data', 'loan_data.xlsx')
+def ingest_customer_data(file_path=CUSTOMER_FILE, batch_size=None, incremental=False, file_format=None):
+    return run_ingestion('Customer', ingest_customers, file_path, batch_size, incremental, file_format)
 
-    if not os.path.exists(file_path):
-        print(f"❌ Loan Excel file not found at: {file_path}")
-        return "Loan Excel file not found"
 
+@shared_task
+def ingest_loan_data(file_path=LOAN_FILE, batch_size=None, incremental=False, file_format=None):
+    return run_ingestion('Loan', ingest_loans, file_path, batch_size, incremental, file_format)
+
+
+# Parallel ingestion: each file is split into row ranges that run as a chord
+# across the celery workers, customers first, then loans.
+
+@shared_task(bind=True)
+def ingest_chunk(self, kind, file_path, min_row, max_row, batch_size=None, incremental=False,
+                 file_format=None):
+    total = max_row - min_row + 1
+
+    def publish(report):
+        # Live progress for the ingest_excel command, read back via AsyncResult.info
+        self.update_state(state='PROGRESS', meta={
+            'kind': kind,
+            'min_row': min_row,
+            'max_row': max_row,
+            'total': total,
+            **report.as_dict(),
+        })
+
+    ingest, _ = INGESTERS[kind]
     try:
-        workbook = openpyxl.load_workbook(file_path)
-        sheet = workbook.active
-    except Exception as e:
-        print(f"❌ Failed to load loan Excel file: {e}")
-        return f"Failed to load loan Excel file: {e}"
-
-    for row in sheet.iter_rows(min_row=2, values_only=True):
-        try:
-            customer_id, loan_amount, tenure, interest_rate, monthly_repayment, emis_paid_on_time, start_date, end_date = row
-            customer = Customer.objects.filter(customer_id=customer_id).first()
-
-            if customer:
-                Loan.objects.create(
-                    customer=customer,
-                    loan_amount=Decimal(loan_amount),
-                    tenure=int(tenure),
-                    interest_rate=Decimal(interest_rate),
-                    monthly_repayment=Decimal(monthly_repayment),
-                    emis_paid_on_time=int(emis_paid_on_time),
-                    start_date=start_date,
-                    end_date=end_date,
-                    created_at=timezone.now()
-                )
-            else:
-                print(f"⚠️ Customer not found: {customer_id}")
-        except Exception as e:
-            print(f"❌ Error ingesting loan row {row}: {e}")
-
-    print("✅ Loan data ingestion complete")
-    return "Loan data ingestion complete"
+        report = ingest(file_path, batch_size=batch_size, min_row=min_row, max_row=max_row,
+                        progress=publish, incremental=incremental, file_format=file_format).as_dict()
+    except Exception:
+        record_ingestion(kind)
+        raise
+    record_ingestion(kind, report)
+    report.update({'kind': kind, 'min_row': min_row, 'max_row': max_row, 'total': total})
+    return report
+
+
+@shared_task
+def reconcile_ingestion(chunk_reports, kind, file_path):
+    """Merge the chunk reports of one sheet into a single summary."""
+    chunk_reports = sorted(chunk_reports, key=lambda report: report['min_row'])
+    errors = [error for report in chunk_reports for error in report['errors']]
+    rows_read = sum(report['rows_read'] for report in chunk_reports)
+    rows_failed = sum(report['rows_failed'] for report in chunk_reports)
+    started = min((parse_datetime(report['started_at']) for report in chunk_reports),
+                  default=timezone.now())
+    elapsed = (timezone.now() - started).total_seconds()
+
+    summary = {
+        'kind': kind,
+        'source': file_path,
+        'chunks': len(chunk_reports),
+        'rows_read': rows_read,
+        'rows_inserted': sum(report['rows_inserted'] for report in chunk_reports),
+        'rows_updated': sum(report['rows_updated'] for report in chunk_reports),
+        'rows_unchanged': sum(report['rows_unchanged'] for report in chunk_reports),
+        'rows_failed': rows_failed,
+        'errors': errors[:MAX_REPORTED_ERRORS],
+        'errors_truncated': rows_failed > min(len(errors), MAX_REPORTED_ERRORS),
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_sec': round(rows_read / elapsed, 1) if elapsed else 0.0,
+    }
+    print(
+        f"✅ {kind.capitalize()} ingestion reconciled: {summary['rows_inserted']} inserted, "
+        f"{summary['rows_updated']} updated, {summary['rows_unchanged']} unchanged, {rows_failed} failed"
+        f" across {summary['chunks']} chunks at {summary['rows_per_sec']} rows/sec"
+    )
+    return summary
+
+
+def plan_chunks(total_rows, chunk_rows, first_row=2):
+    """Split data rows (``first_row`` onwards) into inclusive ``(min_row, max_row)`` ranges."""
+    last_row = first_row + total_rows - 1
+    return [
+        (start, min(start + chunk_rows - 1, last_row))
+        for start in range(first_row, last_row + 1, chunk_rows)
+    ]
+
+
+def build_ingestion_pipeline(customer_file=CUSTOMER_FILE, loan_file=LOAN_FILE,
+                             chunk_rows=None, batch_size=None, incremental=False, file_format=None):
+    """Return ``(signature, chunk_signatures, summary_signatures)`` for a parallel run.
+
+    The chunk and summary signatures carry pre-assigned task ids so callers can
+    poll their progress and results while the pipeline runs.
+    """
+    chunk_rows = chunk_rows or settings.INGESTION_CHUNK_ROWS
+    stages = []
+    chunk_signatures = []
+    summary_signatures = []
+    for kind, file_path in (('customers', customer_file), ('loans', loan_file)):
+        loader = get_loader(file_path, INGESTERS[kind][1], file_format)
+        # Immutable signatures: the loan chord must not receive the customer summary
+        header = [
+            ingest_chunk.si(kind, file_path, min_row, max_row, batch_size, incremental, file_format)
+            for min_row, max_row in plan_chunks(loader.count_rows(), chunk_rows, loader.first_row)
+        ]
+        for signature in header:
+            signature.freeze()
+        chunk_signatures.extend(header)
+        if header:
+            body = reconcile_ingestion.s(kind, file_path)
+            body.freeze()
+            summary_signatures.append(body)
+            stages.append(chord(group(header), body))
+    return chain(*stages), chunk_signatures, summary_signatures
+
+
+def expired_loans_query(today):
+    """Active loans past their end date, as the sweeper reads them (served by loan_active_expiry_idx)."""
+    return Loan.objects.filter(is_active=True, end_date__lt=today).values_list('pk', 'customer_id', 'loan_id')
+
+
+@shared_task
+def deactivate_expired_loans(batch_size=None):
+    """Flip ``is_active`` off for every loan past its end date, one UPDATE per chunk.
+
+    Loans that expire without ever being saved again are only caught here;
+    Loan.save() applies the same rule to rows that do get written.
+    """
+    batch_size = batch_size or settings.LOAN_SWEEP_BATCH_SIZE
+    started = time.monotonic()
+    today = timezone.now().date()
+    deactivated = chunks = 0
+
+    while True:
+        batch = list(expired_loans_query(today)[:batch_size])
+        if not batch:
+            break
+        with transaction.atomic():
+            deactivated += Loan.objects.filter(pk__in=[pk for pk, _, _ in batch], is_active=True).update(is_active=False)
+            # update() skips the signals that keep credit profiles and the cache current
+            customer_pks = {customer_id for _, customer_id, _ in batch}
+            rebuild_profiles(customer_pks)
+            invalidate_loans([loan_id for _, _, loan_id in batch], customer_pks)
+        chunks += 1
+
+    elapsed = time.monotonic() - started
+    print(f"✅ Deactivated {deactivated} expired loans in {chunks} chunks ({elapsed:.2f}s)")
+    return {'deactivated': deactivated, 'chunks': chunks, 'elapsed_seconds': round(elapsed, 3)}
+
+
+@shared_task
+def post_repayments_batch(records, batch_size=None):
+    """Month-end EMI postings too large for a request: ``[{'loan_id', 'installments_paid'}]``."""
+    report = post_repayments(records, batch_size=batch_size).as_dict()
+    print(
+        f"✅ Posted {report['installments_applied']} installments to {report['loans_posted']} loans "
+        f"({report['loans_completed']} completed, {report['records_rejected'] + report['unknown_loans']} "
+        f"rejected) in {report['elapsed_seconds']}s"
+    )
+    return report
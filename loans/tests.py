@@ -1,3 +1,1361 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import tempfile
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+import pyarrow
+import pyarrow.ipc
+import pyarrow.parquet
+from celery.backends.cache import CacheBackend
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache as django_cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+
+from customers.limits import calculate_approved_limit
+from customers.models import Customer
+from . import async_views, cache, memo, portfolio
+from .loaders import ArrowLoader, CsvLoader, LoaderError, get_loader
+from .ingestion import CUSTOMER_COLUMNS, LOAN_COLUMNS, IngestionReport, ingest_customers, ingest_loans
+from .emi import amortisation_schedule, calculate_emi, monthly_installments
+from .management.commands.load_test_create_loan import check_invariants
+from .management.commands.explain_hot_queries import SEQ_SCAN
+from .management.commands.benchmark_loan_reads import serializer_customer_loans, serializer_loan_detail
+from .models import CustomerCreditProfile, Loan
+from .repayments import post_repayments
+from .tasks import (build_ingestion_pipeline, deactivate_expired_loans, plan_chunks, reconcile_ingestion,
+                    record_ingestion)
+from config import celery_app, metrics, profiling
+from config.testing import LOAN_TIERS, QueryBudgetMixin, make_customer, make_loan, make_loan_tiers, tier_loan_id
+from config.metrics import registry
+from .profiles import credit_stats, rebuild_all_profiles
+from .scoring import calculate_credit_score, check_eligibility, loan_stats
+
+
+# Reference copy of the per-row implementation the views used before the
+# scoring module, kept to prove the aggregate query gives identical results.
+def legacy_credit_score(customer, loans):
+    if not loans:
+        return 100
+
+    paid_on_time = sum(1 for loan in loans if loan.emis_paid_on_time >= loan.tenure)
+    total_loans = len(loans)
+    current_year = timezone.now().year
+    loans_this_year = sum(1 for loan in loans if loan.start_date.year == current_year)
+    loan_volume = sum(loan.loan_amount for loan in loans)
+    current_loans_sum = sum(loan.loan_amount for loan in loans if loan.is_active)
+    if current_loans_sum > customer.approved_limit:
+        return 0
+
+    score = (paid_on_time / max(total_loans, 1) * 40) + (loans_this_year * 20) + (loan_volume / 10000 * 10)
+    return min(100, int(score))
+
+
+def legacy_emi(principal, rate, tenure):
+    monthly_rate = rate / 12 / 100
+    if monthly_rate == 0:
+        return principal / tenure
+    return principal * monthly_rate * math.pow(1 + monthly_rate, tenure) / (math.pow(1 + monthly_rate, tenure) - 1)
+
+
+def legacy_eligibility(customer, loans, loan_amount, interest_rate, tenure):
+    credit_score = legacy_credit_score(customer, loans)
+
+    approval = False
+    corrected_rate = interest_rate
+    if credit_score > 50:
+        approval = True
+    elif 30 < credit_score <= 50 and interest_rate > 12:
+        approval = True
+        corrected_rate = max(corrected_rate, 12)
+    elif 10 < credit_score <= 30 and interest_rate > 16:
+        approval = True
+        corrected_rate = max(corrected_rate, 16)
+
+    monthly_installment = legacy_emi(loan_amount, corrected_rate, tenure)
+
+    current_emis = sum(loan.monthly_repayment for loan in loans if loan.is_active)
+    if approval and (current_emis + monthly_installment) > 0.5 * customer.monthly_income:
+        approval = False
+    return approval, corrected_rate, monthly_installment
+
+
+class CreditScoringTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(20250725)
+        today = timezone.now().date()
+        cls.customers = []
+        for i in range(60):
+            monthly_income = rng.choice([0, 15000, 40000, 90000, 250000])
+            customer = Customer.objects.create(
+                first_name=f'First{i}',
+                last_name='Last',
+                age=30,
+                phone_number=str(9000000000 + i),
+                monthly_income=monthly_income,
+                approved_limit=rng.choice([0, 100000, 500000, 3000000]),
+            )
+            cls.customers.append(customer)
+            for _ in range(rng.choice([0, 0, 1, 2, 3, 5, 8])):
+                tenure = rng.choice([6, 12, 24, 36])
+                start_date = today.replace(year=today.year - rng.choice([0, 0, 1, 3]), day=1)
+                Loan.objects.create(
+                    customer=customer,
+                    loan_amount=rng.choice([5000, 20000, 75000, 200000, 900000]),
+                    tenure=tenure,
+                    interest_rate=rng.choice([8, 11.5, 14, 18]),
+                    monthly_repayment=rng.choice([500, 2500, 12000, 40000]),
+                    emis_paid_on_time=rng.randint(0, tenure + 2),
+                    start_date=start_date,
+                    end_date=rng.choice([None, today + datetime.timedelta(days=200), today - datetime.timedelta(days=5)]),
+                )
+
+    def test_loan_stats_is_a_single_query(self):
+        customer = self.customers[0]
+        with self.assertNumQueries(1):
+            loan_stats(customer)
+
+    def test_credit_score_matches_legacy_implementation(self):
+        scores = set()
+        for customer in self.customers:
+            loans = Loan.objects.filter(customer=customer)
+            expected = legacy_credit_score(customer, loans)
+            self.assertEqual(calculate_credit_score(customer, loan_stats(customer)), expected,
+                             f'score mismatch for {customer}')
+            scores.add(expected)
+        # The fixture must exercise the interesting branches, not just one score
+        self.assertIn(100, scores)
+        self.assertIn(0, scores)
+        self.assertTrue(any(0 < score < 100 for score in scores))
+
+    def test_eligibility_matches_legacy_implementation(self):
+        requests = [(50000, 10, 12), (250000, 13, 24), (100000, 17, 36), (1000, 0, 6)]
+        for customer in self.customers:
+            loans = Loan.objects.filter(customer=customer)
+            for loan_amount, interest_rate, tenure in requests:
+                self.assertEqual(
+                    check_eligibility(customer, loan_amount, interest_rate, tenure),
+                    legacy_eligibility(customer, loans, loan_amount, interest_rate, tenure),
+                )
+
+    def test_customer_without_loans_scores_100(self):
+        customer = Customer.objects.create(first_name='New', last_name='Customer', age=25,
+                                           phone_number='1', monthly_income=50000, approved_limit=1800000)
+        stats = loan_stats(customer)
+        self.assertEqual(stats['total_loans'], 0)
+        self.assertEqual(stats['current_emis'], 0)
+        self.assertEqual(calculate_credit_score(customer, stats), 100)
+
+
+class CreditProfileTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer()
+        self.other = Customer.objects.create(first_name='Ravi', last_name='Rao', age=40, phone_number='43',
+                                             monthly_income=60000, approved_limit=2200000)
+        today = timezone.now().date()
+        self.loans = [
+            Loan.objects.create(customer=self.customer, loan_amount=amount, tenure=12, interest_rate=10,
+                                monthly_repayment=amount / 10, emis_paid_on_time=paid,
+                                start_date=today.replace(year=today.year - age, day=1))
+            for amount, paid, age in ((100000, 12, 0), (40000, 3, 1), (250000, 0, 0))
+        ]
+
+    def assertProfileMatches(self, customer):
+        profile = CustomerCreditProfile.objects.get(pk=customer.pk)
+        self.assertEqual(profile.as_stats(), loan_stats(customer))
+
+    def test_profile_is_built_on_first_read_then_a_single_lookup(self):
+        self.assertFalse(CustomerCreditProfile.objects.filter(pk=self.customer.pk).exists())
+        self.assertEqual(credit_stats(self.customer), loan_stats(self.customer))
+        with self.assertNumQueries(1):
+            credit_stats(self.customer)
+
+    def test_loan_writes_update_profile_incrementally(self):
+        rebuild_all_profiles()
+
+        Loan.objects.create(customer=self.customer, loan_amount=5000, tenure=6, interest_rate=12,
+                            monthly_repayment=900, emis_paid_on_time=6)
+        self.assertProfileMatches(self.customer)
+
+        loan = self.loans[1]
+        loan.emis_paid_on_time = 12
+        loan.is_active = False
+        loan.save()
+        self.assertProfileMatches(self.customer)
+
+        loan = self.loans[2]
+        loan.customer = self.other
+        loan.save()
+        self.assertProfileMatches(self.customer)
+        self.assertProfileMatches(self.other)
+
+        self.loans[0].delete()
+        self.assertProfileMatches(self.customer)
+
+    def test_rebuild_zeroes_customers_without_loans(self):
+        rebuild_all_profiles()
+        Loan.objects.filter(customer=self.customer).delete()
+        self.assertEqual(CustomerCreditProfile.objects.get(pk=self.customer.pk).total_loans, 0)
+        self.assertEqual(rebuild_all_profiles(), 2)
+        self.assertProfileMatches(self.customer)
+
+
+class EmiTests(TestCase):
+    def test_vectorised_installments_match_scalar_formula(self):
+        principals, rates, tenures = [100000, 250000, 1200, 5000], [10, 13.5, 0, 40], [12, 36, 12, 1]
+        installments = monthly_installments(principals, rates, tenures)
+        for installment, args in zip(installments, zip(principals, rates, tenures)):
+            self.assertAlmostEqual(installment, legacy_emi(*args), places=6)
+
+    def test_schedule_repays_principal(self):
+        schedule = amortisation_schedule(100000, 10, 12)
+        self.assertEqual(len(schedule), 12)
+        self.assertAlmostEqual(sum(row['principal'] for row in schedule), 100000, places=4)
+        self.assertAlmostEqual(schedule[0]['interest'], 100000 * 10 / 12 / 100)
+        self.assertEqual(schedule[-1]['balance'], 0)
+
+
+class LoanExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer()
+        for month, is_active in ((1, True), (2, False), (3, True)):
+            Loan.objects.create(customer=cls.customer, loan_amount=10000 * month, tenure=12, interest_rate=10,
+                                monthly_repayment=900, start_date=datetime.date(2024, month, 1),
+                                is_active=is_active, end_date=datetime.date(2030, 1, 1))
+
+    def export(self, **params):
+        response = self.client.get(reverse('loan_export'), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_filters_by_date_and_status(self):
+        rows = [json.loads(line) for line in self.export(**{'from': '2024-02-01', 'is_active': 'true'}).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['start_date'], '2024-03-01')
+        self.assertEqual(rows[0]['customer_id'], self.customer.customer_id)
+        self.assertEqual(rows[0]['loan_amount'], 30000)
+
+    def test_csv_has_header_and_every_row(self):
+        rows = list(csv.reader(io.StringIO(self.export(format='csv'))))
+        self.assertEqual(rows[0][:2], ['loan_id', 'customer_id'])
+        self.assertEqual(len(rows), 4)
+
+    def test_bad_parameters_are_rejected(self):
+        self.assertEqual(self.client.get(reverse('loan_export'), {'to': 'soon'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('loan_export'), {'format': 'xml'}).status_code, 400)
+        # Well formed but impossible dates
+        response = self.client.get(reverse('loan_export'), {'from': '2024-02-30'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': "'from' must be a date in YYYY-MM-DD format"})
+        self.assertEqual(self.client.get(reverse('customer_export'), {'to': '2024-13-45'}).status_code, 400)
+        response = self.client.get(reverse('customer_export'), {'format': 'csv'})
+        self.assertEqual(b''.join(response.streaming_content).count(b'\n'), 2)
+
+
+class ReadPathTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer()
+        cls.loans = [
+            Loan.objects.create(customer=cls.customer, loan_amount=amount, tenure=12, interest_rate=10.5,
+                                monthly_repayment=amount / 11, emis_paid_on_time=paid, end_date=end_date)
+            for amount, paid, end_date in ((100000, 12, None), (40000, 14, datetime.date(2020, 5, 1)))
+        ]
+
+    def setUp(self):
+        django_cache.clear()
+
+    def test_responses_match_serializer_path(self):
+        for loan in self.loans:
+            response = self.client.get(reverse('view_loan', args=[loan.loan_id]))
+            self.assertEqual(response.json(), json.loads(json.dumps(serializer_loan_detail(loan.loan_id))))
+        response = self.client.get(reverse('view_loans', args=[self.customer.customer_id]))
+        self.assertEqual(response.json(), serializer_customer_loans(self.customer.customer_id))
+
+    def test_each_read_is_one_query_per_lookup(self):
+        with self.assertNumQueries(1):
+            self.client.get(reverse('view_loan', args=[self.loans[0].loan_id]))
+        with self.assertNumQueries(2):
+            self.client.get(reverse('view_loans', args=[self.customer.customer_id]))
+
+    def test_missing_rows(self):
+        self.assertEqual(self.client.get(reverse('view_loan', args=['nope'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('view_loans', args=['nope'])).status_code, 404)
+
+
+class LoanCacheTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        self.customer = make_customer()
+        self.loan = make_loan(self.customer, end_date=datetime.date(2099, 1, 1))
+
+    def view_loan(self):
+        return self.client.get(reverse('view_loan', args=[self.loan.loan_id])).json()
+
+    def view_loans(self):
+        return self.client.get(reverse('view_loans', args=[self.customer.customer_id])).json()
+
+    def test_repeated_reads_skip_the_database(self):
+        self.view_loan()
+        self.view_loans()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.view_loan()['loan_id'], self.loan.loan_id)
+            self.assertEqual(len(self.view_loans()), 1)
+        self.assertEqual(cache.stats()['view_loan'], {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_loan_writes_invalidate(self):
+        self.view_loan()
+        self.view_loans()
+        with self.captureOnCommitCallbacks(execute=True):
+            Loan.objects.create(customer=self.customer, loan_amount=5000, tenure=6, interest_rate=12,
+                                monthly_repayment=900)
+        self.assertEqual(len(self.view_loans()), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(reverse('loan_detail', args=[self.loan.pk]), {
+                'customer': self.customer.pk, 'loan_amount': 100000, 'tenure': 12, 'interest_rate': 10,
+                'monthly_repayment': 8800, 'emis_paid_on_time': 4,
+            }, content_type='application/json')
+        self.assertEqual(self.view_loans()[0]['repayments_left'], 8)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('loan_detail', args=[self.loan.pk]))
+        self.assertEqual(len(self.view_loans()), 1)
+        self.assertEqual(self.client.get(reverse('view_loan', args=[self.loan.loan_id])).status_code, 404)
+
+    def test_customer_changes_and_sweeper_invalidate(self):
+        self.view_loan()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.first_name = 'Anita'
+            self.customer.save()
+        self.assertEqual(self.view_loan()['customer']['first_name'], 'Anita')
+
+        Loan.objects.filter(pk=self.loan.pk).update(end_date=datetime.date(2000, 1, 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            deactivate_expired_loans()
+        self.assertFalse(self.view_loan()['is_active'])
+
+    def test_renamed_customer_id_drops_the_old_id(self):
+        old_id = self.customer.customer_id
+        self.assertEqual(len(self.view_loans()), 1)
+        eligibility = {'customer_id': old_id, 'loan_amount': 200000, 'interest_rate': 11, 'tenure': 24}
+        check = lambda: self.client.post(reverse('check_eligibility'), eligibility, content_type='application/json')
+        self.assertEqual(check().status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(reverse('customer-detail', args=[self.customer.pk]), {
+                'customer_id': 'RENAMED', 'first_name': 'Asha', 'last_name': 'Rao', 'age': 35,
+                'phone_number': '42', 'monthly_income': 80000, 'approved_limit': 2900000,
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.client.get(reverse('view_loans', args=[old_id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('view_loans', args=['RENAMED'])).status_code, 200)
+        self.assertEqual(check().status_code, 400)
+
+
+class ExpiredLoanSweepTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer()
+        self.other = make_customer(phone_number='43')
+        future = datetime.date(2099, 1, 1)
+        self.expired = [make_loan(self.customer, loan_amount=amount, monthly_repayment=emi, end_date=future)
+                        for amount, emi in ((100000, 8800), (40000, 3500), (25000, 2200))]
+        self.current = make_loan(self.customer, loan_amount=60000, monthly_repayment=5300, end_date=future)
+        self.untouched = make_loan(self.other, loan_amount=70000, monthly_repayment=6100, end_date=future)
+        # Expire them behind save()'s back, as the calendar does
+        Loan.objects.filter(pk__in=[loan.pk for loan in self.expired]).update(end_date=datetime.date(2020, 1, 1))
+        rebuild_all_profiles()
+
+    def test_expired_active_loans_are_deactivated_and_profiles_follow(self):
+        before = {pk: CustomerCreditProfile.objects.get(pk=pk).as_stats() for pk in (self.customer.pk, self.other.pk)}
+        with self.captureOnCommitCallbacks(execute=True):
+            result = deactivate_expired_loans(batch_size=2)
+        self.assertEqual((result['deactivated'], result['chunks']), (3, 2))
+
+        active = dict(Loan.objects.values_list('pk', 'is_active'))
+        self.assertEqual(active, {**{loan.pk: False for loan in self.expired},
+                                  self.current.pk: True, self.untouched.pk: True})
+        after = CustomerCreditProfile.objects.get(pk=self.customer.pk).as_stats()
+        self.assertEqual(after['current_loans_sum'], before[self.customer.pk]['current_loans_sum'] - 165000)
+        self.assertEqual(after['current_emis'], before[self.customer.pk]['current_emis'] - 14500)
+        self.assertEqual(after['current_loans_sum'], 60000)
+        self.assertEqual(after['current_emis'], 5300)
+        self.assertEqual((after['total_loans'], after['loan_volume']),
+                         (before[self.customer.pk]['total_loans'], before[self.customer.pk]['loan_volume']))
+        self.assertEqual(after, credit_stats(self.customer))
+        self.assertEqual(CustomerCreditProfile.objects.get(pk=self.other.pk).as_stats(), before[self.other.pk])
+
+    def test_nothing_to_sweep(self):
+        deactivate_expired_loans()
+        with self.assertNumQueries(1):
+            self.assertEqual(deactivate_expired_loans()['deactivated'], 0)
+
+
+class EligibilityMemoTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        memo.decisions.clear()
+        self.customer = make_customer()
+        self.payload = {'customer_id': self.customer.customer_id, 'loan_amount': 200000,
+                        'interest_rate': 11, 'tenure': 24}
+
+    def check(self, **changes):
+        return self.client.post(reverse('check_eligibility'), {**self.payload, **changes},
+                                content_type='application/json')
+
+    def test_repeated_checks_skip_scoring(self):
+        first = self.check().json()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.check().json(), first)
+        self.assertEqual(memo.decisions.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['check_eligibility']['misses'], 1)
+
+    def test_loan_and_customer_writes_change_the_version(self):
+        self.assertTrue(self.check().json()['approval'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Loan.objects.create(customer=self.customer, loan_amount=3000000, tenure=12, interest_rate=10,
+                                monthly_repayment=1000)
+        self.assertFalse(self.check().json()['approval'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.monthly_income = 1000
+            self.customer.save(update_fields=['monthly_income'])
+        self.check()
+        self.assertEqual(memo.decisions.stats(), {**memo.decisions.stats(), 'hits': 0, 'misses': 3})
+
+    def test_unknown_customer_is_rejected(self):
+        response = self.check(customer_id='nope')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'customer_id': ['Customer does not exist']})
+
+    def test_state_versions_expire_with_the_memo(self):
+        with mock.patch.object(django_cache, 'add', wraps=django_cache.add) as add:
+            self.check(customer_id='nope')
+        versions = {call.args[0]: call.kwargs['timeout'] for call in add.call_args_list
+                    if call.args[0].startswith('loans:state-version:')}
+        self.assertEqual(versions, {cache.version_key(cache.ALL_CUSTOMERS): settings.ELIGIBILITY_MEMO_TTL,
+                                    cache.version_key('nope'): settings.ELIGIBILITY_MEMO_TTL})
+        with mock.patch.object(django_cache, 'set_many', wraps=django_cache.set_many) as set_many:
+            with self.captureOnCommitCallbacks(execute=True):
+                make_loan(self.customer)
+        self.assertEqual(set_many.call_args.kwargs['timeout'], settings.ELIGIBILITY_MEMO_TTL)
+
+    def test_lru_evicts_oldest_and_expires(self):
+        lru = memo.LRUCache(maxsize=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIs(lru.get('b'), memo.MISSING)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertEqual(lru.stats()['evictions'], 1)
+        lru.ttl = -1
+        lru.set('d', 4)
+        self.assertIs(lru.get('d'), memo.MISSING)
+
+
+class EligibilityBatchTests(TestCase):
+    """Every item of /check-eligibility-batch/ answers exactly as /check-eligibility/ would."""
+
+    def setUp(self):
+        django_cache.clear()
+        memo.decisions.clear()
+        last_year = timezone.now().date().replace(month=1, day=1) - datetime.timedelta(days=1)
+        self.new = make_customer(phone_number='1')
+        # Credit scores 20 and 40: one unpaid loan from last year, volume worth 10 points per 10000
+        self.score_20 = make_customer(phone_number='2')
+        make_loan(self.score_20, loan_amount=20000, start_date=last_year, end_date=datetime.date(2099, 1, 1))
+        self.score_40 = make_customer(phone_number='3')
+        make_loan(self.score_40, loan_amount=40000, start_date=last_year, end_date=datetime.date(2099, 1, 1))
+        self.over_limit = make_customer(phone_number='4')
+        make_loan(self.over_limit, loan_amount=3000000, start_date=last_year, end_date=datetime.date(2099, 1, 1))
+        self.low_income = make_customer(phone_number='5', monthly_income=10000, approved_limit=400000)
+
+    def application(self, customer, loan_amount=100000, interest_rate=11, tenure=24):
+        customer_id = customer if isinstance(customer, str) else customer.customer_id
+        return {'customer_id': customer_id, 'loan_amount': loan_amount, 'interest_rate': interest_rate,
+                'tenure': tenure}
+
+    def test_items_match_single_checks(self):
+        applications = [
+            self.application(self.new),
+            self.application(self.score_20, interest_rate=18),
+            self.application(self.score_20, interest_rate=14),
+            self.application(self.score_40, interest_rate=13),
+            self.application(self.score_40, interest_rate=10),
+            self.application(self.over_limit),
+            self.application(self.low_income, loan_amount=500000, interest_rate=12, tenure=12),
+            self.application(self.new, loan_amount=-1),
+            {'customer_id': self.new.customer_id, 'loan_amount': 1000, 'interest_rate': 10},
+            self.application('nobody'),
+        ]
+        response = self.client.post(reverse('check_eligibility_batch'), applications, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        self.assertEqual(len(results), len(applications))
+        self.assertEqual([result.get('approval') for result in results],
+                         [True, True, False, True, False, False, False, None, None, None])
+
+        for application, result in zip(applications, results):
+            with self.subTest(application=application):
+                single = self.client.post(reverse('check_eligibility'), application, content_type='application/json')
+                expected = single.json()
+                self.assertEqual(single.status_code, 200 if 'approval' in expected else 400)
+                # The batch prices installments in one NumPy pass: equal up to the last digit
+                self.assertAlmostEqual(result.pop('monthly_installment', None) or 0,
+                                       expected.pop('monthly_installment', None) or 0, places=6)
+                self.assertEqual(result, expected)
+
+
+def approved_loan_count(approved_limit, loan_amount):
+    """Loans of ``loan_amount`` approved in a row; each needs the active loans before it within the limit."""
+    return int(approved_limit // loan_amount) + 1
+
+
+class CreateLoanTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer(monthly_income=100000, approved_limit=3600000, current_debt=1000)
+
+    def test_debt_is_incremented_in_the_database(self):
+        payload = {'customer_id': self.customer.customer_id, 'loan_amount': 50000.9,
+                   'interest_rate': 14, 'tenure': 240}
+        for _ in range(3):
+            response = self.client.post(reverse('create_loan'), payload, content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.current_debt, 1000 + 3 * 50000)
+        self.assertEqual(check_invariants(self.customer, 1000, list(self.customer.loans.order_by('pk'))), [])
+
+    def test_approvals_stop_once_the_limit_is_exceeded(self):
+        payload = {'customer_id': self.customer.customer_id, 'loan_amount': 2000000,
+                   'interest_rate': 14, 'tenure': 240}
+        statuses = [self.client.post(reverse('create_loan'), payload, content_type='application/json').status_code
+                    for _ in range(3)]
+        self.assertEqual(statuses, [201, 201, 400])
+
+    def test_sequential_creates_stop_exactly_at_the_limit(self):
+        # The load_test_create_loan defaults, one request at a time
+        customer = make_customer(phone_number='0', monthly_income=100000,
+                                 approved_limit=calculate_approved_limit(100000))
+        amount, rate, tenure = 50000, 14, 240
+        expected = approved_loan_count(customer.approved_limit, amount)
+        # EMIs stay affordable throughout, so only the limit stops approvals
+        self.assertLessEqual(expected * calculate_emi(amount, rate, tenure), customer.monthly_income / 2)
+        payload = {'customer_id': customer.customer_id, 'loan_amount': amount, 'interest_rate': rate,
+                   'tenure': tenure}
+        statuses = [self.client.post(reverse('create_loan'), payload, content_type='application/json').status_code
+                    for _ in range(expected + 3)]
+        self.assertEqual(statuses, [201] * expected + [400] * 3)
+        customer.refresh_from_db()
+        self.assertEqual(customer.current_debt, expected * amount)
+        self.assertEqual(check_invariants(customer, 0, list(customer.loans.order_by('pk'))), [])
+
+    def test_unknown_customer(self):
+        payload = {'customer_id': 'nobody', 'loan_amount': 50000, 'interest_rate': 14, 'tenure': 240}
+        with self.assertNumQueries(3):  # Savepoint, locked read, release
+            response = self.client.post(reverse('create_loan'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'customer_id': ['Customer does not exist']})
+
+    def test_idempotent_retry_does_not_create_a_second_loan(self):
+        django_cache.clear()
+        payload = {'customer_id': self.customer.customer_id, 'loan_amount': 50000,
+                   'interest_rate': 14, 'tenure': 240}
+        post = lambda: self.client.post(reverse('create_loan'), payload, content_type='application/json',
+                                        headers={'Idempotency-Key': 'retry-1'})
+        first = post()
+        with self.assertNumQueries(0):
+            retry = post()
+        self.assertEqual(retry.json()['loan_id'], first.json()['loan_id'])
+        self.assertEqual(self.customer.loans.count(), 1)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class CreateLoanConcurrencyTests(TransactionTestCase):
+    def test_parallel_creates_lose_no_updates(self):
+        out = io.StringIO()
+        call_command('load_test_create_loan', requests=120, concurrency=12, stdout=out)
+        self.assertIn('Debt and approval limit are consistent', out.getvalue())
+        expected = approved_loan_count(calculate_approved_limit(100000), 50000)
+        self.assertIn(f'{expected} loans created', out.getvalue())
+
+
+class RepaymentPostingTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        self.customer = make_customer()
+        self.loans = [
+            Loan.objects.create(customer=self.customer, loan_amount=10000, tenure=12, interest_rate=10,
+                                monthly_repayment=900, emis_paid_on_time=paid)
+            for paid in (0, 11, 5, 14)
+        ]
+
+    def test_postings_are_applied_and_reconciled(self):
+        rebuild_all_profiles()
+        first, last_emi, two_posts, legacy = (loan.loan_id for loan in self.loans)
+        records = [
+            {'loan_id': first, 'installments_paid': 1},
+            {'loan_id': last_emi, 'installments_paid': 3},
+            {'loan_id': two_posts, 'installments_paid': 2},
+            {'loan_id': two_posts, 'installments_paid': 1},
+            {'loan_id': legacy, 'installments_paid': 1},
+            {'loan_id': 'missing', 'installments_paid': 1},
+            {'loan_id': first, 'installments_paid': 0},
+            {'installments_paid': 1},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            summary = post_repayments(records, batch_size=2).as_dict()
+
+        self.assertEqual(
+            {key: summary[key] for key in ('records_received', 'records_rejected', 'unknown_loans', 'loans_posted',
+                                          'installments_applied', 'excess_installments', 'loans_completed')},
+            {'records_received': 8, 'records_rejected': 2, 'unknown_loans': 1, 'loans_posted': 4,
+             'installments_applied': 5, 'excess_installments': 3, 'loans_completed': 1},
+        )
+        self.assertEqual(len(summary['errors']), 3)
+        paid = dict(Loan.objects.values_list('loan_id', 'emis_paid_on_time'))
+        self.assertEqual([paid[loan.loan_id] for loan in self.loans], [1, 12, 8, 14])
+        active = dict(Loan.objects.values_list('loan_id', 'is_active'))
+        self.assertEqual([active[loan.loan_id] for loan in self.loans], [True, False, True, False])
+        profile = CustomerCreditProfile.objects.get(pk=self.customer.pk)
+        self.assertEqual(profile.as_stats(), loan_stats(self.customer))
+
+    def test_api_applies_small_batches_inline(self):
+        response = self.client.post(reverse('post_repayments'),
+                                    {'repayments': [{'loan_id': self.loans[0].loan_id, 'installments_paid': 1}]},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['installments_applied'], 1)
+        self.assertEqual(self.client.post(reverse('post_repayments'), [], content_type='application/json').status_code,
+                         400)
+
+    def test_records_that_are_not_objects_are_rejected_with_a_readable_error(self):
+        response = self.client.post(reverse('post_repayments'),
+                                    {'repayments': [3, 'L1', [self.loans[0].loan_id, 1], None]},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        summary = response.json()
+        self.assertEqual((summary['records_received'], summary['records_rejected']), (4, 4))
+        self.assertEqual({error['error'] for error in summary['errors']},
+                         {'record must be an object with loan_id and installments_paid'})
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer()
+        cls.loan = make_loan(cls.customer, emis_paid_on_time=3)
+
+    def setUp(self):
+        django_cache.clear()
+        memo.decisions.clear()
+        self.factory = AsyncRequestFactory()
+
+    async def test_responses_match_the_sync_views(self):
+        for view, url_name, arg in ((async_views.view_loan, 'view_loan', self.loan.loan_id),
+                                    (async_views.view_loans, 'view_loans', self.customer.customer_id),
+                                    (async_views.view_loans, 'view_loans', 'nope')):
+            expected = await self.async_client.get(reverse(url_name, args=[arg]))
+            django_cache.clear()
+            response = await view(self.factory.get('/'), arg)
+            self.assertEqual(response.status_code, expected.status_code)
+            self.assertEqual(json.loads(response.content), expected.json())
+
+        payload = {'customer_id': self.customer.customer_id, 'loan_amount': 50000, 'interest_rate': 11, 'tenure': 12}
+        expected = await self.async_client.post(reverse('check_eligibility'), payload, content_type='application/json')
+        memo.decisions.clear()
+        response = await async_views.check_eligibility(
+            self.factory.post('/', payload, content_type='application/json'))
+        self.assertEqual(json.loads(response.content), expected.json())
+
+    async def test_invalid_eligibility_payload(self):
+        response = await async_views.check_eligibility(
+            self.factory.post('/', '{not json', content_type='application/json'))
+        self.assertEqual(response.status_code, 400)
+        response = await async_views.check_eligibility(
+            self.factory.post('/', {'customer_id': 'nope', 'loan_amount': 1, 'interest_rate': 1, 'tenure': 1},
+                              content_type='application/json'))
+        self.assertEqual(json.loads(response.content), {'customer_id': ['Customer does not exist']})
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        registry.reset()
+        self.customer = make_customer()
+        self.loan = make_loan(self.customer)
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_requests_are_timed_and_their_queries_counted(self):
+        self.client.get(reverse('view_loan', args=[self.loan.loan_id]))
+        self.client.get(reverse('view_loan', args=[self.loan.loan_id]))
+        self.client.get(reverse('view_loan', args=['nope']))
+        samples = self.scrape()
+        self.assertEqual(samples['http_requests_total{method="GET",status="200",view="view_loan"}'], 2)
+        self.assertEqual(samples['http_requests_total{method="GET",status="404",view="view_loan"}'], 1)
+        self.assertEqual(samples['http_request_duration_seconds_count{view="view_loan"}'], 3)
+        # One query on the miss, none on the cache hit, one for the unknown loan
+        self.assertEqual(samples['http_request_db_queries_sum{view="view_loan"}'], 2)
+        self.assertEqual(samples['http_request_db_queries_bucket{view="view_loan",le="0"}'], 1)
+        self.assertEqual(samples['http_request_db_queries_bucket{view="view_loan",le="+Inf"}'], 3)
+        self.assertEqual(samples['loan_cache_requests_total{endpoint="view_loan",outcome="hits"}'], 1)
+
+    def test_workers_are_merged_from_the_metrics_directory(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            with open(f'{directory}/other-1.json', 'w') as f:
+                json.dump({'counters': [['ingestion_runs_total', [['kind', 'loans'], ['status', 'ok']], 2]],
+                           'histograms': []}, f)
+            record_ingestion('loans', {'rows_inserted': 10, 'rows_updated': 0, 'rows_unchanged': 0,
+                                       'rows_failed': 1, 'elapsed_seconds': 0.5})
+            samples = self.scrape()
+        self.assertEqual(samples['ingestion_runs_total{kind="loans",status="ok"}'], 3)
+        self.assertEqual(samples['ingestion_rows_total{kind="loans",outcome="failed"}'], 1)
+        self.assertEqual(samples['ingestion_seconds_total{kind="loans"}'], 0.5)
+
+    def test_a_restart_that_reuses_the_pid_keeps_the_old_totals(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            registry.inc('ingestion_runs_total', {'kind': 'loans', 'status': 'ok'}, 5)
+            registry.flush(force=True)
+            registry.reset()  # A new process under the same PID starts from zero
+            registry.inc('ingestion_runs_total', {'kind': 'loans', 'status': 'ok'})
+            samples = self.scrape()
+            # The predecessor's file is folded into the retired totals
+            self.assertEqual(sorted(name for name in os.listdir(directory) if name.endswith('.json')),
+                             [metrics.RETIRED_FILE, f'{socket.gethostname()}-{os.getpid()}-{registry.start_token}.json'])
+        self.assertEqual(samples['ingestion_runs_total{kind="loans",status="ok"}'], 6)
+
+    def test_files_of_exited_processes_are_folded_into_the_retired_totals(self):
+        def write(name, runs, seconds):
+            with open(f'{directory}/{name}', 'w') as f:
+                json.dump({'counters': [['ingestion_runs_total', [['kind', 'loans'], ['status', 'ok']], runs]],
+                           'histograms': [['http_request_duration_seconds', [['view', 'view_loan']],
+                                           {'buckets': [1], 'counts': [1, 0], 'sum': seconds, 'count': 1}]]}, f)
+
+        exited = subprocess.Popen(['true'])
+        exited.wait()
+        host = socket.gethostname()
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            write(f'{host}-{exited.pid}-old.json', 2, 0.5)
+            write(f'{host}-{os.getppid()}-live.json', 3, 0.25)  # Still running
+            write(f'elsewhere-{exited.pid}-old.json', 4, 0.125)  # Another host's PIDs cannot be checked
+            first = self.scrape()
+            self.assertNotIn(f'{host}-{exited.pid}-old.json', os.listdir(directory))
+            write(f'{host}-{exited.pid}-again.json', 1, 1.0)
+            second = self.scrape()
+            self.assertEqual(sorted(name for name in os.listdir(directory) if name.endswith('.json')), sorted([
+                metrics.RETIRED_FILE, f'{host}-{os.getppid()}-live.json', f'elsewhere-{exited.pid}-old.json',
+                f'{host}-{os.getpid()}-{registry.start_token}.json',
+            ]))
+        self.assertEqual(first['ingestion_runs_total{kind="loans",status="ok"}'], 9)
+        self.assertEqual(second['ingestion_runs_total{kind="loans",status="ok"}'], 10)
+        self.assertEqual(second['http_request_duration_seconds_sum{view="view_loan"}'], 1.875)
+        self.assertEqual(second['http_request_duration_seconds_count{view="view_loan"}'], 4)
+
+
+class ProfilerTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        overrides = override_settings(PROFILE_DIR=self.directory.name, PROFILE_MAX_CAPTURES=2)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        customer = make_customer()
+        self.loan = make_loan(customer)
+
+    def view_loan(self, **headers):
+        django_cache.clear()  # A miss, so every request runs its query
+        return self.client.get(reverse('view_loan', args=[self.loan.loan_id]), headers=headers)
+
+    def test_only_signed_requests_are_captured(self):
+        self.assertNotIn('X-Profile-Id', self.view_loan())
+        self.assertNotIn('X-Profile-Id', self.view_loan(**{profiling.HEADER: 'profile:forged:sig'}))
+
+        response = self.view_loan(**{profiling.HEADER: profiling.issue_token()})
+        capture_id = response['X-Profile-Id']
+        with open(f'{self.directory.name}/{capture_id}.json') as f:
+            capture = json.load(f)
+        self.assertEqual((capture['view'], capture['status'], capture['trigger']), ('view_loan', 200, 'header'))
+        self.assertEqual(len(capture['queries']), 1)
+        self.assertIn('loans_loan', capture['queries'][0]['sql'])
+
+    @override_settings(PROFILE_SAMPLE_RATE=1.0)
+    def test_store_keeps_the_newest_captures_and_the_command_summarises_them(self):
+        ids = [self.view_loan()['X-Profile-Id'] for _ in range(3)]
+        self.assertEqual(sorted(os.listdir(self.directory.name)),
+                         sorted(f'{capture_id}.{ext}' for capture_id in ids[1:] for ext in ('json', 'prof')))
+
+        out = io.StringIO()
+        call_command('profile_hotspots', '--view', 'view_loan', stdout=out)
+        self.assertIn('2 captures', out.getvalue())
+        self.assertIn('Top functions by tottime', out.getvalue())
+        self.assertIn('Top SQL by total time', out.getvalue())
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Fixed query-count and response-size ceilings for every loans endpoint.
+
+    Customers with 1, 10 and 500 loans get the same query budget, so an N+1
+    (a query per loan or per customer) fails here like any functional bug.
+    Cached reads are measured on a cold cache; sizes are response bytes. Raise
+    a budget only together with the change that needs it.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customers = make_loan_tiers()
+
+    def setUp(self):
+        memo.decisions.clear()
+
+    def test_view_loans(self):
+        for count, customer in self.customers.items():
+            with self.subTest(loans=count):
+                self.assertWithinBudget('get', 'view_loans', [customer.customer_id], queries=2, size=150 * count)
+
+    def test_view_loan_and_schedule(self):
+        for count in LOAN_TIERS:
+            with self.subTest(loans=count):
+                self.assertWithinBudget('get', 'view_loan', [tier_loan_id(count, 0)], queries=1, size=500)
+                # Longest tenure of the tier (at most 59 months), ~150 bytes per schedule row
+                self.assertWithinBudget('get', 'view_loan_schedule', [tier_loan_id(count, min(count, 48) - 1)],
+                                        queries=1, size=150 * 60)
+
+    def test_check_eligibility(self):
+        for count, customer in self.customers.items():
+            with self.subTest(loans=count):
+                data = {'customer_id': customer.customer_id, 'loan_amount': 100000, 'interest_rate': 12, 'tenure': 24}
+                self.assertWithinBudget('post', 'check_eligibility', data=data, queries=2, size=200)
+
+    def test_check_eligibility_batch(self):
+        data = [{'customer_id': customer.customer_id, 'loan_amount': 100000, 'interest_rate': 12, 'tenure': 24}
+                for customer in self.customers.values()] * 20
+        self.assertWithinBudget('post', 'check_eligibility_batch', data=data, queries=2, size=200 * len(data))
+
+    def test_create_loan(self):
+        for count, customer in self.customers.items():
+            with self.subTest(loans=count):
+                data = {'customer_id': customer.customer_id, 'loan_amount': 10000, 'interest_rate': 15, 'tenure': 24}
+                # Savepoint, locked customer, profile, insert, cache keys, profile update, debt update, release
+                self.assertWithinBudget('post', 'create_loan', data=data, queries=8, size=200, status=201)
+
+    def test_loan_list(self):
+        self.assertWithinBudget('get', 'loan_list', queries=1, size=550 * settings.API_PAGE_SIZE)
+        self.assertWithinBudget('get', 'loan_list', data={'fields': 'loan_id,loan_amount'}, queries=1,
+                                size=60 * settings.API_PAGE_SIZE)
+        data = {'customer': self.customers[1].pk, 'loan_amount': 5000, 'tenure': 6, 'interest_rate': 9,
+                'start_date': '2024-01-01'}
+        self.assertWithinBudget('post', 'loan_list', data=data, queries=4, size=550, status=201)
+
+    def test_loan_list_cursor_walks_pages(self):
+        first = self.assertWithinBudget('get', 'loan_list', data={'page_size': 5}, queries=1, size=550 * 5).json()
+        self.assertIsNone(first['previous'])
+        with self.assertNumQueries(1):
+            second = self.client.get(first['next']).json()
+        first_ids = [loan['id'] for loan in first['results']]
+        second_ids = [loan['id'] for loan in second['results']]
+        self.assertEqual(first_ids, sorted(Loan.objects.values_list('pk', flat=True))[:5])
+        self.assertEqual(second_ids, sorted(Loan.objects.filter(pk__gt=first_ids[-1]).values_list('pk', flat=True))[:5])
+        self.assertEqual([loan['id'] for loan in self.client.get(second['previous']).json()['results']], first_ids)
+
+    def test_loan_list_fields(self):
+        response = self.assertWithinBudget('get', 'loan_list', data={'fields': 'loan_id,loan_amount'}, queries=1,
+                                           size=60 * settings.API_PAGE_SIZE)
+        self.assertEqual({tuple(loan) for loan in response.json()['results']}, {('loan_id', 'loan_amount')})
+        response = self.client.get(reverse('loan_list'), {'fields': 'loan_id,bogus'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'fields': ['Unknown field: bogus']})
+
+    def test_loan_detail(self):
+        pk = Loan.objects.get(loan_id=tier_loan_id(500, 0)).pk
+        self.assertWithinBudget('get', 'loan_detail', [pk], queries=2, size=550)
+        data = {'customer': self.customers[500].pk, 'loan_amount': 5000, 'tenure': 6, 'interest_rate': 9,
+                'start_date': '2024-01-01'}
+        self.assertWithinBudget('put', 'loan_detail', [pk], data=data, queries=6, size=550)
+        self.assertWithinBudget('delete', 'loan_detail', [pk], queries=4, status=204)
+
+    def test_loan_export(self):
+        rows = Loan.objects.count()
+        self.assertWithinBudget('get', 'loan_export', queries=1, size=320 * rows)
+        self.assertWithinBudget('get', 'loan_export', data={'format': 'csv', 'is_active': 'true'}, queries=1,
+                                size=130 * rows)
+
+    def test_repayments(self):
+        records = [{'loan_id': tier_loan_id(500, i), 'installments_paid': 1} for i in range(500)]
+        # One chunk: savepoint, lock, one update per distinct count, profile rebuild and upsert, release
+        self.assertWithinBudget('post', 'post_repayments', data=records, queries=7, size=400)
+        with mock.patch('loans.views.AsyncResult') as result:
+            result.return_value.state = 'SUCCESS'
+            result.return_value.result = {'loans_posted': 500}
+            self.assertWithinBudget('get', 'repayment_status', ['abc'], queries=0, size=100)
+
+
+class PortfolioTests(TestCase):
+    def test_same_seed_gives_the_same_portfolio(self):
+        counts = portfolio.loan_count_distribution('0:1,2:1,5:1')
+        first = list(portfolio.generate(50, counts, seed=4, as_of=datetime.date(2025, 6, 1)))
+        self.assertEqual(first, list(portfolio.generate(50, counts, seed=4, as_of=datetime.date(2025, 6, 1))))
+        self.assertNotEqual(first, list(portfolio.generate(50, counts, seed=5, as_of=datetime.date(2025, 6, 1))))
+        self.assertEqual({len(loans) for _, loans in first}, {0, 2, 5})
+        for _, loans in first:
+            for loan in loans:
+                self.assertLessEqual(loan['emis_paid_on_time'], loan['tenure'])
+
+    def test_default_date_is_the_django_clock(self):
+        now = datetime.datetime(2031, 3, 1, 0, 30, tzinfo=datetime.timezone.utc)
+        counts = portfolio.loan_count_distribution('fixed:3')
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            generated = list(portfolio.generate(20, counts, seed=2))
+            portfolio.insert(generated)
+        self.assertEqual(generated, list(portfolio.generate(20, counts, seed=2, as_of=now.date())))
+        # Inserted with the same is_active rule Loan.save() applies on that day
+        for end_date, is_active in Loan.objects.values_list('end_date', 'is_active'):
+            self.assertEqual(is_active, end_date >= now.date())
+        self.assertTrue(Loan.objects.filter(is_active=False).exists())
+
+    def test_distributions(self):
+        rng = random.Random(1)
+        self.assertEqual(portfolio.loan_count_distribution('fixed:3')(rng), 3)
+        self.assertTrue(all(2 <= portfolio.loan_count_distribution('uniform:2-4')(rng) <= 4 for _ in range(50)))
+        with self.assertRaises(portfolio.DistributionError):
+            portfolio.loan_count_distribution('lots')
+
+    def test_files_ingest_against_the_inserted_customers(self):
+        out = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('generate_portfolio', customers=20, loans='fixed:3', seed=9, insert='customers',
+                         output=directory, file_format='csv', stdout=out)
+            self.assertEqual((Customer.objects.count(), Loan.objects.count()), (20, 0))
+            report = ingest_loans(f'{directory}/loans.csv').as_dict()
+        self.assertEqual((report['rows_inserted'], report['rows_failed']), (60, 0))
+        self.assertTrue(Customer.objects.filter(customer_id='S9-00000019').exists())
+
+        with self.assertRaises(CommandError):
+            call_command('generate_portfolio', customers=20, seed=9, stdout=out)
+        call_command('generate_portfolio', customers=20, loans='fixed:3', seed=9, replace=True, stdout=out)
+        self.assertEqual((Customer.objects.count(), Loan.objects.count()), (20, 60))
+        profile = CustomerCreditProfile.objects.get(customer__customer_id='S9-00000000')
+        self.assertEqual(profile.total_loans, 3)
+
+    def test_both_files_ingest_into_an_empty_database_with_their_ids(self):
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('generate_portfolio', customers=5, loans='fixed:2', seed=9, insert='none',
+                         output=directory, file_format='csv', stdout=io.StringIO())
+            ingest_customers(f'{directory}/customers.csv', incremental=True)
+            report = ingest_loans(f'{directory}/loans.csv', incremental=True).as_dict()
+        self.assertEqual((report['rows_inserted'], report['rows_failed']), (10, 0))
+        self.assertEqual(Loan.objects.filter(customer__customer_id='S9-00000004').count(), 2)
+        self.assertFalse(Loan.objects.exclude(source_key=F('loan_id')).exists())
+
+
+class BenchmarkApiTests(TransactionTestCase):
+    def test_report_covers_every_endpoint(self):
+        call_command('generate_portfolio', customers=10, loans='fixed:2', stdout=io.StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('benchmark_api', requests=10, warmup=2, concurrency=1, output=f'{directory}/run.json',
+                         stdout=io.StringIO(), stderr=io.StringIO())
+            with open(f'{directory}/run.json') as f:
+                report = json.load(f)
+        self.assertEqual(set(report['endpoints']), {'check-eligibility', 'view-loan', 'view-loans', 'create-loan'})
+        for result in report['endpoints'].values():
+            self.assertEqual(result['errors'], 0)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+            self.assertLessEqual(result['p95_ms'], result['p99_ms'])
+        self.assertEqual((report['meta']['customers'], report['meta']['loans']), (10, 20))
+        created = report['endpoints']['create-loan']['statuses'].get('201', 0)
+        self.assertGreaterEqual(Loan.objects.count(), 20 + created)
+
+
+class HotQueryIndexTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        call_command('generate_portfolio', customers=30, loans='fixed:4', stdout=io.StringIO())
+        out = io.StringIO()
+        call_command('explain_hot_queries', min_rows=0, strict=True, stdout=out)
+        self.assertIn('loan_active_expiry_idx', out.getvalue())
+        self.assertIn('loan_customer_', out.getvalue())
+
+    def test_unindexed_filters_are_flagged(self):
+        plan = Loan.objects.filter(tenure=12).explain()
+        self.assertEqual(SEQ_SCAN[connection.vendor].findall(plan), ['loans_loan'])
+        plan = Loan.objects.filter(loan_id='x').explain()
+        self.assertEqual(SEQ_SCAN[connection.vendor].findall(plan), [])
+
+
+class IncrementalIngestionTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.customer_rows = [['Asha', 'Rao', 35, '42', 80000, 'CUST42'], ['Ravi', 'Rao', 40, '43', 60000, 'CUST43']]
+        self.customers(self.customer_rows)
+        self.loan_rows = [
+            ['CUST42', 100000, 12, 10, 8800, 3, '2024-01-01', '2099-01-01', 'LOAN1'],
+            ['CUST43', 50000, 6, 12, 8600, 6, '2023-01-01', '2023-07-01', 'LOAN2'],
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first = self.ingest(self.loan_rows)
+
+    def write(self, name, columns, rows):
+        with open(f'{self.directory}/{name}', 'w', newline='') as f:
+            csv.writer(f).writerows([columns] + rows)
+
+    def customers(self, customer_rows):
+        self.write('customers.csv', CUSTOMER_COLUMNS, customer_rows)
+        with self.captureOnCommitCallbacks(execute=True):
+            return ingest_customers(f'{self.directory}/customers.csv', incremental=True).as_dict()
+
+    def ingest(self, loan_rows, batch_size=None):
+        self.write('loans.csv', LOAN_COLUMNS, loan_rows)
+        with self.captureOnCommitCallbacks(execute=True):
+            return ingest_loans(f'{self.directory}/loans.csv', batch_size=batch_size, incremental=True).as_dict()
+
+    def counts(self, report):
+        return report['rows_unchanged'], report['rows_updated'], report['rows_inserted'], report['rows_failed']
+
+    def test_unchanged_rerun_only_reads(self):
+        self.assertEqual(self.first['rows_inserted'], 2)
+        # Customer lookup and existing keys; no writes, profile rebuild or cache bumps
+        with self.assertNumQueries(2):
+            report = self.ingest(self.loan_rows)
+        self.assertEqual(self.counts(report), (2, 0, 0, 0))
+        self.assertEqual(Loan.objects.count(), 2)
+
+    def test_changed_row_is_updated_in_place_and_leaves_no_stale_cache(self):
+        loan = Loan.objects.get(loan_id='LOAN1')
+        url = reverse('view_loan', args=[loan.loan_id])
+        self.assertEqual(self.client.get(url).json()['loan_amount'], 100000)
+        self.loan_rows[0][1] = 120000
+        report = self.ingest(self.loan_rows)
+        self.assertEqual(self.counts(report), (1, 1, 0, 0))
+        self.assertEqual(Loan.objects.get(pk=loan.pk).loan_amount, 120000)
+        self.assertEqual(self.client.get(url).json()['loan_amount'], 120000)
+        self.assertEqual(CustomerCreditProfile.objects.get(pk=loan.customer_id).loan_volume, 120000)
+
+    def test_keyed_rows_are_updated_across_chunks(self):
+        self.loan_rows[1][1] = 55000
+        report = self.ingest(self.loan_rows, batch_size=1)
+        self.assertEqual(self.counts(report), (1, 1, 0, 0))
+        self.assertEqual(dict(Loan.objects.values_list('loan_id', 'loan_amount')), {'LOAN1': 100000, 'LOAN2': 55000})
+
+    def test_loans_sharing_a_term_stay_separate(self):
+        same_term = ['CUST42', 5000, 12, 9, 440, 0, '2024-01-01', '2099-01-01']
+        report = self.ingest(self.loan_rows + [same_term + ['LOAN3'], same_term[:1] + [7000] + same_term[2:]])
+        self.assertEqual(self.counts(report), (2, 0, 2, 0))
+        self.assertEqual(sorted(Loan.objects.filter(customer__customer_id='CUST42', start_date='2024-01-01')
+                                .values_list('loan_amount', flat=True)), [5000, 7000, 100000])
+
+    def test_rows_without_an_id_are_always_inserted(self):
+        rows = [row[:8] for row in self.loan_rows]
+        self.assertEqual(self.counts(self.ingest(rows)), (0, 0, 2, 0))
+        self.assertEqual(self.counts(self.ingest(rows)), (0, 0, 2, 0))
+        self.assertEqual(Loan.objects.count(), 6)
+        self.assertEqual(Loan.objects.filter(source_key__isnull=True).count(), 4)
+
+    def test_repeated_id_is_reported_not_merged(self):
+        repeated = ['CUST43', 9000, 6, 9, 1500, 0, '2025-01-01', '2099-01-01', 'LOAN1']
+        report = self.ingest(self.loan_rows + [repeated])
+        self.assertEqual(self.counts(report), (2, 0, 0, 1))
+        self.assertEqual(report['errors'][0]['row'], 4)
+        self.assertIn('Duplicate id LOAN1, already in row 2', report['errors'][0]['error'])
+        self.assertEqual(Loan.objects.get(loan_id='LOAN1').loan_amount, 100000)
+
+    def test_api_created_loan_is_not_overwritten(self):
+        customer = Customer.objects.get(customer_id='CUST42')
+        make_loan(customer, loan_id='API1', loan_amount=30000)
+        report = self.ingest(self.loan_rows + [['CUST43', 9000, 6, 9, 1500, 0, '2025-01-01', '2099-01-01', 'API1']])
+        self.assertEqual(self.counts(report), (2, 0, 0, 1))
+        loan = Loan.objects.get(loan_id='API1')
+        self.assertEqual((loan.customer_id, loan.loan_amount, loan.source_key), (customer.pk, 30000, None))
+
+    def test_changed_customer_keeps_its_customer_id(self):
+        self.customer_rows[0][4] = 90000
+        report = self.customers(self.customer_rows)
+        self.assertEqual((report['rows_unchanged'], report['rows_updated']), (1, 1))
+        self.assertEqual(Customer.objects.get(customer_id='CUST42').monthly_income, 90000)
+        self.assertEqual(Customer.objects.count(), 2)
+
+    def test_customers_sharing_a_phone_number_are_not_merged(self):
+        report = self.customers(self.customer_rows + [['Mira', 'Rao', 30, '42', 50000, 'CUST44'],
+                                                      ['Neha', 'Rao', 33, '42', 55000, '']])
+        self.assertEqual(self.counts(report), (2, 0, 2, 0))
+        self.assertEqual(sorted(Customer.objects.filter(phone_number='42').values_list('first_name', flat=True)),
+                         ['Asha', 'Mira', 'Neha'])
+
+    def test_migrations_rekey_only_ingested_rows(self):
+        customer = make_customer(phone_number='44')
+        loan = make_loan(customer)
+        # Keys as the old phone number and customer|term scheme wrote them
+        Customer.objects.filter(customer_id='CUST42').update(source_key='42')
+        Loan.objects.filter(loan_id='LOAN1').update(source_key=f'{customer.pk}|2024-01-01|2099-01-01')
+        import_module('customers.migrations.0006_backfill_customer_source_key').rekey_ingested_customers(apps, None)
+        import_module('loans.migrations.0008_backfill_loan_source_key').rekey_ingested_loans(apps, None)
+        self.assertEqual(dict(Customer.objects.values_list('customer_id', 'source_key')),
+                         {'CUST42': 'CUST42', 'CUST43': 'CUST43', customer.customer_id: None})
+        self.assertEqual(dict(Loan.objects.values_list('loan_id', 'source_key')),
+                         {'LOAN1': 'LOAN1', 'LOAN2': 'LOAN2', loan.loan_id: None})
+        self.assertEqual(self.counts(self.customers(self.customer_rows)), (2, 0, 0, 0))
+        self.assertEqual(self.counts(self.ingest(self.loan_rows)), (2, 0, 0, 0))
+
+
+class ParallelIngestionTests(TestCase):
+    """The chunked celery pipeline behind ``manage.py ingest_excel``, applied eagerly in-process."""
+
+    def setUp(self):
+        # Chunk progress and results go to an in-memory backend instead of redis
+        self.backend = CacheBackend(app=celery_app, backend='memory', url='memory://')
+        patcher = mock.patch.object(type(celery_app), 'backend', self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.customer_file = f'{directory.name}/customers.csv'
+        self.loan_file = f'{directory.name}/loans.csv'
+        with open(self.customer_file, 'w', newline='') as f:
+            csv.writer(f).writerows([CUSTOMER_COLUMNS] + [['Asha', 'Rao', 35, str(i), 80000] for i in range(5)])
+        with open(self.loan_file, 'w', newline='') as f:
+            csv.writer(f).writerow(LOAN_COLUMNS)
+
+    def test_plan_chunks(self):
+        self.assertEqual(plan_chunks(5, 2), [(2, 3), (4, 5), (6, 6)])
+        self.assertEqual(plan_chunks(4, 2, first_row=1), [(1, 2), (3, 4)])
+        self.assertEqual(plan_chunks(3, 10), [(2, 4)])
+        self.assertEqual(plan_chunks(0, 10), [])
+
+    def test_pipeline_ingests_customers_then_loans(self):
+        # The loans file can only be written once the customers exist, so run the two stages separately
+        pipeline, chunks, summaries = build_ingestion_pipeline(self.customer_file, self.loan_file, chunk_rows=2)
+        self.assertEqual([signature.args[2:4] for signature in chunks], [(2, 3), (4, 5), (6, 6)])
+        self.assertEqual(len(summaries), 1)
+        summary = pipeline.apply().get()
+        self.assertEqual((summary['kind'], summary['chunks'], summary['rows_read'], summary['rows_inserted']),
+                         ('customers', 3, 5, 5))
+
+        customer_ids = list(Customer.objects.order_by('phone_number').values_list('customer_id', flat=True))
+        with open(self.loan_file, 'w', newline='') as f:
+            csv.writer(f).writerows([LOAN_COLUMNS] + [
+                [customer_id, 10000, 12, 10, 900, 12, '2024-01-01', '2099-01-01'] for customer_id in customer_ids
+            ] + [['missing', 10000, 12, 10, 900, 12, '2024-01-01', '2099-01-01']])
+        empty_customers = f'{self.customer_file}.empty.csv'
+        with open(empty_customers, 'w', newline='') as f:
+            csv.writer(f).writerow(CUSTOMER_COLUMNS)
+        pipeline, chunks, summaries = build_ingestion_pipeline(empty_customers, self.loan_file, chunk_rows=4)
+        self.assertEqual([signature.args[0] for signature in chunks], ['loans', 'loans'])
+        summary = pipeline.apply().get()
+        self.assertEqual((summary['rows_inserted'], summary['rows_failed']), (5, 1))
+        self.assertEqual(summary['errors'][0]['row'], 7)
+        self.assertEqual(Loan.objects.count(), 5)
+        self.assertEqual(CustomerCreditProfile.objects.filter(total_loans=1).count(), 5)
+
+    def test_reconcile_merges_chunk_reports_in_row_order(self):
+        def chunk(min_row, inserted, errors):
+            return {'min_row': min_row, 'started_at': '2026-01-01T00:00:00+00:00', 'rows_read': inserted + len(errors),
+                    'rows_inserted': inserted, 'rows_updated': 1, 'rows_unchanged': 2, 'rows_failed': len(errors),
+                    'errors': [{'row': row, 'values': [], 'error': 'bad'} for row in errors]}
+
+        summary = reconcile_ingestion([chunk(12, 8, [15]), chunk(2, 9, [3])], 'loans', 'loans.csv')
+        self.assertEqual(summary['chunks'], 2)
+        self.assertEqual((summary['rows_read'], summary['rows_inserted'], summary['rows_failed']), (19, 17, 2))
+        self.assertEqual((summary['rows_updated'], summary['rows_unchanged']), (2, 4))
+        self.assertEqual([error['row'] for error in summary['errors']], [3, 15])
+        self.assertFalse(summary['errors_truncated'])
+
+    def test_command_stops_following_when_a_chunk_fails(self):
+        def enqueue_then_fail(**options):
+            pipeline, chunks, summaries = build_ingestion_pipeline(**options)
+            # As if a worker failed the first customer chunk: its chord and the loan stage never finish
+            self.backend.mark_as_failure(chunks[0].id, RuntimeError('worker lost'))
+            return mock.Mock(), chunks, summaries
+
+        out = io.StringIO()
+        # The customers file doubles as a non-empty loans file, so the pipeline has a second stage
+        with mock.patch('loans.management.commands.ingest_excel.build_ingestion_pipeline', enqueue_then_fail):
+            with self.assertRaisesMessage(CommandError, 'Ingestion did not complete'):
+                call_command('ingest_excel', customers=self.customer_file, loans=self.customer_file,
+                             file_format='csv', chunk_rows=2, poll_interval=0, timeout=5, stdout=out)
+        self.assertIn('customers rows 2-3 failed', out.getvalue())
+        self.assertIn('not ingested, a chunk failed', out.getvalue())
+
+    def test_command_timeout(self):
+        with mock.patch('loans.management.commands.ingest_excel.build_ingestion_pipeline',
+                        lambda **options: (mock.Mock(), *build_ingestion_pipeline(**options)[1:])):
+            with self.assertRaisesMessage(CommandError, 'Gave up waiting after 0s'):
+                call_command('ingest_excel', customers=self.customer_file, loans=self.customer_file,
+                             file_format='csv', poll_interval=0, timeout=0, stdout=io.StringIO())
+
+
+class IngestionReportTests(TestCase):
+    def test_bad_rows_are_reported_and_the_rest_of_the_batch_lands(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/customers.xlsx'
+            workbook = openpyxl.Workbook()
+            sheet = workbook.active
+            sheet.append(CUSTOMER_COLUMNS)
+            sheet.append(['Asha', 'Rao', 35, '42', 80000, 'C42'])
+            sheet.append([None, 'Rao', 40, '43', 60000, 'C43'])  # Rejected by the database (NOT NULL)
+            sheet.append(['Ravi', 'Rao', 'forty', '44', 60000, 'C44'])  # Rejected while building the row
+            sheet.append(['Mira', 'Das', 28, '45', 37500, 'C45'])
+            workbook.save(path)
+            report = ingest_customers(path).as_dict()
+
+        self.assertEqual((report['rows_read'], report['rows_inserted'], report['rows_failed']), (4, 2, 2))
+        self.assertEqual(sorted(Customer.objects.values_list('customer_id', flat=True)), ['C42', 'C45'])
+        errors = sorted(report['errors'], key=lambda error: error['row'])
+        self.assertEqual([(error['row'], error['values']) for error in errors], [
+            (3, [None, 'Rao', '40', '43', '60000', 'C43']),
+            (4, ['Ravi', 'Rao', 'forty', '44', '60000', 'C44']),
+        ])
+        self.assertIn('NOT NULL', errors[0]['error'].upper())
+        self.assertIn('forty', errors[1]['error'])
+        self.assertFalse(report['errors_truncated'])
+
+    def test_errors_beyond_the_cap_are_only_counted(self):
+        report = IngestionReport('loans.csv')
+        with mock.patch('loans.ingestion.MAX_REPORTED_ERRORS', 2):
+            for row in range(2, 7):
+                report.add_error(row, ['x', 1], 'bad')
+        summary = report.as_dict()
+        self.assertEqual(summary['rows_failed'], 5)
+        self.assertEqual([error['row'] for error in summary['errors']], [2, 3])
+        self.assertEqual(summary['errors'][0], {'row': 2, 'values': ['x', '1'], 'error': 'bad'})
+        self.assertTrue(summary['errors_truncated'])
+
+
+class LoaderTests(TestCase):
+    ROWS = [['Asha', 'Rao', 35, '4200', 80000, 'C1'], ['Ravi', 'Kumar', 41, '4300', 62000, 'C2'],
+            ['Mira', 'Das', 28, '4400', 37500, 'C3'], ['Neha', 'Iyer', 33, '4500', 51000, 'C4'],
+            ['Vikram', 'Shah', 52, '4600', 120000, 'C5'], ['Tara', 'Nair', 24, '4700', 30000, 'C6'],
+            ['Rohan', 'Gupta', 46, '4800', 91000, 'C7']]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        directory = cls.directory.name
+        workbook = openpyxl.Workbook()
+        for row in [CUSTOMER_COLUMNS] + cls.ROWS:
+            workbook.active.append(row)
+        workbook.save(f'{directory}/customers.xlsx')
+        with open(f'{directory}/customers.csv', 'w', newline='') as f:
+            csv.writer(f).writerows([CUSTOMER_COLUMNS] + cls.ROWS)
+        with open(f'{directory}/customers.ndjson', 'w') as f:
+            for row in cls.ROWS:
+                f.write(json.dumps(dict(zip(CUSTOMER_COLUMNS, row))) + '\n')
+        table = pyarrow.table({column: [row[i] for row in cls.ROWS] for i, column in enumerate(CUSTOMER_COLUMNS)})
+        # Batches of 3 rows, so ranges start and end inside and across batches
+        pyarrow.parquet.write_table(table, f'{directory}/customers.parquet', row_group_size=3)
+        with pyarrow.ipc.new_file(f'{directory}/customers.arrow', table.schema) as writer:
+            for batch in table.to_batches(max_chunksize=3):
+                writer.write_batch(batch)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def loader(self, file_format):
+        return get_loader(f'{self.directory.name}/customers.{file_format}', CUSTOMER_COLUMNS)
+
+    def values(self, rows):
+        # CSV cells are strings
+        return [[str(value) for value in values] for _, values in rows]
+
+    def test_every_format_reads_the_same_rows(self):
+        expected = [[str(value) for value in row] for row in self.ROWS]
+        for file_format in ('xlsx', 'csv', 'ndjson', 'parquet', 'arrow'):
+            with self.subTest(file_format=file_format):
+                loader = self.loader(file_format)
+                rows = list(loader.iter_rows())
+                self.assertEqual(loader.count_rows(), len(self.ROWS))
+                self.assertEqual(self.values(rows), expected)
+                self.assertEqual([row_number for row_number, _ in rows],
+                                 list(range(loader.first_row, loader.first_row + len(self.ROWS))))
+
+    def test_row_ranges_match_across_formats(self):
+        # (first, last) data row, 1-based; last None reads to the end
+        for first, last in ((1, 7), (1, 3), (2, 4), (3, 3), (4, 7), (6, None), (7, 9), (8, None)):
+            expected = [[str(value) for value in row] for row in self.ROWS[first - 1:last]]
+            for file_format in ('xlsx', 'csv', 'ndjson', 'parquet', 'arrow'):
+                with self.subTest(first=first, last=last, file_format=file_format):
+                    loader = self.loader(file_format)
+                    offset = loader.first_row - 1
+                    rows = list(loader.iter_rows(first + offset, None if last is None else last + offset))
+                    self.assertEqual(self.values(rows), expected)
+                    self.assertEqual([row_number for row_number, _ in rows],
+                                     list(range(first + offset, first + offset + len(rows))))
+
+    def test_planned_chunks_cover_every_row_once(self):
+        for file_format in ('xlsx', 'csv', 'ndjson', 'parquet', 'arrow'):
+            with self.subTest(file_format=file_format):
+                loader = self.loader(file_format)
+                rows = [row for min_row, max_row in plan_chunks(loader.count_rows(), 2, loader.first_row)
+                        for row in loader.iter_rows(min_row, max_row)]
+                self.assertEqual(rows, list(loader.iter_rows()))
+
+    def test_blank_rows_are_skipped_but_keep_their_numbers(self):
+        path = f'{self.directory.name}/blank.csv'
+        with open(path, 'w', newline='') as f:
+            csv.writer(f).writerows([CUSTOMER_COLUMNS, self.ROWS[0], [''] * len(CUSTOMER_COLUMNS), self.ROWS[1]])
+        self.assertEqual([row_number for row_number, _ in get_loader(path, CUSTOMER_COLUMNS).iter_rows()], [2, 4])
+
+    def test_ndjson_arrays_and_missing_keys(self):
+        path = f'{self.directory.name}/mixed.jsonl'
+        with open(path, 'w') as f:
+            f.write(json.dumps(self.ROWS[0]) + '\n\n')
+            f.write(json.dumps({'first_name': 'Ravi', 'age': 41}) + '\n')
+        self.assertEqual(list(get_loader(path, CUSTOMER_COLUMNS).iter_rows()), [
+            (1, tuple(self.ROWS[0])),
+            (3, ('Ravi', None, 41, None, None, None)),
+        ])
+
+    def test_columnar_files_without_the_column_names_are_read_by_position(self):
+        path = f'{self.directory.name}/positional.parquet'
+        table = pyarrow.table({f'c{i}': [row[i] for row in self.ROWS] for i in range(len(CUSTOMER_COLUMNS))})
+        pyarrow.parquet.write_table(table, path, row_group_size=3)
+        rows = list(get_loader(path, CUSTOMER_COLUMNS).iter_rows(4, 5))
+        self.assertEqual(rows, [(4, tuple(self.ROWS[3])), (5, tuple(self.ROWS[4]))])
+
+    def test_columnar_files_without_the_optional_id_column_read_it_as_none(self):
+        for file_format in ('parquet', 'arrow'):
+            with self.subTest(file_format=file_format):
+                path = f'{self.directory.name}/without_ids.{file_format}'
+                table = pyarrow.table({column: [row[i] for row in self.ROWS[:2]]
+                                       for i, column in enumerate(CUSTOMER_COLUMNS[:-1])})
+                if file_format == 'parquet':
+                    pyarrow.parquet.write_table(table, path)
+                else:
+                    with pyarrow.ipc.new_file(path, table.schema) as writer:
+                        writer.write_table(table)
+                self.assertEqual([values for _, values in get_loader(path, CUSTOMER_COLUMNS).iter_rows()],
+                                 [tuple(row[:-1]) + (None,) for row in self.ROWS[:2]])
+
+    def test_format_comes_from_the_option_or_the_extension(self):
+        self.assertIsInstance(get_loader('data.feather', CUSTOMER_COLUMNS), ArrowLoader)
+        self.assertIsInstance(get_loader('data.txt', CUSTOMER_COLUMNS, 'CSV'), CsvLoader)
+        with self.assertRaisesMessage(LoaderError, "Unsupported ingestion format 'txt'"):
+            get_loader('data.txt', CUSTOMER_COLUMNS)
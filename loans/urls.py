@@ -1,21 +1,46 @@
+from django.conf import settings
 from django.urls import path
-from .views import loan_list, loan_detail, CheckEligibilityView, CreateLoanView, ViewLoanView, ViewLoansView  
+from . import async_views
+from .views import loan_list, loan_detail, loan_export, CheckEligibilityView, CheckEligibilityBatchView, CreateLoanView, ViewLoanView, ViewLoanScheduleView, ViewLoansView, RepaymentPostingView, RepaymentStatusView
+# The ASGI deployment serves the hot endpoints from loans/async_views.py
+if settings.ASYNC_VIEWS:
+    check_eligibility_view = async_views.check_eligibility
+    view_loan_view = async_views.view_loan
+    view_loans_view = async_views.view_loans
+else:
+    check_eligibility_view = CheckEligibilityView.as_view()
+    view_loan_view = ViewLoanView.as_view()
+    view_loans_view = ViewLoansView.as_view()
+
 urlpatterns = [
     # Loan list and create
     path('', loan_list, name='loan_list'),
 
+    # Streaming NDJSON/CSV export
+    path('export/', loan_export, name='loan_export'),
+
     # Loan detail
     path('<int:pk>/', loan_detail, name='loan_detail'),
 
     # Check eligibility
-    path('check-eligibility/', CheckEligibilityView.as_view(), name='check_eligibility'),
+    path('check-eligibility/', check_eligibility_view, name='check_eligibility'),
+
+    # Check eligibility for many applications at once
+    path('check-eligibility/batch/', CheckEligibilityBatchView.as_view(), name='check_eligibility_batch'),
 
     # Create loan
     path('create-loan/', CreateLoanView.as_view(), name='create_loan'),
 
     # View specific loan
-    path('view-loan/<str:loan_id>/', ViewLoanView.as_view(), name='view_loan'),
+    path('view-loan/<str:loan_id>/', view_loan_view, name='view_loan'),
+
+    # Amortisation schedule of a loan
+    path('view-loan/<str:loan_id>/schedule/', ViewLoanScheduleView.as_view(), name='view_loan_schedule'),
 
     # View all loans for customer
-    path('view-loans/<str:customer_id>/', ViewLoansView.as_view(), name='view_loans'),
+    path('view-loans/<str:customer_id>/', view_loans_view, name='view_loans'),
+
+    # Bulk EMI repayment posting and the status of queued postings
+    path('repayments/', RepaymentPostingView.as_view(), name='post_repayments'),
+    path('repayments/<str:task_id>/', RepaymentStatusView.as_view(), name='repayment_status'),
 ]
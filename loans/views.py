@@ -4,9 +4,24 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from .models import Loan
-from .serializers import LoanSerializer, LoanCreateSerializer, CheckEligibilitySerializer
+from .serializers import LoanSerializer, LoanCreateSerializer, EligibilityApplicationSerializer
+from .scoring import check_eligibility, check_eligibility_many
+from .emi import amortisation_schedule
+from . import cache, memo
+from .profiles import credit_stats_bulk
+from .repayments import post_repayments
+from .tasks import post_repayments_batch
+from celery.result import AsyncResult
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
 from customers.models import Customer
-import math
+from customers.serializers import projected_columns, requested_fields
+from config.pagination import KeysetPagination
+from config.idempotency import idempotent
+from config.exports import ExportError, bool_param, date_param, export_response
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
 from django.utils import timezone
 from dateutil.relativedelta import relativedelta
 import logging
@@ -17,9 +32,17 @@ logger = logging.getLogger(__name__)  # For logging errors
 @api_view(['GET', 'POST'])
 def loan_list(request):
     if request.method == 'GET':
-        loans = Loan.objects.all()
-        serializer = LoanSerializer(loans, many=True)
-        return Response(serializer.data)
+        # Keyset-paginated; ?fields=a,b limits both the selected columns and the response keys
+        fields = requested_fields(request)
+        loans = Loan.objects.order_by('id')
+        if fields is None or 'customer' in fields:
+            loans = loans.select_related('customer')
+        if fields is not None:
+            loans = loans.only(*projected_columns(Loan, fields))
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(loans, request)
+        serializer = LoanSerializer(page, many=True, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
     
     elif request.method == 'POST':
         serializer = LoanCreateSerializer(data=request.data)
@@ -55,133 +78,162 @@ def loan_detail(request, pk):
         loan.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+# loan_export view: streams every matching loan as NDJSON or CSV
+LOAN_EXPORT_COLUMNS = {
+    'loan_id': 'loan_id',
+    'customer_id': 'customer__customer_id',
+    'loan_amount': 'loan_amount',
+    'tenure': 'tenure',
+    'interest_rate': 'interest_rate',
+    'monthly_repayment': 'monthly_repayment',
+    'emis_paid_on_time': 'emis_paid_on_time',
+    'start_date': 'start_date',
+    'end_date': 'end_date',
+    'is_active': 'is_active',
+    'created_at': 'created_at',
+}
+
+@require_GET
+def loan_export(request):
+    loans = Loan.objects.order_by('id')
+    try:
+        start_from, start_to = date_param(request, 'from'), date_param(request, 'to')
+        is_active = bool_param(request, 'is_active')
+    except ExportError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if start_from:
+        loans = loans.filter(start_date__gte=start_from)
+    if start_to:
+        loans = loans.filter(start_date__lte=start_to)
+    if is_active is not None:
+        loans = loans.filter(is_active=is_active)
+    return export_response(request, loans, list(LOAN_EXPORT_COLUMNS.values()),
+                           list(LOAN_EXPORT_COLUMNS), 'loans')
+
 # CheckEligibilityView 
 
 class CheckEligibilityView(APIView):
     def post(self, request):
-        serializer = CheckEligibilitySerializer(data=request.data)
+        serializer = EligibilityApplicationSerializer(data=request.data)
         if not serializer.is_valid():
             logger.error(f"Eligibility validation error: {serializer.errors}")
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         data = serializer.validated_data
-        try:
-            customer = Customer.objects.get(customer_id=data['customer_id'])
-        except Customer.DoesNotExist:
-            return Response({"error": "Customer not found"}, status=status.HTTP_404_NOT_FOUND)
-
-        loans = Loan.objects.filter(customer=customer)
-
-        credit_score = self.calculate_credit_score(customer, loans)
-
-        approval = False
-        corrected_rate = data['interest_rate']
-        if credit_score > 50:
-            approval = True
-        elif 30 < credit_score <= 50 and data['interest_rate'] > 12:
-            approval = True
-            corrected_rate = max(corrected_rate, 12)
-        elif 10 < credit_score <= 30 and data['interest_rate'] > 16:
-            approval = True
-            corrected_rate = max(corrected_rate, 16)
-
-        monthly_installment = self.calculate_emi(data['loan_amount'], corrected_rate, data['tenure'])
+        # Identical re-submissions are answered from the versioned memo (loans/memo.py)
+        decision = memo.eligibility(data['customer_id'], data['loan_amount'], data['interest_rate'], data['tenure'])
+        if decision is None:
+            errors = {"customer_id": ["Customer does not exist"]}
+            logger.error(f"Eligibility validation error: {errors}")
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        response = eligibility_response(data, *decision)
+        return Response(response, status=status.HTTP_200_OK)
 
-        current_emis = sum(loan.monthly_repayment for loan in loans if loan.is_active)
-        if approval and (current_emis + monthly_installment) > 0.5 * customer.monthly_income:
-            approval = False
 
-        response = {
-            "customer_id": data['customer_id'],
-            "approval": approval,
-            "interest_rate": data['interest_rate'],
-            "corrected_interest_rate": corrected_rate,
-            "tenure": data['tenure'],
-            "monthly_installment": monthly_installment
-        }
-        return Response(response, status=status.HTTP_200_OK)
+def eligibility_response(data, approval, corrected_rate, monthly_installment):
+    return {
+        "customer_id": data['customer_id'],
+        "approval": approval,
+        "interest_rate": data['interest_rate'],
+        "corrected_interest_rate": corrected_rate,
+        "tenure": data['tenure'],
+        "monthly_installment": monthly_installment
+    }
 
-    def calculate_credit_score(self, customer, loans):
-        if not loans:
-            return 100
-
-        paid_on_time = sum(1 for loan in loans if loan.emis_paid_on_time >= loan.tenure)
-        total_loans = len(loans)
-        current_year = timezone.now().year
-        loans_this_year = sum(1 for loan in loans if loan.start_date.year == current_year)
-        loan_volume = sum(loan.loan_amount for loan in loans)
-        current_loans_sum = sum(loan.loan_amount for loan in loans if loan.is_active)
-        if current_loans_sum > customer.approved_limit:
-            return 0
-
-        score = (paid_on_time / max(total_loans, 1) * 40) + (loans_this_year * 20) + (loan_volume / 10000 * 10)
-        return min(100, int(score))
-
-    def calculate_emi(self, principal, rate, tenure):
-        monthly_rate = rate / 12 / 100
-        if monthly_rate == 0:
-            return principal / tenure
-        return principal * monthly_rate * math.pow(1 + monthly_rate, tenure) / (math.pow(1 + monthly_rate, tenure) - 1)
-
-# CreateLoanView (kept as is)
+# CheckEligibilityBatchView: many applications, fixed number of queries
+class CheckEligibilityBatchView(APIView):
+    def post(self, request):
+        applications = request.data
+        if isinstance(applications, dict):
+            applications = applications.get('applications')
+        if not isinstance(applications, list) or not applications:
+            return Response({"error": "Expected a non-empty list of applications"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(applications) > settings.ELIGIBILITY_BATCH_MAX_SIZE:
+            return Response({"error": f"At most {settings.ELIGIBILITY_BATCH_MAX_SIZE} applications per batch"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        serializers = [EligibilityApplicationSerializer(data=application) for application in applications]
+        valid = [serializer.is_valid() for serializer in serializers]
+
+        customer_ids = {s.validated_data['customer_id'] for s, ok in zip(serializers, valid) if ok}
+        customers = Customer.objects.in_bulk(customer_ids, field_name='customer_id')
+        stats = credit_stats_bulk(customer.pk for customer in customers.values())
+
+        results = []
+        priced = []  # (result index, validated item, customer) priced together below
+        for serializer, ok in zip(serializers, valid):
+            if not ok:
+                results.append(serializer.errors)  # As /check-eligibility/ reports them
+                continue
+            item = serializer.validated_data
+            customer = customers.get(item['customer_id'])
+            if customer is None:
+                results.append({"customer_id": ["Customer does not exist"]})
+                continue
+            priced.append((len(results), item, customer))
+            results.append(None)
+
+        decisions = check_eligibility_many([
+            (customer, item['loan_amount'], item['interest_rate'], item['tenure'], stats[customer.pk])
+            for _, item, customer in priced
+        ])
+        for (index, item, _), decision in zip(priced, decisions):
+            results[index] = eligibility_response(item, *decision)
+        return Response(results, status=status.HTTP_200_OK)
+
+# CreateLoanView: the customer row is locked for the whole check-and-create,
+# so concurrent requests for one customer are decided one after another
 class CreateLoanView(APIView):
+    @idempotent('create-loan')
     def post(self, request):
-        serializer = CheckEligibilitySerializer(data=request.data)
+        serializer = EligibilityApplicationSerializer(data=request.data)
         if not serializer.is_valid():
             logger.error(f"Loan creation validation error: {serializer.errors}")
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         data = serializer.validated_data
-        try:
-            customer = Customer.objects.get(customer_id=data['customer_id'])
-        except Customer.DoesNotExist:
-            return Response({"error": "Customer not found"}, status=status.HTTP_404_NOT_FOUND)
-
-        loans = Loan.objects.filter(customer=customer)
-
-        credit_score = self.calculate_credit_score(customer, loans)
-
-        approval = False
-        corrected_rate = data['interest_rate']
-        if credit_score > 50:
-            approval = True
-        elif 30 < credit_score <= 50 and data['interest_rate'] > 12:
-            approval = True
-            corrected_rate = max(corrected_rate, 12)
-        elif 10 < credit_score <= 30 and data['interest_rate'] > 16:
-            approval = True
-            corrected_rate = max(corrected_rate, 16)
-
-        monthly_installment = self.calculate_emi(data['loan_amount'], corrected_rate, data['tenure'])
-
-        current_emis = sum(loan.monthly_repayment for loan in loans if loan.is_active)
-        if approval and (current_emis + monthly_installment) > 0.5 * customer.monthly_income:
-            approval = False
-
-        if not approval:
-            return Response({
-                "loan_id": None,
-                "customer_id": data['customer_id'],
-                "loan_approved": False,
-                "message": "Loan not approved based on eligibility",
-                "monthly_installment": 0
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        start_date = timezone.now().date()
-        end_date = start_date + relativedelta(months=data['tenure'])
-        loan = Loan.objects.create(
-            customer=customer,
-            loan_amount=data['loan_amount'],
-            tenure=data['tenure'],
-            interest_rate=corrected_rate,
-            monthly_repayment=monthly_installment,
-            emis_paid_on_time=0,
-            start_date=start_date,
-            end_date=end_date
-        )
-
-        customer.current_debt += data['loan_amount']
-        customer.save()
+        with transaction.atomic():
+            # The locked read doubles as the existence check
+            try:
+                customer = Customer.objects.select_for_update().get(customer_id=data['customer_id'])
+            except Customer.DoesNotExist:
+                errors = {"customer_id": ["Customer does not exist"]}
+                logger.error(f"Loan creation validation error: {errors}")
+                return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+            # Reads the credit profile inside the lock, after any loan created before us
+            approval, corrected_rate, monthly_installment = check_eligibility(
+                customer, data['loan_amount'], data['interest_rate'], data['tenure']
+            )
+
+            if not approval:
+                return Response({
+                    "loan_id": None,
+                    "customer_id": data['customer_id'],
+                    "loan_approved": False,
+                    "message": "Loan not approved based on eligibility",
+                    "monthly_installment": 0
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            start_date = timezone.now().date()
+            end_date = start_date + relativedelta(months=data['tenure'])
+            loan = Loan.objects.create(
+                customer=customer,
+                loan_amount=data['loan_amount'],
+                tenure=data['tenure'],
+                interest_rate=corrected_rate,
+                monthly_repayment=monthly_installment,
+                emis_paid_on_time=0,
+                start_date=start_date,
+                end_date=end_date
+            )
+
+            # Only current_debt is written, incremented by the database
+            Customer.objects.filter(pk=customer.pk).update(
+                current_debt=F('current_debt') + int(data['loan_amount'])
+            )
 
         return Response({
             "loan_id": loan.loan_id,
@@ -191,67 +243,73 @@ class CreateLoanView(APIView):
             "monthly_installment": monthly_installment
         }, status=status.HTTP_201_CREATED)
 
-    def calculate_credit_score(self, customer, loans):
-        if not loans:
-            return 100
-
-        paid_on_time = sum(1 for loan in loans if loan.emis_paid_on_time >= loan.tenure)
-        total_loans = len(loans)
-        current_year = timezone.now().year
-        loans_this_year = sum(1 for loan in loans if loan.start_date.year == current_year)
-        loan_volume = sum(loan.loan_amount for loan in loans)
-        current_loans_sum = sum(loan.loan_amount for loan in loans if loan.is_active)
-        if current_loans_sum > customer.approved_limit:
-            return 0
-
-        score = (paid_on_time / max(total_loans, 1) * 40) + (loans_this_year * 20) + (loan_volume / 10000 * 10)
-        return min(100, int(score))
-
-    def calculate_emi(self, principal, rate, tenure):
-        monthly_rate = rate / 12 / 100
-        if monthly_rate == 0:
-            return principal / tenure
-        return principal * monthly_rate * math.pow(1 + monthly_rate, tenure) / (math.pow(1 + monthly_rate, tenure) - 1)
-
-# ViewLoanView 
+# ViewLoanView: cached, else one .values() query serialised by hand (see loans/reads.py)
 class ViewLoanView(APIView):
+    def get(self, request, loan_id):
+        response = cache.loan_detail(loan_id)
+        if response is None:
+            return Response({"error": "Loan not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(response, status=status.HTTP_200_OK)
+
+# ViewLoanScheduleView: amortisation schedule of a loan
+class ViewLoanScheduleView(APIView):
     def get(self, request, loan_id):
         try:
-            loan = Loan.objects.get(loan_id=loan_id)  
+            loan = Loan.objects.select_related('customer').get(loan_id=loan_id)
         except Loan.DoesNotExist:
             return Response({"error": "Loan not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = LoanSerializer(loan)
-        response = serializer.data
-        
-        response['customer'] = {
-            "customer_id": loan.customer.customer_id,
-            "first_name": loan.customer.first_name,
-            "last_name": loan.customer.last_name,
-            "phone_number": loan.customer.phone_number,
-            "age": loan.customer.age
-        }
-        return Response(response, status=status.HTTP_200_OK)
+        schedule = amortisation_schedule(loan.loan_amount, loan.interest_rate, loan.tenure)
+        for row in schedule:
+            row['paid'] = row['month'] <= loan.emis_paid_on_time
 
-# ViewLoansView 
+        return Response({
+            "loan_id": loan.loan_id,
+            "customer_id": loan.customer.customer_id,
+            "loan_amount": loan.loan_amount,
+            "interest_rate": loan.interest_rate,
+            "tenure": loan.tenure,
+            "monthly_installment": schedule[0]['installment'] if schedule else 0,
+            "total_interest": sum(row['interest'] for row in schedule),
+            "repayments_left": loan.repayments_left,
+            "schedule": schedule
+        }, status=status.HTTP_200_OK)
+
+# ViewLoansView: cached per customer (see loans/cache.py)
 class ViewLoansView(APIView):
     def get(self, request, customer_id):
-        try:
-            customer = Customer.objects.get(customer_id=customer_id)
-        except Customer.DoesNotExist:
+        response = cache.customer_loans(customer_id)
+        if response is None:
             return Response({"error": "Customer not found"}, status=status.HTTP_404_NOT_FOUND)
-
-        loans = Loan.objects.filter(customer=customer)
-        if not loans:
+        if not response:
             return Response({"message": "No loans found for this customer"}, status=status.HTTP_200_OK)
+        return Response(response, status=status.HTTP_200_OK)
 
-        response = []
-        for loan in loans:
-            response.append({
-                "loan_id": loan.loan_id,
-                "loan_amount": loan.loan_amount,
-                "interest_rate": loan.interest_rate,
-                "monthly_installment": loan.monthly_repayment,
-                "repayments_left": loan.tenure - loan.emis_paid_on_time
-            })
+# RepaymentPostingView: batches of {loan_id, installments_paid} EMI postings.
+# Small batches are applied in the request, larger ones on a celery worker.
+class RepaymentPostingView(APIView):
+    @idempotent('repayments')
+    def post(self, request):
+        records = request.data
+        if isinstance(records, dict):
+            records = records.get('repayments')
+        if not isinstance(records, list) or not records:
+            return Response({"error": "Expected a non-empty list of repayments"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if len(records) > settings.REPAYMENT_SYNC_MAX_SIZE:
+            task = post_repayments_batch.delay(records)
+            return Response({"task_id": task.id, "status": "queued", "records": len(records)},
+                            status=status.HTTP_202_ACCEPTED)
+        return Response(post_repayments(records).as_dict(), status=status.HTTP_200_OK)
+
+# RepaymentStatusView: state and reconciliation summary of a queued posting
+class RepaymentStatusView(APIView):
+    def get(self, request, task_id):
+        result = AsyncResult(task_id)
+        response = {"task_id": task_id, "status": result.state}
+        if result.successful():
+            response['summary'] = result.result
+        elif result.failed():
+            response['error'] = str(result.result)
         return Response(response, status=status.HTTP_200_OK)